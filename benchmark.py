@@ -0,0 +1,119 @@
+"""
+Micro-benchmarks de funções quentes do bot
+
+Uso: python benchmark.py
+"""
+import random
+import timeit
+from datetime import date, datetime, timedelta
+
+from telebot import apihelper
+
+import templates
+from keyboards import KeyboardFactory
+from utils import DateTimeUtils, TelegramUtils, _converter_data_hora
+
+# Linhas por rodada (uma página grande da API) e rodadas medidas
+LINHAS = 50
+RODADAS = 2000
+
+
+def _gerar_linhas(quantidade: int):
+    """Pares (data, hora) como vêm do banco: datas próximas, poucos horários distintos"""
+    hoje = datetime.now()
+    return [
+        ((hoje + timedelta(days=random.randint(-30, 60))).strftime("%d/%m"), random.choice(["07:00", "13:00", "19:00"]))
+        for _ in range(quantidade)
+    ]
+
+
+def _medir(nome: str, funcao, linhas: int):
+    """Executa a função RODADAS vezes e imprime o custo por linha (ou por chamada)"""
+    segundos = min(timeit.repeat(funcao, number=RODADAS, repeat=3))
+    por_linha = segundos / (RODADAS * linhas) * 1e9
+    print(f"  {nome:<40} {por_linha:8.0f} ns/{'linha' if linhas > 1 else 'chamada'}")
+    return por_linha
+
+
+def benchmark_parse_data_hora():
+    """Parse de data/hora: sem cache (relógio lido por linha) × cache × lote"""
+    print(f"\n📅 parse_data_hora ({LINHAS} linhas por rodada)")
+    linhas = _gerar_linhas(LINHAS)
+    sem_cache = _converter_data_hora.__wrapped__
+    
+    antes = _medir("sem cache", lambda: [sem_cache(d, h, date.today()) for d, h in linhas], LINHAS)
+    _medir("parse_data_hora (cache)", lambda: [DateTimeUtils.parse_data_hora(d, h) for d, h in linhas], LINHAS)
+    depois = _medir("parse_lote (cache, um relógio)", lambda: DateTimeUtils.parse_lote(linhas), LINHAS)
+    print(f"  ⚡ {antes / depois:.1f}x mais rápido; cache: {_converter_data_hora.cache_info()}")
+
+
+def benchmark_tempo_restante():
+    """Tempo restante de uma lista: linha a linha (relógio por linha) × lote"""
+    print(f"\n⏳ tempo restante ({LINHAS} linhas por rodada)")
+    linhas = _gerar_linhas(LINHAS)
+    
+    def linha_a_linha():
+        for data_str, hora_str in linhas:
+            data_plantao = DateTimeUtils.parse_data_hora(data_str, hora_str)
+            if data_plantao:
+                DateTimeUtils.calcular_tempo_restante(data_plantao)
+    
+    antes = _medir("parse + calcular_tempo_restante", linha_a_linha, LINHAS)
+    depois = _medir("tempo_restante_lote", lambda: DateTimeUtils.tempo_restante_lote(linhas), LINHAS)
+    print(f"  ⚡ {antes / depois:.1f}x mais rápido")
+
+
+def benchmark_teclados():
+    """Custo do teclado por mensagem: montar + serializar × teclado pré-serializado"""
+    print("\n⌨️ teclados (conversão feita pelo TeleBot a cada envio)")
+    
+    antes = _medir("principal montado a cada envio",
+                   lambda: apihelper._convert_markup(KeyboardFactory._montar_teclado_principal()), 1)
+    depois = _medir("principal pré-serializado",
+                    lambda: apihelper._convert_markup(KeyboardFactory.criar_teclado_principal()), 1)
+    print(f"  ⚡ {antes / depois:.0f}x mais rápido")
+    
+    antes = _medir("locais montado a cada envio",
+                   lambda: apihelper._convert_markup(KeyboardFactory._montar_teclado_locais()), 1)
+    depois = _medir("locais pré-serializado",
+                    lambda: apihelper._convert_markup(KeyboardFactory.criar_teclado_locais()), 1)
+    print(f"  ⚡ {antes / depois:.0f}x mais rápido")
+    _medir("data/hora (memoizado por dia)",
+           lambda: apihelper._convert_markup(KeyboardFactory.criar_teclado_data_hora()), 1)
+
+
+def benchmark_mensagens():
+    """Montagem de mensagens: f-string + `+=` e escape em 18 passes × templates compilados"""
+    print(f"\n📝 mensagens ({LINHAS} plantões por rodada)")
+    linhas = [(data, hora, f"Hospital São_José {i}") for i, (data, hora) in enumerate(_gerar_linhas(LINHAS))]
+    especiais = ['_', '*', '[', ']', '(', ')', '~', '`', '>', '#', '+', '-', '=', '|', '{', '}', '.', '!']
+    
+    def escapar_em_passes(texto):
+        for char in especiais:
+            texto = texto.replace(char, f'\\{char}')
+        return texto
+    
+    antes = _medir("escape em 18 passes", lambda: [escapar_em_passes(l) for _, _, l in linhas], LINHAS)
+    depois = _medir("escape com translate", lambda: [TelegramUtils.escapar_markdown(l) for _, _, l in linhas], LINHAS)
+    print(f"  ⚡ {antes / depois:.1f}x mais rápido")
+    
+    def concatenando():
+        resposta = "📅 *PLANTÕES DE HOJE:*\n\n"
+        for data, hora, local in linhas:
+            resposta += f"⏰ *{hora}* - {escapar_em_passes(local)}\n"
+        return resposta
+    
+    def com_templates():
+        itens = templates.renderizar_lista('item_agenda', ({'hora': hora, 'local': local} for _, hora, local in linhas))
+        return templates.renderizar('agenda_hoje', itens=itens)
+    
+    antes = _medir("f-string + += (escape em passes)", concatenando, LINHAS)
+    depois = _medir("templates + join", com_templates, LINHAS)
+    print(f"  ⚡ {antes / depois:.1f}x mais rápido")
+
+
+if __name__ == "__main__":
+    benchmark_parse_data_hora()
+    benchmark_tempo_restante()
+    benchmark_teclados()
+    benchmark_mensagens()
@@ -3,67 +3,95 @@ Bot de Plantões Médicos - Versão Refatorada
 """
 import logging
 import telebot
-from telebot import types
 from datetime import datetime
 
-from config import BOT_TOKEN, CHAT_ID_NAMORADO, LOG_LEVEL, LOG_FORMAT
+import respostas
+from config import (
+    BOT_TOKEN, CHAT_ID_NAMORADO, LOG_LEVEL, LOG_FORMAT,
+    BOT_WORKERS, WEBHOOK_URL, WEBHOOK_SECRET, WEBHOOK_PATH
+)
+from conversas import Conversas, ETAPA_DATA_HORA, ETAPA_LOCAL, ETAPA_LOCAL_CUSTOMIZADO
 from database import Database
+from envio import FilaEnvio
 from keyboards import KeyboardFactory
 from lembretes import LembreteService, enviar_notificacao_namorado
-from utils import DateTimeUtils, MessageFormatter, validar_formato_plantao
+from manutencao import ManutencaoService
+from utils import TelegramUtils
 
 # Configurar logging
 logging.basicConfig(level=LOG_LEVEL, format=LOG_FORMAT)
 logger = logging.getLogger(__name__)
 
 # Inicializar bot
-bot = telebot.TeleBot(BOT_TOKEN)
+bot = telebot.TeleBot(BOT_TOKEN, num_threads=BOT_WORKERS)
 
 # Inicializar banco de dados
 Database.init_db()
 
+# Fila de envio compartilhada (limites de taxa do Telegram)
+fila_envio = FilaEnvio(bot)
+
 # Inicializar serviço de lembretes
-lembrete_service = LembreteService(bot)
+lembrete_service = LembreteService(bot, fila_envio)
 
+# Arquivamento de plantões antigos e compactação do banco
+manutencao_service = ManutencaoService()
 
-# ========== HANDLERS DE COMANDOS ==========
+# Conversas em andamento do /plantao interativo
+conversas = Conversas()
 
-@bot.message_handler(commands=['start', 'ajuda', 'help'])
-def cmd_start(message):
-    """Comando /start - Menu inicial"""
-    welcome_text = """
-👨‍⚕️ *BOT DE PLANTÕES MÉDICOS* 👩‍⚕️
 
-*Use os botões abaixo ou comandos:*
+def _responder(chat_id, texto, parse_mode='Markdown', **kwargs):
+    """
+    Envia resposta com o teclado principal (padrão das respostas do bot). Textos
+    maiores que o limite do Telegram saem em várias mensagens, em ordem.
+    """
+    kwargs.setdefault('reply_markup', KeyboardFactory.criar_teclado_principal())
+    return _enviar_partes(chat_id, TelegramUtils.dividir_texto(texto), parse_mode, **kwargs)
 
-• /plantao - Adicionar plantão
-• /hoje - Plantões hoje  
-• /amanha - Plantões amanhã
-• /proximos - Próximos plantões
-• /todos - Todos os plantões
-• /deletar - Deletar plantão
-• /debug - Informações técnicas
-• /id - Mostra seu Chat ID
 
-*FORMATO RÁPIDO:*
-`/plantao DD/MM HH:MM Hospital`
+def _enviar_partes(chat_id, partes, parse_mode='Markdown', **kwargs):
+    """Envia as partes de um texto dividido em sequência; kwargs (teclado) vão na última"""
+    *anteriores, ultima = partes
+    for parte in anteriores:
+        bot.send_message(chat_id, parte, parse_mode=parse_mode)
+    return bot.send_message(chat_id, ultima, parse_mode=parse_mode, **kwargs)
 
-*Exemplo:*
-`/plantao 15/03 19:00 Hospital Evangélico`
 
-⏰ *Lembretes automáticos:*
-   • 24 horas antes
-   • 3 horas antes  
-   • 30 minutos antes
+# ========== CONVERSAS EM ANDAMENTO ==========
 
-💡 Use os botões para navegação rápida!
-"""
-    bot.send_message(
-        message.chat.id,
-        welcome_text,
-        parse_mode='Markdown',
-        reply_markup=KeyboardFactory.criar_teclado_principal()
-    )
+def _em_conversa(message) -> bool:
+    """Filtro do handle_conversa: guarda na mensagem a conversa encontrada"""
+    message.conversa = conversas.obter(message.chat.id)
+    return message.conversa is not None
+
+
+# Registrado antes dos comandos: com uma conversa aberta, a mensagem é a resposta
+# da etapa atual (como fazia o register_next_step_handler)
+@bot.message_handler(func=_em_conversa)
+def handle_conversa(message):
+    """Encaminha a mensagem para a etapa da conversa em andamento"""
+    conversa = message.conversa
+    
+    if message.text == "❌ Cancelar":
+        conversas.encerrar(message.chat.id)
+        _responder(message.chat.id, respostas.TEXTO_OPERACAO_CANCELADA, parse_mode=None)
+        return
+    
+    etapas = {
+        ETAPA_DATA_HORA: _processar_data_hora,
+        ETAPA_LOCAL: _processar_local,
+        ETAPA_LOCAL_CUSTOMIZADO: _processar_local_customizado,
+    }
+    etapas[conversa.etapa](message, conversa)
+
+
+# ========== HANDLERS DE COMANDOS ==========
+
+@bot.message_handler(commands=['start', 'ajuda', 'help'])
+def cmd_start(message):
+    """Comando /start - Menu inicial"""
+    _responder(message.chat.id, respostas.TEXTO_BOAS_VINDAS)
 
 
 @bot.message_handler(commands=['plantao'])
@@ -73,380 +101,175 @@ def cmd_plantao(message):
     
     # Formato completo: /plantao DD/MM HH:MM Local
     if len(partes) >= 4:
-        valido, erro = validar_formato_plantao(partes)
+        plantao, erro = respostas.interpretar_comando_plantao(message.text)
         
-        if not valido:
+        if erro:
             bot.send_message(message.chat.id, erro, parse_mode='Markdown')
             return
         
-        data_str = partes[1]
-        hora_str = partes[2]
-        local = partes[3]
-        
-        _salvar_e_confirmar_plantao(message.chat.id, data_str, hora_str, local)
+        _salvar_e_confirmar_plantao(message.chat.id, *plantao)
     
-    # Formato interativo
+    # Formato interativo (a etapa é gravada antes da pergunta chegar ao usuário)
     else:
-        msg = bot.send_message(
+        conversas.avancar(message.chat.id, ETAPA_DATA_HORA)
+        bot.send_message(
             message.chat.id,
-            "📅 *Envie a data e hora do plantão:*\n\nFormato: DD/MM HH:MM\nExemplo: 15/03 19:00",
+            respostas.TEXTO_PEDIR_DATA_HORA,
             parse_mode='Markdown',
             reply_markup=KeyboardFactory.criar_teclado_data_hora()
         )
-        bot.register_next_step_handler(msg, _processar_data_hora)
 
 
-def _processar_data_hora(message):
+def _processar_data_hora(message, conversa):
     """Processa entrada de data/hora no modo interativo"""
-    if message.text == "❌ Cancelar":
-        bot.send_message(
-            message.chat.id,
-            "❌ Operação cancelada.",
-            reply_markup=KeyboardFactory.criar_teclado_principal()
-        )
+    data_hora = respostas.interpretar_data_hora(message.text or "")
+    if not data_hora:
+        conversas.encerrar(message.chat.id)
+        _responder(message.chat.id, respostas.TEXTO_DATA_HORA_INVALIDA, parse_mode=None)
         return
     
-    try:
-        partes = message.text.split()
-        if len(partes) != 2:
-            raise ValueError("Formato inválido")
-        
-        data_str, hora_str = partes
-        
-        if not DateTimeUtils.validar_data(data_str):
-            raise ValueError("Data inválida")
-        
-        if not DateTimeUtils.validar_hora(hora_str):
-            raise ValueError("Hora inválida")
-        
-        msg = bot.send_message(
-            message.chat.id,
-            "🏥 *Agora digite o local do plantão:*",
-            parse_mode='Markdown',
-            reply_markup=KeyboardFactory.criar_teclado_locais()
-        )
-        bot.register_next_step_handler(msg, lambda m: _processar_local(m, data_str, hora_str))
-        
-    except Exception as e:
-        bot.send_message(
-            message.chat.id,
-            "❌ Formato inválido. Use: DD/MM HH:MM\nExemplo: 15/03 19:00",
-            reply_markup=KeyboardFactory.criar_teclado_principal()
-        )
+    data_str, hora_str = data_hora
+    conversas.avancar(message.chat.id, ETAPA_LOCAL, data_str, hora_str)
+    bot.send_message(
+        message.chat.id,
+        respostas.TEXTO_PEDIR_LOCAL,
+        parse_mode='Markdown',
+        reply_markup=KeyboardFactory.criar_teclado_locais()
+    )
 
 
-def _processar_local(message, data_str, hora_str):
+def _processar_local(message, conversa):
     """Processa entrada de local no modo interativo"""
-    if message.text == "❌ Cancelar":
-        bot.send_message(
-            message.chat.id,
-            "❌ Operação cancelada.",
-            reply_markup=KeyboardFactory.criar_teclado_principal()
-        )
-        return
-    
     # Se escolheu "Outro local", pede para digitar
     if message.text == "📍 Outro local":
-        msg = bot.send_message(
+        conversas.avancar(message.chat.id, ETAPA_LOCAL_CUSTOMIZADO, conversa.data, conversa.hora)
+        bot.send_message(
             message.chat.id,
-            "📝 *Digite o nome do local:*",
+            respostas.TEXTO_PEDIR_LOCAL_CUSTOMIZADO,
             parse_mode='Markdown'
         )
-        bot.register_next_step_handler(msg, lambda m: _processar_local_customizado(m, data_str, hora_str))
         return
     
-    local = message.text
-    _salvar_e_confirmar_plantao(message.chat.id, data_str, hora_str, local)
+    conversas.encerrar(message.chat.id)
+    _salvar_e_confirmar_plantao(message.chat.id, conversa.data, conversa.hora, message.text)
 
 
-def _processar_local_customizado(message, data_str, hora_str):
+def _processar_local_customizado(message, conversa):
     """Processa local customizado digitado pelo usuário"""
-    if message.text == "❌ Cancelar":
-        bot.send_message(
-            message.chat.id,
-            "❌ Operação cancelada.",
-            reply_markup=KeyboardFactory.criar_teclado_principal()
-        )
-        return
-    
-    local = message.text
-    _salvar_e_confirmar_plantao(message.chat.id, data_str, hora_str, local)
+    conversas.encerrar(message.chat.id)
+    _salvar_e_confirmar_plantao(message.chat.id, conversa.data, conversa.hora, message.text)
 
 
 def _salvar_e_confirmar_plantao(chat_id, data_str, hora_str, local):
     """Salva plantão e envia confirmação"""
     try:
-        plantao_id = Database.salvar_plantao(chat_id, data_str, hora_str, local)
-        
-        # Calcular data completa para mostrar o ano
-        data_plantao = DateTimeUtils.parse_data_hora(data_str, hora_str)
-        ano_str = f" ({data_plantao.year})" if data_plantao else ""
-        
-        resposta = f"""
-✅ *PLANTÃO SALVO COM SUCESSO!*
-
-📅 *Data:* {data_str}{ano_str}
-⏰ *Hora:* {hora_str}
-🏥 *Local:* {local}
-
-📱 *Lembretes automáticos:*
-   ⏰ 24 horas antes
-   🔔 3 horas antes
-   🚨 30 minutos antes
-
-💡 *Dica:* Já separou tudo que precisa?
-"""
-        
-        bot.send_message(
-            chat_id,
-            resposta,
-            parse_mode='Markdown',
-            reply_markup=KeyboardFactory.criar_teclado_principal()
-        )
+        _responder(chat_id, respostas.salvar_plantao(chat_id, data_str, hora_str, local))
         
         # Notifica namorado
-        enviar_notificacao_namorado(bot, CHAT_ID_NAMORADO, data_str, hora_str, local)
-        
+        enviar_notificacao_namorado(fila_envio, CHAT_ID_NAMORADO, data_str, hora_str, local)
+    
     except Exception as e:
         logger.error(f"Erro ao salvar plantão: {e}")
-        bot.send_message(
-            chat_id,
-            f"❌ *Erro ao salvar plantão:* {str(e)}",
-            parse_mode='Markdown',
-            reply_markup=KeyboardFactory.criar_teclado_principal()
-        )
+        _responder(chat_id, f"❌ *Erro ao salvar plantão:* {str(e)}")
 
 
 @bot.message_handler(commands=['hoje'])
 def cmd_hoje(message):
     """Comando /hoje - Mostra plantões de hoje"""
-    hoje = DateTimeUtils.obter_data_hoje()
-    plantoes = Database.buscar_plantoes_por_data(message.chat.id, hoje)
-    
-    if plantoes:
-        resposta = "📅 *PLANTÕES DE HOJE:*\n\n"
-        for data, hora, local in plantoes:
-            resposta += f"⏰ *{hora}* - {local}\n"
-    else:
-        resposta = "✅ Nenhum plantão hoje! Aproveite o descanso! 😊"
-    
-    bot.send_message(
-        message.chat.id,
-        resposta,
-        parse_mode='Markdown',
-        reply_markup=KeyboardFactory.criar_teclado_principal()
-    )
+    _responder(message.chat.id, respostas.texto_hoje(message.chat.id))
 
 
 @bot.message_handler(commands=['amanha'])
 def cmd_amanha(message):
     """Comando /amanhã - Mostra plantões de amanhã"""
-    amanha = DateTimeUtils.obter_data_amanha()
-    plantoes = Database.buscar_plantoes_por_data(message.chat.id, amanha)
-    
-    if plantoes:
-        resposta = "📅 *PLANTÕES DE AMANHÃ:*\n\n"
-        for data, hora, local in plantoes:
-            resposta += f"⏰ *{hora}* - {local}\n"
-    else:
-        resposta = "✅ Nenhum plantão amanhã! 🎉"
-    
-    bot.send_message(
-        message.chat.id,
-        resposta,
-        parse_mode='Markdown',
-        reply_markup=KeyboardFactory.criar_teclado_principal()
-    )
+    _responder(message.chat.id, respostas.texto_amanha(message.chat.id))
 
 
 @bot.message_handler(commands=['proximos'])
 def cmd_proximos(message):
     """Comando /proximos - Mostra próximos 5 plantões"""
-    plantoes = Database.buscar_proximos_plantoes(message.chat.id, 5)
-    
-    if plantoes:
-        resposta = MessageFormatter.formatar_lista_plantoes(plantoes, "📋 *PRÓXIMOS PLANTÕES:*")
-    else:
-        resposta = "📭 Nenhum plantão agendado ainda.\nUse /plantao para adicionar!"
-    
-    bot.send_message(
-        message.chat.id,
-        resposta,
-        parse_mode='Markdown',
-        reply_markup=KeyboardFactory.criar_teclado_principal()
-    )
+    _responder(message.chat.id, respostas.texto_proximos(message.chat.id))
 
 
 @bot.message_handler(commands=['todos'])
 def cmd_todos(message):
-    """Comando /todos - Mostra todos os plantões"""
-    plantoes = Database.buscar_proximos_plantoes(message.chat.id, 100)
+    """Comando /todos - Mostra todos os plantões (paginado)"""
+    resposta, proximo_cursor = respostas.texto_todos(message.chat.id)
     
-    if plantoes:
-        resposta = MessageFormatter.formatar_lista_plantoes(plantoes, "📋 *TODOS OS PLANTÕES:*")
-        if len(plantoes) > 10:
-            resposta += f"\n\n📊 *Total:* {len(plantoes)} plantões"
+    if proximo_cursor:
+        _responder(message.chat.id, resposta, reply_markup=KeyboardFactory.criar_inline_paginacao(proximo_cursor))
     else:
-        resposta = "📭 Nenhum plantão agendado ainda."
+        _responder(message.chat.id, resposta)
+
+
+@bot.callback_query_handler(func=lambda call: call.data.startswith('todos_'))
+def callback_todos(call):
+    """Handler do botão de próxima página do /todos"""
+    cursor = call.data[len('todos_'):]
+    try:
+        resposta, proximo_cursor = respostas.texto_todos(call.message.chat.id, cursor)
+    except ValueError:
+        bot.answer_callback_query(call.id, "❌ Página inválida!")
+        return
     
-    bot.send_message(
-        message.chat.id,
-        resposta,
+    # Página maior que o limite: a primeira parte substitui a mensagem e o resto vai
+    # em mensagens novas, com o botão de próxima página na última
+    paginacao = KeyboardFactory.criar_inline_paginacao(proximo_cursor) if proximo_cursor else None
+    primeira, *demais = TelegramUtils.dividir_texto(resposta)
+    bot.edit_message_text(
+        primeira,
+        call.message.chat.id,
+        call.message.message_id,
         parse_mode='Markdown',
-        reply_markup=KeyboardFactory.criar_teclado_principal()
+        reply_markup=None if demais else paginacao
     )
+    if demais:
+        _enviar_partes(call.message.chat.id, demais, reply_markup=paginacao)
+    bot.answer_callback_query(call.id)
 
 
 @bot.message_handler(commands=['id'])
 def cmd_id(message):
     """Comando /id - Mostra Chat ID do usuário"""
-    bot.send_message(
-        message.chat.id,
-        f"🔑 *Seu Chat ID:* `{message.chat.id}`\n\nEnvie este número para configurar notificações!",
-        parse_mode='Markdown',
-        reply_markup=KeyboardFactory.criar_teclado_principal()
-    )
+    _responder(message.chat.id, respostas.texto_id(message.chat.id))
 
 
 @bot.message_handler(commands=['debug'])
 def cmd_debug(message):
     """Comando /debug - Informações técnicas"""
-    agora = datetime.now()
-    total = Database.contar_plantoes()
-    meus_plantoes = Database.contar_plantoes(message.chat.id)
-    proximos = Database.buscar_proximos_plantoes(message.chat.id, 5)
-    
-    resposta = f"""
-🔧 *INFORMAÇÕES DE DEBUG:*
-
-⏰ Hora do servidor: {agora.strftime('%d/%m/%Y %H:%M:%S')}
-📊 Total de plantões: {total}
-👤 Seus plantões: {meus_plantoes}
-🤖 Bot: @PlantaoMedBot
-🔑 Seu Chat ID: `{message.chat.id}`
-
-📋 *Seus próximos plantões:*
-"""
-    
-    for data, hora, local in proximos:
-        data_plantao = DateTimeUtils.parse_data_hora(data, hora)
-        if data_plantao:
-            horas_restantes, status = DateTimeUtils.calcular_tempo_restante(data_plantao)
-            # Mostrar ano também para debug
-            ano = data_plantao.year
-            resposta += f"\n📅 *{data}/{ano} {hora}* - {local}\n   {status}\n"
-    
-    resposta += "\n💡 *Dica:* Se o ano estiver errado, use /corrigir_ano"
-    
-    bot.send_message(
-        message.chat.id,
-        resposta,
-        parse_mode='Markdown',
-        reply_markup=KeyboardFactory.criar_teclado_principal()
-    )
+    _responder(message.chat.id, respostas.texto_debug(message.chat.id))
 
 
 @bot.message_handler(commands=['corrigir_ano'])
 def cmd_corrigir_ano(message):
     """Comando para corrigir ano de plantões que foram interpretados errado"""
-    bot.send_message(
-        message.chat.id,
-        """
-🔧 *CORREÇÃO DE ANO*
-
-Se algum plantão foi cadastrado com ano errado, você tem 2 opções:
-
-*Opção 1 - Deletar e recriar:*
-1. Use /deletar para remover o plantão errado
-2. Adicione novamente com /plantao
-
-*Opção 2 - Editar banco (avançado):*
-Use /debug para ver os anos dos plantões.
-
-💡 *Dica para evitar o problema:*
-• Plantões do ano atual: cadastre normalmente
-• Plantões de 2027 em diante: por enquanto use /deletar e recrie quando estiver mais próximo
-
-🤖 *Como funciona:*
-O bot assume que:
-• Datas futuras = ano atual
-• Datas que passaram há pouco (até 6 meses) = ano atual (plantão já aconteceu)
-• Datas que passaram há muito (mais de 6 meses) = ano que vem
-        """,
-        parse_mode='Markdown',
-        reply_markup=KeyboardFactory.criar_teclado_principal()
-    )
+    _responder(message.chat.id, respostas.TEXTO_CORRIGIR_ANO)
 
 
 @bot.message_handler(commands=['limpar_lembretes'])
 def cmd_limpar_lembretes(message):
     """Comando /limpar_lembretes - Reseta status de lembretes (útil para testes)"""
     try:
-        import sqlite3
-        conn = sqlite3.connect('plantoes.db')
-        c = conn.cursor()
-        c.execute('''UPDATE plantoes 
-                     SET lembrete_24h = 0, lembrete_3h = 0, lembrete_30min = 0 
-                     WHERE chat_id = ?''', (message.chat.id,))
-        conn.commit()
-        conn.close()
-        
-        bot.send_message(
-            message.chat.id,
-            "✅ *Lembretes resetados!*\n\nTodos os lembretes foram marcados como não enviados.",
-            parse_mode='Markdown',
-            reply_markup=KeyboardFactory.criar_teclado_principal()
-        )
-        logger.info(f"🔄 Lembretes resetados para usuário {message.chat.id}")
+        Database.resetar_lembretes(message.chat.id)
+        _responder(message.chat.id, respostas.TEXTO_LEMBRETES_RESETADOS)
     except Exception as e:
-        bot.send_message(
-            message.chat.id,
-            f"❌ Erro ao resetar lembretes: {e}",
-            reply_markup=KeyboardFactory.criar_teclado_principal()
-        )
+        _responder(message.chat.id, f"❌ Erro ao resetar lembretes: {e}", parse_mode=None)
 
 
 @bot.message_handler(commands=['deletar'])
 def cmd_deletar(message):
     """Comando /deletar - Lista plantões para deletar"""
-    plantoes = Database.buscar_proximos_plantoes(message.chat.id, 10)
+    plantoes = respostas.plantoes_para_exclusao(message.chat.id)
     
     if not plantoes:
-        bot.send_message(
-            message.chat.id,
-            "📭 Você não tem plantões agendados para deletar.",
-            reply_markup=KeyboardFactory.criar_teclado_principal()
-        )
+        _responder(message.chat.id, respostas.TEXTO_SEM_PLANTOES_PARA_DELETAR, parse_mode=None)
         return
     
-    # Buscar IDs dos plantões para criar botões
-    import sqlite3
-    conn = sqlite3.connect('plantoes.db')
-    conn.row_factory = sqlite3.Row
-    c = conn.cursor()
-    c.execute('''SELECT id, data, hora, local FROM plantoes 
-                 WHERE chat_id = ? AND ativo = 1
-                 ORDER BY substr(data, 4, 2) || substr(data, 1, 2), hora
-                 LIMIT 10''', (message.chat.id,))
-    plantoes_completos = c.fetchall()
-    conn.close()
-    
-    # Criar botões inline para cada plantão
-    markup = types.InlineKeyboardMarkup()
-    for plantao in plantoes_completos:
-        texto_botao = f"🗑️ {plantao['data']} {plantao['hora']} - {plantao['local'][:20]}"
-        markup.add(types.InlineKeyboardButton(
-            texto_botao,
-            callback_data=f"delete_{plantao['id']}"
-        ))
-    
-    markup.add(types.InlineKeyboardButton("❌ Cancelar", callback_data="cancel_delete"))
-    
     bot.send_message(
         message.chat.id,
-        "🗑️ *DELETAR PLANTÃO*\n\nSelecione o plantão que deseja remover:",
+        respostas.TEXTO_ESCOLHER_PLANTAO_DELETAR,
         parse_mode='Markdown',
-        reply_markup=markup
+        reply_markup=KeyboardFactory.criar_inline_exclusao(plantoes)
     )
 
 
@@ -455,7 +278,7 @@ def callback_deletar(call):
     """Handler para os botões de deletar"""
     if call.data == 'cancel_delete':
         bot.edit_message_text(
-            "❌ Operação cancelada.",
+            respostas.TEXTO_OPERACAO_CANCELADA,
             call.message.chat.id,
             call.message.message_id
         )
@@ -465,30 +288,14 @@ def callback_deletar(call):
     # Extrair ID do plantão
     plantao_id = int(call.data.split('_')[1])
     
-    # Buscar dados do plantão antes de deletar
-    import sqlite3
-    conn = sqlite3.connect('plantoes.db')
-    c = conn.cursor()
-    c.execute("SELECT data, hora, local FROM plantoes WHERE id = ? AND chat_id = ?",
-              (plantao_id, call.message.chat.id))
-    plantao = c.fetchone()
-    
-    if not plantao:
+    resposta = respostas.deletar_plantao(plantao_id, call.message.chat.id)
+    if not resposta:
         bot.answer_callback_query(call.id, "❌ Plantão não encontrado!")
         return
     
-    # Deletar plantão
-    Database.desativar_plantao(plantao_id)
-    conn.close()
-    
-    data, hora, local = plantao
-    
     # Atualizar mensagem
     bot.edit_message_text(
-        f"✅ *PLANTÃO DELETADO!*\n\n"
-        f"📅 {data} ⏰ {hora}\n"
-        f"🏥 {local}\n\n"
-        f"O plantão foi removido com sucesso.",
+        resposta,
         call.message.chat.id,
         call.message.message_id,
         parse_mode='Markdown'
@@ -519,26 +326,12 @@ def handle_keyboard(message):
     if handler:
         handler()
     elif not texto.startswith('/'):
-        bot.send_message(
-            message.chat.id,
-            "🤔 *Não entendi!*\n\nUse os botões abaixo ou comandos como:\n`/plantao 15/03 19:00 Hospital`",
-            parse_mode='Markdown',
-            reply_markup=KeyboardFactory.criar_teclado_principal()
-        )
+        _responder(message.chat.id, respostas.TEXTO_NAO_ENTENDI)
 
 
 def _mostrar_ajuda_plantao(message):
     """Mostra ajuda para adicionar plantão"""
-    bot.send_message(
-        message.chat.id,
-        "📝 *Para adicionar plantão:*\n\n"
-        "`/plantao DD/MM HH:MM Hospital`\n\n"
-        "*Exemplo:*\n"
-        "`/plantao 15/03 19:00 Hospital Albert Einstein`\n\n"
-        "Ou clique em ➕ Plantão e siga as instruções!",
-        parse_mode='Markdown',
-        reply_markup=KeyboardFactory.criar_teclado_principal()
-    )
+    _responder(message.chat.id, respostas.TEXTO_AJUDA_PLANTAO)
 
 
 # ========== INICIALIZAÇÃO ==========
@@ -560,22 +353,33 @@ def main():
         print(f"✅ Conectado como: @{bot_info.username}")
         print(f"📛 Nome: {bot_info.first_name}")
         
-        # Inicia serviço de lembretes
+        # Inicia serviço de lembretes e manutenção do banco
         lembrete_service.iniciar()
+        manutencao_service.iniciar()
         
-        # Inicia polling
-        print("\n🔄 Bot rodando... (Ctrl+C para parar)")
-        print("-" * 70)
-        bot.infinity_polling(timeout=30, long_polling_timeout=25)
-        
+        if WEBHOOK_URL:
+            # Atualizações chegam pela API web; este processo cuida dos lembretes
+            bot.set_webhook(url=WEBHOOK_URL.rstrip('/') + WEBHOOK_PATH, secret_token=WEBHOOK_SECRET)
+            print(f"\n🌐 Webhook registrado em {WEBHOOK_URL.rstrip('/')}{WEBHOOK_PATH} (Ctrl+C para parar)")
+            print("-" * 70)
+            lembrete_service.thread.join()
+        else:
+            # Inicia polling
+            bot.remove_webhook()
+            print("\n🔄 Bot rodando... (Ctrl+C para parar)")
+            print("-" * 70)
+            bot.infinity_polling(timeout=30, long_polling_timeout=25)
+    
     except KeyboardInterrupt:
         print("\n👋 Bot interrompido pelo usuário")
         lembrete_service.parar()
-        
+        manutencao_service.parar()
+        fila_envio.parar()
+    
     except Exception as e:
         logger.error(f"💀 ERRO FATAL: {e}", exc_info=True)
         print(f"\n💀 ERRO FATAL: {e}")
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
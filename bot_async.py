@@ -0,0 +1,398 @@
+"""
+Bot de Plantões Médicos - Modo assíncrono (AsyncTeleBot)
+
+Handlers e loop de lembretes compartilham um único event loop; o acesso ao
+SQLite roda no executor para que um handler lento não trave as atualizações.
+"""
+import asyncio
+import logging
+from datetime import datetime
+from functools import partial
+
+from telebot.async_telebot import AsyncTeleBot
+
+import respostas
+from config import BOT_TOKEN, CHAT_ID_NAMORADO, LOG_LEVEL, LOG_FORMAT
+from conversas import Conversas, ETAPA_DATA_HORA, ETAPA_LOCAL, ETAPA_LOCAL_CUSTOMIZADO
+from database import Database
+from envio import FilaEnvio
+from keyboards import KeyboardFactory
+from lembretes import LembreteService, enviar_notificacao_namorado
+from manutencao import ManutencaoService
+from utils import TelegramUtils
+
+# Configurar logging
+logging.basicConfig(level=LOG_LEVEL, format=LOG_FORMAT)
+logger = logging.getLogger(__name__)
+
+# Inicializar bot
+bot = AsyncTeleBot(BOT_TOKEN)
+
+# Inicializar banco de dados
+Database.init_db()
+
+
+class EnvioNoLoop:
+    """Adapta o AsyncTeleBot à FilaEnvio: os workers aguardam o envio feito no event loop"""
+    
+    def __init__(self, bot):
+        self.bot = bot
+        self.loop = None
+    
+    def send_message(self, chat_id, texto, **kwargs):
+        futuro = asyncio.run_coroutine_threadsafe(self.bot.send_message(chat_id, texto, **kwargs), self.loop)
+        return futuro.result()
+
+
+# Fila de envio e serviço de lembretes (mesmos do modo síncrono)
+envio_no_loop = EnvioNoLoop(bot)
+fila_envio = FilaEnvio(envio_no_loop)
+lembrete_service = LembreteService(envio_no_loop, fila_envio)
+manutencao_service = ManutencaoService()
+
+# Conversas em andamento do /plantao interativo
+conversas = Conversas()
+
+
+async def no_executor(funcao, *args):
+    """Executa uma função bloqueante (acesso ao banco) fora do event loop"""
+    return await asyncio.get_running_loop().run_in_executor(None, partial(funcao, *args))
+
+
+async def _responder(chat_id, texto, parse_mode='Markdown', **kwargs):
+    """
+    Envia resposta com o teclado principal (padrão das respostas do bot). Textos
+    maiores que o limite do Telegram saem em várias mensagens, em ordem.
+    """
+    kwargs.setdefault('reply_markup', KeyboardFactory.criar_teclado_principal())
+    return await _enviar_partes(chat_id, TelegramUtils.dividir_texto(texto), parse_mode, **kwargs)
+
+
+async def _enviar_partes(chat_id, partes, parse_mode='Markdown', **kwargs):
+    """Envia as partes de um texto dividido em sequência; kwargs (teclado) vão na última"""
+    *anteriores, ultima = partes
+    for parte in anteriores:
+        await bot.send_message(chat_id, parte, parse_mode=parse_mode)
+    return await bot.send_message(chat_id, ultima, parse_mode=parse_mode, **kwargs)
+
+
+# ========== CONVERSAS EM ANDAMENTO ==========
+
+async def _em_conversa(message) -> bool:
+    """Filtro do handle_conversa: guarda na mensagem a conversa encontrada"""
+    message.conversa = await no_executor(conversas.obter, message.chat.id)
+    return message.conversa is not None
+
+
+# Registrado antes dos comandos: com uma conversa aberta, a mensagem é a resposta
+# da etapa atual (mesmo fluxo do modo síncrono)
+@bot.message_handler(func=_em_conversa)
+async def handle_conversa(message):
+    """Encaminha a mensagem para a etapa da conversa em andamento"""
+    conversa = message.conversa
+    
+    if message.text == "❌ Cancelar":
+        await no_executor(conversas.encerrar, message.chat.id)
+        await _responder(message.chat.id, respostas.TEXTO_OPERACAO_CANCELADA, parse_mode=None)
+        return
+    
+    etapas = {
+        ETAPA_DATA_HORA: _processar_data_hora,
+        ETAPA_LOCAL: _processar_local,
+        ETAPA_LOCAL_CUSTOMIZADO: _processar_local_customizado,
+    }
+    await etapas[conversa.etapa](message, conversa)
+
+
+# ========== HANDLERS DE COMANDOS ==========
+
+@bot.message_handler(commands=['start', 'ajuda', 'help'])
+async def cmd_start(message):
+    """Comando /start - Menu inicial"""
+    await _responder(message.chat.id, respostas.TEXTO_BOAS_VINDAS)
+
+
+@bot.message_handler(commands=['plantao'])
+async def cmd_plantao(message):
+    """Comando /plantao - Adicionar novo plantão"""
+    partes = (message.text or "").split(' ', 3)
+    
+    # Formato completo: /plantao DD/MM HH:MM Local
+    if len(partes) >= 4:
+        plantao, erro = respostas.interpretar_comando_plantao(message.text)
+        
+        if erro:
+            await bot.send_message(message.chat.id, erro, parse_mode='Markdown')
+            return
+        
+        await _salvar_e_confirmar_plantao(message.chat.id, *plantao)
+    
+    # Formato interativo (a etapa é gravada antes da pergunta chegar ao usuário)
+    else:
+        await no_executor(conversas.avancar, message.chat.id, ETAPA_DATA_HORA)
+        await bot.send_message(
+            message.chat.id,
+            respostas.TEXTO_PEDIR_DATA_HORA,
+            parse_mode='Markdown',
+            reply_markup=KeyboardFactory.criar_teclado_data_hora()
+        )
+
+
+async def _processar_data_hora(message, conversa):
+    """Processa entrada de data/hora no modo interativo"""
+    data_hora = respostas.interpretar_data_hora(message.text or "")
+    if not data_hora:
+        await no_executor(conversas.encerrar, message.chat.id)
+        await _responder(message.chat.id, respostas.TEXTO_DATA_HORA_INVALIDA, parse_mode=None)
+        return
+    
+    data_str, hora_str = data_hora
+    await no_executor(conversas.avancar, message.chat.id, ETAPA_LOCAL, data_str, hora_str)
+    await bot.send_message(
+        message.chat.id,
+        respostas.TEXTO_PEDIR_LOCAL,
+        parse_mode='Markdown',
+        reply_markup=KeyboardFactory.criar_teclado_locais()
+    )
+
+
+async def _processar_local(message, conversa):
+    """Processa entrada de local no modo interativo"""
+    # Se escolheu "Outro local", pede para digitar
+    if message.text == "📍 Outro local":
+        await no_executor(conversas.avancar, message.chat.id, ETAPA_LOCAL_CUSTOMIZADO, conversa.data, conversa.hora)
+        await bot.send_message(
+            message.chat.id,
+            respostas.TEXTO_PEDIR_LOCAL_CUSTOMIZADO,
+            parse_mode='Markdown'
+        )
+        return
+    
+    await no_executor(conversas.encerrar, message.chat.id)
+    await _salvar_e_confirmar_plantao(message.chat.id, conversa.data, conversa.hora, message.text)
+
+
+async def _processar_local_customizado(message, conversa):
+    """Processa local customizado digitado pelo usuário"""
+    await no_executor(conversas.encerrar, message.chat.id)
+    await _salvar_e_confirmar_plantao(message.chat.id, conversa.data, conversa.hora, message.text)
+
+
+async def _salvar_e_confirmar_plantao(chat_id, data_str, hora_str, local):
+    """Salva plantão e envia confirmação"""
+    try:
+        resposta = await no_executor(respostas.salvar_plantao, chat_id, data_str, hora_str, local)
+        await _responder(chat_id, resposta)
+        
+        # Notifica namorado
+        await no_executor(enviar_notificacao_namorado, fila_envio, CHAT_ID_NAMORADO, data_str, hora_str, local)
+    
+    except Exception as e:
+        logger.error(f"Erro ao salvar plantão: {e}")
+        await _responder(chat_id, f"❌ *Erro ao salvar plantão:* {str(e)}")
+
+
+@bot.message_handler(commands=['hoje'])
+async def cmd_hoje(message):
+    """Comando /hoje - Mostra plantões de hoje"""
+    await _responder(message.chat.id, await no_executor(respostas.texto_hoje, message.chat.id))
+
+
+@bot.message_handler(commands=['amanha'])
+async def cmd_amanha(message):
+    """Comando /amanhã - Mostra plantões de amanhã"""
+    await _responder(message.chat.id, await no_executor(respostas.texto_amanha, message.chat.id))
+
+
+@bot.message_handler(commands=['proximos'])
+async def cmd_proximos(message):
+    """Comando /proximos - Mostra próximos 5 plantões"""
+    await _responder(message.chat.id, await no_executor(respostas.texto_proximos, message.chat.id))
+
+
+@bot.message_handler(commands=['todos'])
+async def cmd_todos(message):
+    """Comando /todos - Mostra todos os plantões (paginado)"""
+    resposta, proximo_cursor = await no_executor(respostas.texto_todos, message.chat.id)
+    
+    if proximo_cursor:
+        await _responder(message.chat.id, resposta, reply_markup=KeyboardFactory.criar_inline_paginacao(proximo_cursor))
+    else:
+        await _responder(message.chat.id, resposta)
+
+
+@bot.callback_query_handler(func=lambda call: call.data.startswith('todos_'))
+async def callback_todos(call):
+    """Handler do botão de próxima página do /todos"""
+    cursor = call.data[len('todos_'):]
+    try:
+        resposta, proximo_cursor = await no_executor(respostas.texto_todos, call.message.chat.id, cursor)
+    except ValueError:
+        await bot.answer_callback_query(call.id, "❌ Página inválida!")
+        return
+    
+    # Página maior que o limite: a primeira parte substitui a mensagem e o resto vai
+    # em mensagens novas, com o botão de próxima página na última
+    paginacao = KeyboardFactory.criar_inline_paginacao(proximo_cursor) if proximo_cursor else None
+    primeira, *demais = TelegramUtils.dividir_texto(resposta)
+    await bot.edit_message_text(
+        primeira,
+        call.message.chat.id,
+        call.message.message_id,
+        parse_mode='Markdown',
+        reply_markup=None if demais else paginacao
+    )
+    if demais:
+        await _enviar_partes(call.message.chat.id, demais, reply_markup=paginacao)
+    await bot.answer_callback_query(call.id)
+
+
+@bot.message_handler(commands=['id'])
+async def cmd_id(message):
+    """Comando /id - Mostra Chat ID do usuário"""
+    await _responder(message.chat.id, respostas.texto_id(message.chat.id))
+
+
+@bot.message_handler(commands=['debug'])
+async def cmd_debug(message):
+    """Comando /debug - Informações técnicas"""
+    await _responder(message.chat.id, await no_executor(respostas.texto_debug, message.chat.id))
+
+
+@bot.message_handler(commands=['corrigir_ano'])
+async def cmd_corrigir_ano(message):
+    """Comando para corrigir ano de plantões que foram interpretados errado"""
+    await _responder(message.chat.id, respostas.TEXTO_CORRIGIR_ANO)
+
+
+@bot.message_handler(commands=['limpar_lembretes'])
+async def cmd_limpar_lembretes(message):
+    """Comando /limpar_lembretes - Reseta status de lembretes (útil para testes)"""
+    try:
+        await no_executor(Database.resetar_lembretes, message.chat.id)
+        await _responder(message.chat.id, respostas.TEXTO_LEMBRETES_RESETADOS)
+    except Exception as e:
+        await _responder(message.chat.id, f"❌ Erro ao resetar lembretes: {e}", parse_mode=None)
+
+
+@bot.message_handler(commands=['deletar'])
+async def cmd_deletar(message):
+    """Comando /deletar - Lista plantões para deletar"""
+    plantoes = await no_executor(respostas.plantoes_para_exclusao, message.chat.id)
+    
+    if not plantoes:
+        await _responder(message.chat.id, respostas.TEXTO_SEM_PLANTOES_PARA_DELETAR, parse_mode=None)
+        return
+    
+    await bot.send_message(
+        message.chat.id,
+        respostas.TEXTO_ESCOLHER_PLANTAO_DELETAR,
+        parse_mode='Markdown',
+        reply_markup=KeyboardFactory.criar_inline_exclusao(plantoes)
+    )
+
+
+@bot.callback_query_handler(func=lambda call: call.data.startswith('delete_') or call.data == 'cancel_delete')
+async def callback_deletar(call):
+    """Handler para os botões de deletar"""
+    if call.data == 'cancel_delete':
+        await bot.edit_message_text(
+            respostas.TEXTO_OPERACAO_CANCELADA,
+            call.message.chat.id,
+            call.message.message_id
+        )
+        await bot.answer_callback_query(call.id)
+        return
+    
+    # Extrair ID do plantão
+    plantao_id = int(call.data.split('_')[1])
+    
+    resposta = await no_executor(respostas.deletar_plantao, plantao_id, call.message.chat.id)
+    if not resposta:
+        await bot.answer_callback_query(call.id, "❌ Plantão não encontrado!")
+        return
+    
+    # Atualizar mensagem
+    await bot.edit_message_text(
+        resposta,
+        call.message.chat.id,
+        call.message.message_id,
+        parse_mode='Markdown'
+    )
+    
+    await bot.answer_callback_query(call.id, "✅ Plantão deletado!")
+    logger.info(f"🗑️ Plantão {plantao_id} deletado pelo usuário {call.message.chat.id}")
+
+
+# ========== HANDLER DE BOTÕES DO TECLADO ==========
+
+@bot.message_handler(func=lambda message: True)
+async def handle_keyboard(message):
+    """Processa cliques nos botões do teclado"""
+    texto = message.text or ""
+    
+    handlers = {
+        "➕ Plantão": lambda: _mostrar_ajuda_plantao(message),
+        "📅 Hoje": lambda: cmd_hoje(message),
+        "📆 Amanhã": lambda: cmd_amanha(message),
+        "📋 Próximos": lambda: cmd_proximos(message),
+        "🗑️ Deletar": lambda: cmd_deletar(message),
+        "🔧 Debug": lambda: cmd_debug(message),
+        "❓ Ajuda": lambda: cmd_start(message)
+    }
+    
+    handler = handlers.get(texto)
+    if handler:
+        await handler()
+    elif not texto.startswith('/'):
+        await _responder(message.chat.id, respostas.TEXTO_NAO_ENTENDI)
+
+
+async def _mostrar_ajuda_plantao(message):
+    """Mostra ajuda para adicionar plantão"""
+    await _responder(message.chat.id, respostas.TEXTO_AJUDA_PLANTAO)
+
+
+# ========== INICIALIZAÇÃO ==========
+
+async def executar():
+    """Roda polling e lembretes no mesmo event loop"""
+    envio_no_loop.loop = asyncio.get_running_loop()
+    
+    bot_info = await bot.get_me()
+    print(f"✅ Conectado como: @{bot_info.username}")
+    print(f"📛 Nome: {bot_info.first_name}")
+    
+    tarefa_lembretes = asyncio.create_task(lembrete_service.executar_async())
+    manutencao_service.iniciar()
+    try:
+        print("\n🔄 Bot rodando em modo assíncrono... (Ctrl+C para parar)")
+        print("-" * 70)
+        await bot.infinity_polling(timeout=30, request_timeout=35)
+    finally:
+        lembrete_service.parar()
+        manutencao_service.parar()
+        tarefa_lembretes.cancel()
+        await no_executor(fila_envio.parar)
+        await bot.close_session()
+
+
+def main():
+    """Função principal"""
+    print("=" * 70)
+    print("🤖 BOT DE PLANTÕES MÉDICOS - MODO ASSÍNCRONO")
+    print("=" * 70)
+    print(f"⏰ Iniciado em: {datetime.now().strftime('%d/%m/%Y %H:%M:%S')}")
+    print("=" * 70)
+    
+    try:
+        asyncio.run(executar())
+    except KeyboardInterrupt:
+        print("\n👋 Bot interrompido pelo usuário")
+    except Exception as e:
+        logger.error(f"💀 ERRO FATAL: {e}", exc_info=True)
+        print(f"\n💀 ERRO FATAL: {e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Módulo de cache em memória (TTL + LRU) para respostas da API web
+"""
+import hashlib
+import logging
+import time
+from collections import OrderedDict
+from threading import Lock
+from typing import Dict, Hashable, Optional, Set, Tuple
+
+from config import CACHE_API_TTL, CACHE_API_MAX_ITENS
+
+logger = logging.getLogger(__name__)
+
+
+class CacheRespostas:
+    """
+    Cache LRU com expiração por tempo, agrupado por chat para invalidação. Cada
+    resposta guarda a versão dos plantões do chat com que foi gerada: como a versão
+    vem do banco, uma escrita de outro processo também torna a resposta inválida.
+    """
+    
+    def __init__(self, ttl: float = CACHE_API_TTL, max_itens: int = CACHE_API_MAX_ITENS):
+        self.ttl = ttl
+        self.max_itens = max_itens
+        self._itens: "OrderedDict[Hashable, Tuple[float, str, bytes, int]]" = OrderedDict()
+        self._por_chat: Dict[int, Set[Hashable]] = {}
+        self._lock = Lock()
+        self._stats = {'acertos': 0, 'falhas': 0, 'invalidacoes': 0}
+    
+    def obter(self, chat_id: int, chave: Hashable, versao: int = 0) -> Optional[Tuple[str, bytes]]:
+        """Retorna (etag, corpo) se a resposta estiver no cache, na `versao` atual e não tiver expirado"""
+        with self._lock:
+            item = self._itens.get((chat_id, chave))
+            if item is None or item[0] < time.monotonic() or item[3] != versao:
+                if item is not None:
+                    self._remover((chat_id, chave))
+                self._stats['falhas'] += 1
+                return None
+            
+            self._itens.move_to_end((chat_id, chave))
+            self._stats['acertos'] += 1
+            return item[1], item[2]
+    
+    def guardar(self, chat_id: int, chave: Hashable, corpo: bytes, versao: int = 0) -> str:
+        """Guarda o corpo da resposta (gerada na `versao` dos plantões do chat) e retorna seu ETag"""
+        etag = hashlib.sha1(corpo).hexdigest()
+        with self._lock:
+            self._itens[(chat_id, chave)] = (time.monotonic() + self.ttl, etag, corpo, versao)
+            self._itens.move_to_end((chat_id, chave))
+            self._por_chat.setdefault(chat_id, set()).add((chat_id, chave))
+            
+            while len(self._itens) > self.max_itens:
+                self._remover(next(iter(self._itens)))
+        return etag
+    
+    def invalidar(self, chat_id: int):
+        """Descarta todas as respostas de um chat"""
+        with self._lock:
+            chaves = self._por_chat.pop(chat_id, ())
+            for chave in chaves:
+                self._itens.pop(chave, None)
+            if chaves:
+                self._stats['invalidacoes'] += 1
+                logger.debug(f"🧹 Cache do chat {chat_id} invalidado ({len(chaves)} respostas)")
+    
+    def limpar(self):
+        """Descarta todo o cache"""
+        with self._lock:
+            self._itens.clear()
+            self._por_chat.clear()
+    
+    def estatisticas(self) -> dict:
+        """Retorna contadores de acertos, falhas e invalidações"""
+        with self._lock:
+            return dict(self._stats, itens=len(self._itens))
+    
+    def ao_alterar_plantoes(self, evento: str, dados: dict):
+        """Ouvinte do Database: invalida o cache dos chats alterados"""
+        if dados.get('chat_id') is not None:
+            self.invalidar(dados['chat_id'])
+        for chat_id in dados.get('chat_ids', ()):
+            self.invalidar(chat_id)
+    
+    def _remover(self, chave: Tuple[int, Hashable]):
+        """Remove um item e sua referência no índice por chat (com o lock adquirido)"""
+        self._itens.pop(chave, None)
+        chaves_chat = self._por_chat.get(chave[0])
+        if chaves_chat is not None:
+            chaves_chat.discard(chave)
+            if not chaves_chat:
+                del self._por_chat[chave[0]]
@@ -14,6 +14,14 @@ CHAT_ID_NAMORADO = os.getenv('CHAT_ID_NAMORADO', '')  # Opcional
 # Configurações da API Web
 API_URL = os.getenv('API_URL', 'http://localhost:5000')  # URL da API para o frontend
 
+# Configurações de Webhook (sem WEBHOOK_URL o bot usa long polling)
+WEBHOOK_URL = os.getenv('WEBHOOK_URL', '')  # URL pública da API web, ex: https://seu-app.com
+WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET', '')  # Enviado pelo Telegram no header de cada update
+WEBHOOK_PATH = '/webhook'
+
+# Threads que processam atualizações recebidas (polling ou webhook)
+BOT_WORKERS = 4
+
 # Validação: Token é obrigatório
 if not BOT_TOKEN:
     print("❌ ERRO: BOT_TOKEN não encontrado!")
@@ -22,8 +30,19 @@ if not BOT_TOKEN:
     print("\n📝 Obtenha seu token em: https://t.me/BotFather")
     sys.exit(1)
 
+# Validação: sem secret a rota /webhook responde 404 e as atualizações se perderiam
+if WEBHOOK_URL and not WEBHOOK_SECRET:
+    print("❌ ERRO: WEBHOOK_URL definido sem WEBHOOK_SECRET!")
+    print("💡 Defina no .env um valor aleatório, ex:")
+    print("   WEBHOOK_SECRET=$(openssl rand -hex 32)")
+    sys.exit(1)
+
 # Configurações do Banco de Dados
 DATABASE_NAME = 'plantoes.db'
+DB_BUSY_TIMEOUT = 5.0  # segundos esperando lock de escrita
+DB_CACHE_ESPERA = 0.05  # segundos esperando lock para gravar um cache (depois desiste)
+DB_CACHE_SIZE_KB = 8192  # cache de páginas por conexão
+DB_MMAP_SIZE = 64 * 1024 * 1024  # leitura via mmap (bytes)
 
 # Configurações de Lembretes (em horas)
 LEMBRETE_24H = 24
@@ -35,9 +54,62 @@ TOLERANCIA_24H = 0.5
 TOLERANCIA_3H = 0.25
 TOLERANCIA_30MIN = 0.17
 
-# Intervalo de verificação de lembretes (em segundos)
+# Janelas de lembrete em ordem cronológica: (tipo, horas antes, tolerância em horas)
+JANELAS_LEMBRETE = (
+    ('24h', LEMBRETE_24H, TOLERANCIA_24H),
+    ('3h', LEMBRETE_3H, TOLERANCIA_3H),
+    ('30min', LEMBRETE_30MIN, TOLERANCIA_30MIN),
+)
+
+# Intervalo máximo entre verificações de lembretes (em segundos)
 INTERVALO_VERIFICACAO = 60
 
+# Workers de lembretes: chats divididos em shards (hash do chat_id), cada shard
+# processado por um único worker que mantém um lease renovado no banco
+LEMBRETE_SHARDS = int(os.getenv('LEMBRETE_SHARDS', '1'))
+LEASE_DURACAO = 30  # segundos sem heartbeat até outro worker assumir o shard
+
+# Manutenção do banco (arquivamento de plantões antigos/deletados)
+ARQUIVAR_APOS_DIAS = 30  # plantões que passaram há mais dias vão para plantoes_arquivo
+ARQUIVO_LOTE = 200  # linhas movidas por transação
+ARQUIVO_PAUSA = 0.05  # segundos entre lotes (libera o banco para o bot)
+MANUTENCAO_INTERVALO = 6 * 3600  # segundos entre execuções
+VACUUM_PAGINAS = 1000  # páginas devolvidas ao sistema por execução
+
+# Configurações de envio de mensagens (limites do Telegram)
+ENVIO_WORKERS = 4
+ENVIO_LIMITE_GLOBAL = 30  # mensagens por segundo
+ENVIO_LIMITE_POR_CHAT = 1  # mensagens por segundo em cada chat
+ENVIO_MAX_TENTATIVAS = 5
+ENVIO_TAMANHO_FILA = 1000
+
+# Outbox de lembretes (entrega persistida no banco, com novas tentativas)
+OUTBOX_LOTE = 50  # mensagens reservadas por rodada
+OUTBOX_PRAZO_ENVIO = 300  # segundos de cada reserva (renovada enquanto espera na FilaEnvio; vence se o processo cair)
+OUTBOX_MAX_TENTATIVAS = 8
+OUTBOX_BACKOFF_BASE = 30  # segundos antes da 2ª tentativa; dobra a cada falha
+OUTBOX_BACKOFF_MAX = 3600
+OUTBOX_RETENCAO_DIAS = 7  # mensagens finalizadas mantidas para consulta
+
+# Paginação das listas de plantões
+PAGINACAO_LIMITE_MAX = 50  # maior página aceita pela API
+PAGINACAO_TAMANHO_BOT = 10  # plantões por página no /todos
+
+# Cache do parse de data/hora (pares DD/MM + HH:MM convertidos por dia)
+PARSE_CACHE_MAX_ITENS = 4096
+
+# Conversas em andamento (fluxo interativo do /plantao)
+CONVERSA_TTL = 15 * 60  # segundos sem resposta até a conversa ser descartada
+CONVERSA_MAX_ITENS = 1024  # conversas mantidas em memória (sem persistência)
+CONVERSA_PERSISTIR = os.getenv('CONVERSA_PERSISTIR', 'true').lower() == 'true'  # no banco: sobrevive a reinícios e vale entre workers
+
+# Textos das mensagens: JSON opcional {nome: texto} que substitui os templates padrão
+TEMPLATES_ARQUIVO = os.getenv('TEMPLATES_ARQUIVO')
+
+# Cache das respostas da API web
+CACHE_API_TTL = 30  # segundos (escritas de qualquer processo já invalidam pela versão do chat)
+CACHE_API_MAX_ITENS = 1024
+
 # Configurações de Logging
 LOG_LEVEL = 'INFO'
 LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
\ No newline at end of file
@@ -0,0 +1,117 @@
+"""
+Módulo de estado das conversas em andamento (fluxo interativo do /plantao)
+"""
+import logging
+import time
+from collections import OrderedDict
+from threading import Lock, local
+from typing import Optional
+
+from config import CONVERSA_TTL, CONVERSA_MAX_ITENS, CONVERSA_PERSISTIR
+from database import Database
+
+logger = logging.getLogger(__name__)
+
+# Etapas do fluxo interativo do /plantao
+ETAPA_DATA_HORA = 'data_hora'
+ETAPA_LOCAL = 'local'
+ETAPA_LOCAL_CUSTOMIZADO = 'local_customizado'
+
+
+class Conversa:
+    """Estado de uma conversa: etapa atual e dados já respondidos"""
+    
+    __slots__ = ('etapa', 'data', 'hora', 'expira_em')
+    
+    def __init__(self, etapa: str, data: Optional[str], hora: Optional[str], expira_em: float):
+        self.etapa = etapa
+        self.data = data
+        self.hora = hora
+        self.expira_em = expira_em
+
+
+class Conversas:
+    """
+    Conversas em andamento por chat, com expiração (conversas abandonadas somem após
+    `ttl` segundos sem resposta). Persistidas no banco, valem entre reinícios e entre
+    workers (webhook com vários processos); em memória, ficam limitadas a `max_itens`
+    (as mais antigas saem primeiro).
+    
+    Persistidas, os chats com conversa aberta também ficam num conjunto em memória
+    (carregado na criação e mantido por avancar/encerrar), e `obter` só busca a
+    conversa no banco para esses chats. Antes de descartar um chat fora do conjunto,
+    o PRAGMA data_version (que muda a cada commit de outra conexão, de qualquer
+    processo) diz se o banco mudou; só então o conjunto é recarregado, e as conversas
+    abertas por outros workers entram sem janela de atraso.
+    """
+    
+    def __init__(self, ttl: float = CONVERSA_TTL, max_itens: int = CONVERSA_MAX_ITENS,
+                 persistir: bool = CONVERSA_PERSISTIR):
+        self.ttl = ttl
+        self.max_itens = max_itens
+        self.persistir = persistir
+        self._itens: "OrderedDict[int, Conversa]" = OrderedDict()
+        self._abertas = set()
+        self._vistos = local()  # data_version visto pela conexão de cada thread
+        self._lock = Lock()
+        if persistir:
+            with self._lock:
+                self._abertas = set(Database.buscar_chats_em_conversa())
+    
+    def obter(self, chat_id: int) -> Optional[Conversa]:
+        """Retorna a conversa em andamento do chat (None se não houver ou se expirou)"""
+        if self.persistir:
+            if chat_id not in self._abertas:
+                self._recarregar_se_mudou()
+                if chat_id not in self._abertas:
+                    return None
+            linha = Database.buscar_conversa(chat_id)
+            if linha is None:
+                self._abertas.discard(chat_id)
+                return None
+            return Conversa(*linha)
+        
+        with self._lock:
+            conversa = self._itens.get(chat_id)
+            if conversa is not None and conversa.expira_em <= time.time():
+                del self._itens[chat_id]
+                return None
+            return conversa
+    
+    def _recarregar_se_mudou(self):
+        """Recarrega os chats com conversa aberta se outra conexão alterou o banco"""
+        # Lido antes da recarga: um commit que chegue depois muda a versão outra vez
+        versao = Database.versao_dados()
+        if getattr(self._vistos, 'versao', None) == versao:
+            return
+        
+        # Sob o lock: avancar/encerrar deste processo não se perdem na troca do conjunto
+        with self._lock:
+            self._abertas = set(Database.buscar_chats_em_conversa())
+        self._vistos.versao = versao
+    
+    def avancar(self, chat_id: int, etapa: str, data: Optional[str] = None, hora: Optional[str] = None):
+        """Inicia a conversa ou a leva para a etapa seguinte (renova a expiração)"""
+        conversa = Conversa(etapa, data, hora, time.time() + self.ttl)
+        if self.persistir:
+            with self._lock:
+                Database.gravar_conversa(chat_id, etapa, data, hora, conversa.expira_em)
+                self._abertas.add(chat_id)
+            return
+        
+        with self._lock:
+            self._itens[chat_id] = conversa
+            self._itens.move_to_end(chat_id)
+            while len(self._itens) > self.max_itens:
+                self._itens.popitem(last=False)
+    
+    def encerrar(self, chat_id: int):
+        """Encerra a conversa do chat (concluída, cancelada ou inválida)"""
+        if self.persistir:
+            with self._lock:
+                self._abertas.discard(chat_id)
+                Database.apagar_conversa(chat_id)
+            return
+        
+        with self._lock:
+            self._itens.pop(chat_id, None)
@@ -1,115 +1,262 @@
 """
 Módulo de gerenciamento do banco de dados
 """
+import json
+import os
 import sqlite3
 import logging
-from datetime import datetime
-from typing import List, Optional, Tuple
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
 from contextlib import contextmanager
-from config import DATABASE_NAME
+from config import (
+    DATABASE_NAME, DB_BUSY_TIMEOUT, DB_CACHE_ESPERA, DB_CACHE_SIZE_KB, DB_MMAP_SIZE,
+    ARQUIVAR_APOS_DIAS, ARQUIVO_LOTE, ARQUIVO_PAUSA, VACUUM_PAGINAS, JANELAS_LEMBRETE,
+    LEASE_DURACAO, OUTBOX_PRAZO_ENVIO, OUTBOX_RETENCAO_DIAS
+)
+from migracoes import migrar
+from utils import DateTimeUtils
 
 logger = logging.getLogger(__name__)
 
+# Tipos de lembrete com coluna de controle na tabela plantoes
+TIPOS_LEMBRETE_VALIDOS = tuple(tipo for tipo, _, _ in JANELAS_LEMBRETE)
+
+# Máximo de ids em um IN (?, ...): bem abaixo do SQLITE_MAX_VARIABLE_NUMBER de builds antigos (999)
+MAX_IDS_POR_CONSULTA = 500
+
+# Conexão persistente por thread (evita abrir/fechar o arquivo a cada consulta)
+_conexoes = threading.local()
+
+# Funções notificadas após alterações em plantões (ex: agenda de lembretes)
+_ouvintes = []
+
+
+def _criar_conexao() -> sqlite3.Connection:
+    """Abre uma conexão e aplica os pragmas uma única vez"""
+    conn = sqlite3.connect(DATABASE_NAME, timeout=DB_BUSY_TIMEOUT)
+    conn.row_factory = sqlite3.Row
+    # Só tem efeito em banco novo (antes do WAL criar o arquivo); existentes são convertidos em Database.compactar
+    conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = NORMAL")
+    conn.execute(f"PRAGMA cache_size = -{DB_CACHE_SIZE_KB}")
+    conn.execute(f"PRAGMA mmap_size = {DB_MMAP_SIZE}")
+    conn.execute("PRAGMA temp_store = MEMORY")
+    return conn
+
+
+def _obter_conexao() -> sqlite3.Connection:
+    """Retorna a conexão persistente da thread atual (recriada após fork)"""
+    conn = getattr(_conexoes, 'conn', None)
+    if conn is None or _conexoes.pid != os.getpid():
+        conn = _criar_conexao()
+        _conexoes.conn = conn
+        _conexoes.pid = os.getpid()
+        _conexoes.profundidade = 0
+        _conexoes.notificacoes = []
+    return conn
+
+
+def _chamar_ouvintes(evento: str, dados: dict):
+    """Chama os ouvintes registrados (erros de um ouvinte não afetam os demais)"""
+    for callback in list(_ouvintes):
+        try:
+            callback(evento, dados)
+        except Exception as e:
+            logger.error(f"Erro ao notificar alteração '{evento}': {e}")
+
 
 @contextmanager
 def get_db_connection():
-    """Context manager para conexões do banco de dados"""
-    conn = sqlite3.connect(DATABASE_NAME)
-    conn.row_factory = sqlite3.Row
+    """Context manager para conexões do banco de dados (uma conexão persistente por thread)"""
+    conn = _obter_conexao()
+    _conexoes.profundidade += 1
+    externa = _conexoes.profundidade == 1
     try:
         yield conn
-        conn.commit()
+        if externa:
+            conn.commit()
     except Exception as e:
-        conn.rollback()
+        if externa:
+            conn.rollback()
+            _conexoes.notificacoes = []
         logger.error(f"Erro no banco de dados: {e}")
         raise
     finally:
+        _conexoes.profundidade -= 1
+    
+    # Notificações feitas dentro da transação só saem depois do commit
+    if externa and _conexoes.notificacoes:
+        notificacoes, _conexoes.notificacoes = _conexoes.notificacoes, []
+        for evento, dados in notificacoes:
+            _chamar_ouvintes(evento, dados)
+
+
+def fechar_conexao():
+    """Fecha a conexão persistente da thread atual"""
+    conn = getattr(_conexoes, 'conn', None)
+    if conn is not None and _conexoes.pid == os.getpid():
         conn.close()
+    _conexoes.conn = None
 
 
 class Database:
     """Classe para gerenciar operações do banco de dados"""
     
+    @staticmethod
+    def registrar_ouvinte(callback):
+        """Registra função chamada como callback(evento, dados) após cada alteração"""
+        _ouvintes.append(callback)
+    
+    @staticmethod
+    def _notificar(evento: str, **dados):
+        """Notifica os ouvintes sobre uma alteração (dentro de uma transação, após o commit)"""
+        if getattr(_conexoes, 'profundidade', 0) > 0:
+            _conexoes.notificacoes.append((evento, dados))
+            return
+        _chamar_ouvintes(evento, dados)
+    
     @staticmethod
     def init_db():
-        """Inicializa e verifica estrutura do banco de dados"""
+        """Inicializa o banco, aplicando as migrações pendentes (ver migracoes.py)"""
         with get_db_connection() as conn:
-            c = conn.cursor()
-            
-            # Criar tabela principal
-            c.execute('''
-                CREATE TABLE IF NOT EXISTS plantoes (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    chat_id INTEGER NOT NULL,
-                    data TEXT NOT NULL,
-                    hora TEXT NOT NULL,
-                    local TEXT NOT NULL,
-                    lembrete_24h BOOLEAN DEFAULT 0,
-                    lembrete_3h BOOLEAN DEFAULT 0,
-                    lembrete_30min BOOLEAN DEFAULT 0,
-                    ativo BOOLEAN DEFAULT 1,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
-            
-            # Criar índices para melhor performance
-            c.execute('''
-                CREATE INDEX IF NOT EXISTS idx_chat_id 
-                ON plantoes(chat_id)
-            ''')
-            
-            c.execute('''
-                CREATE INDEX IF NOT EXISTS idx_data_hora 
-                ON plantoes(data, hora)
-            ''')
-            
-            # Verificar e adicionar colunas faltantes
-            c.execute("PRAGMA table_info(plantoes)")
-            colunas_existentes = [col[1] for col in c.fetchall()]
-            
-            colunas_necessarias = {
-                'lembrete_24h': 'BOOLEAN DEFAULT 0',
-                'lembrete_3h': 'BOOLEAN DEFAULT 0',
-                'lembrete_30min': 'BOOLEAN DEFAULT 0',
-                'ativo': 'BOOLEAN DEFAULT 1'
-            }
-            
-            for coluna, tipo in colunas_necessarias.items():
-                if coluna not in colunas_existentes:
-                    try:
-                        c.execute(f"ALTER TABLE plantoes ADD COLUMN {coluna} {tipo}")
-                        logger.info(f"✅ Coluna {coluna} adicionada")
-                    except sqlite3.OperationalError as e:
-                        logger.warning(f"Coluna {coluna} já existe: {e}")
-            
-            conn.commit()
-            logger.info("✅ Banco de dados inicializado com sucesso")
+            versao = migrar(conn)
+        logger.info(f"✅ Banco de dados inicializado com sucesso (schema v{versao})")
+    
+    @staticmethod
+    def _calcular_inicio_ts(data_str: str, hora_str: str) -> Optional[int]:
+        """Converte data/hora do plantão para timestamp epoch (UTC)"""
+        data_plantao = DateTimeUtils.parse_data_hora(data_str, hora_str)
+        return int(data_plantao.timestamp()) if data_plantao else None
     
     @staticmethod
     def salvar_plantao(chat_id: int, data_str: str, hora_str: str, local: str) -> int:
         """Salva um novo plantão"""
+        inicio_ts = Database._calcular_inicio_ts(data_str, hora_str)
         with get_db_connection() as conn:
             c = conn.cursor()
             c.execute('''
-                INSERT INTO plantoes (chat_id, data, hora, local) 
-                VALUES (?, ?, ?, ?)
-            ''', (chat_id, data_str, hora_str, local))
+                INSERT INTO plantoes (chat_id, data, hora, local, inicio_ts) 
+                VALUES (?, ?, ?, ?, ?)
+            ''', (chat_id, data_str, hora_str, local, inicio_ts))
             plantao_id = c.lastrowid
+            
+            # Lembretes pré-calculados (só janelas que ainda não fecharam)
+            if inicio_ts is not None:
+                agora = int(time.time())
+                c.executemany('''
+                    INSERT INTO lembretes (plantao_id, tipo, due_at, expira_em) 
+                    VALUES (?, ?, ?, ?)
+                ''', [(plantao_id, tipo, abre_em, fecha_em)
+                      for tipo, abre_em, fecha_em in DateTimeUtils.janelas_lembrete(inicio_ts)
+                      if fecha_em >= agora])
+            Database._invalidar_agenda(c, [chat_id])
             logger.info(f"📝 Plantão {plantao_id} salvo: {data_str} {hora_str} - {local}")
-            return plantao_id
+        
+        Database._notificar('salvar', plantao_id=plantao_id, chat_id=chat_id,
+                            data=data_str, hora=hora_str, local=local, inicio_ts=inicio_ts)
+        return plantao_id
     
     @staticmethod
     def buscar_plantoes_por_data(chat_id: int, data_str: str) -> List[Tuple]:
-        """Busca plantões de uma data específica"""
+        """
+        Busca plantões de uma data específica. A agenda de cada (chat, dia) fica em
+        cache_agenda, preenchida na primeira leitura e apagada nas escritas do chat;
+        como a chave é a data, a virada do dia não serve uma agenda antiga.
+        
+        A leitura não pega o lock de escrita: a agenda e a versão do chat são lidas no
+        mesmo snapshot, e o cache só é gravado se a versão não mudou desde então (uma
+        escrita no meio invalida a agenda lida). A gravação é uma tentativa rápida:
+        com o banco ocupado, a agenda só não fica em cache desta vez.
+        """
+        inicio_dia = DateTimeUtils.parse_data_hora(data_str, '00:00')
+        if not inicio_dia:
+            return []
+        fim_dia = inicio_dia + timedelta(days=1)
+        dia = inicio_dia.date().isoformat()
+        
         with get_db_connection() as conn:
             c = conn.cursor()
+            c.execute('SELECT plantoes FROM cache_agenda WHERE chat_id = ? AND dia = ?', (chat_id, dia))
+            linha = c.fetchone()
+            if linha is not None:
+                return [tuple(plantao) for plantao in json.loads(linha['plantoes'])]
+            
+            # Dentro de uma transação do chamador tudo já vale no mesmo snapshot
+            propria = not conn.in_transaction
+            if propria:
+                c.execute('BEGIN')
+            c.execute('SELECT versao FROM versoes_agenda WHERE chat_id = ?', (chat_id,))
+            linha = c.fetchone()
+            versao = linha['versao'] if linha else 0
             c.execute('''
                 SELECT data, hora, local 
                 FROM plantoes 
-                WHERE chat_id = ? AND data = ? AND ativo = 1
-                ORDER BY hora
-            ''', (chat_id, data_str))
-            return c.fetchall()
+                WHERE chat_id = ? AND ativo = 1 
+                  AND inicio_ts >= ? AND inicio_ts < ?
+                ORDER BY inicio_ts
+            ''', (chat_id, int(inicio_dia.timestamp()), int(fim_dia.timestamp())))
+            plantoes = [tuple(plantao) for plantao in c.fetchall()]
+            if propria:
+                conn.commit()
+            
+            Database._gravar_cache_agenda(conn, propria, chat_id, dia, versao, plantoes)
+            return plantoes
+    
+    @staticmethod
+    def _gravar_cache_agenda(conn: sqlite3.Connection, propria: bool, chat_id: int, dia: str,
+                             versao: int, plantoes: List[Tuple]):
+        """Grava a agenda no cache se a versão do chat não mudou (desiste se o banco estiver ocupado)"""
+        if propria:
+            conn.execute(f'PRAGMA busy_timeout = {int(DB_CACHE_ESPERA * 1000)}')
+        try:
+            conn.execute('''
+                INSERT OR REPLACE INTO cache_agenda (chat_id, dia, plantoes) 
+                SELECT ?, ?, ? 
+                WHERE COALESCE((SELECT versao FROM versoes_agenda WHERE chat_id = ?), 0) = ?
+            ''', (chat_id, dia, json.dumps(plantoes, ensure_ascii=False), chat_id, versao))
+            if propria:
+                conn.commit()
+        except sqlite3.OperationalError as e:
+            if not propria:
+                raise
+            conn.rollback()
+            logger.debug(f"⏭️ Agenda de {chat_id} ({dia}) não foi para o cache: {e}")
+        finally:
+            if propria:
+                conn.execute(f'PRAGMA busy_timeout = {int(DB_BUSY_TIMEOUT * 1000)}')
+    
+    @staticmethod
+    def versao_agenda(chat_id: int) -> int:
+        """Versão dos plantões do chat, incrementada em cada escrita de qualquer processo"""
+        with get_db_connection() as conn:
+            c = conn.cursor()
+            c.execute('SELECT versao FROM versoes_agenda WHERE chat_id = ?', (chat_id,))
+            linha = c.fetchone()
+            return linha['versao'] if linha else 0
+    
+    @staticmethod
+    def _invalidar_agenda(c: sqlite3.Cursor, chat_ids):
+        """
+        Apaga a agenda em cache dos chats e incrementa a versão de cada um (chamado na
+        transação da escrita), para que uma leitura anterior à escrita não grave o cache
+        """
+        parametros = [(chat_id,) for chat_id in chat_ids]
+        c.executemany('DELETE FROM cache_agenda WHERE chat_id = ?', parametros)
+        c.executemany('''
+            INSERT INTO versoes_agenda (chat_id, versao) VALUES (?, 1)
+            ON CONFLICT(chat_id) DO UPDATE SET versao = versao + 1
+        ''', parametros)
+    
+    @staticmethod
+    def limpar_cache_agenda() -> int:
+        """Apaga as agendas em cache de dias que já passaram e retorna quantas"""
+        with get_db_connection() as conn:
+            c = conn.cursor()
+            c.execute('DELETE FROM cache_agenda WHERE dia < ?', (datetime.now().date().isoformat(),))
+            return c.rowcount
     
     @staticmethod
     def buscar_proximos_plantoes(chat_id: int, limite: int = 5) -> List[Tuple]:
@@ -120,41 +267,242 @@ class Database:
                 SELECT data, hora, local 
                 FROM plantoes 
                 WHERE chat_id = ? AND ativo = 1
-                ORDER BY 
-                    substr(data, 4, 2) || substr(data, 1, 2),
-                    hora
+                ORDER BY inicio_ts
                 LIMIT ?
             ''', (chat_id, limite))
             return c.fetchall()
     
     @staticmethod
-    def buscar_todos_plantoes_ativos() -> List[Tuple]:
-        """Busca todos os plantões ativos para verificação de lembretes"""
+    def buscar_plantoes_pagina(chat_id: int, limite: int = 10,
+                               cursor: Optional[str] = None) -> Tuple[List[Tuple], Optional[str]]:
+        """
+        Busca uma página de plantões por keyset: `cursor` é o 'inicio_ts:id' do último
+        plantão da página anterior. Retorna (plantões, cursor da próxima página ou None).
+        """
+        condicao_cursor = ''
+        parametros = [chat_id]
+        if cursor:
+            inicio_ts, plantao_id = Database._ler_cursor(cursor)
+            condicao_cursor = 'AND (inicio_ts, id) > (?, ?)'
+            parametros += [inicio_ts, plantao_id]
+        
+        with get_db_connection() as conn:
+            c = conn.cursor()
+            # Uma linha a mais indica se existe próxima página
+            c.execute(f'''
+                SELECT id, data, hora, local, inicio_ts 
+                FROM plantoes 
+                WHERE chat_id = ? AND ativo = 1 AND inicio_ts IS NOT NULL {condicao_cursor}
+                ORDER BY inicio_ts, id
+                LIMIT ?
+            ''', parametros + [limite + 1])
+            plantoes = c.fetchall()
+        
+        if len(plantoes) <= limite:
+            return plantoes, None
+        
+        plantoes = plantoes[:limite]
+        ultimo = plantoes[-1]
+        return plantoes, f"{ultimo['inicio_ts']}:{ultimo['id']}"
+    
+    @staticmethod
+    def _ler_cursor(cursor: str) -> Tuple[int, int]:
+        """Converte o cursor 'inicio_ts:id' (ValueError se inválido)"""
+        try:
+            inicio_ts, plantao_id = cursor.split(':')
+            return int(inicio_ts), int(plantao_id)
+        except (AttributeError, ValueError):
+            raise ValueError(f"Cursor inválido: {cursor}")
+    
+    @staticmethod
+    def buscar_plantoes_para_exclusao(chat_id: int, limite: int = 10) -> List[Tuple]:
+        """Busca os próximos plantões com ID, para montar botões de exclusão"""
         with get_db_connection() as conn:
             c = conn.cursor()
             c.execute('''
-                SELECT 
-                    id, chat_id, data, hora, local,
-                    COALESCE(lembrete_24h, 0) as lembrete_24h,
-                    COALESCE(lembrete_3h, 0) as lembrete_3h,
-                    COALESCE(lembrete_30min, 0) as lembrete_30min
+                SELECT id, data, hora, local 
                 FROM plantoes 
-                WHERE ativo = 1
-            ''')
+                WHERE chat_id = ? AND ativo = 1
+                ORDER BY inicio_ts
+                LIMIT ?
+            ''', (chat_id, limite))
             return c.fetchall()
     
+    @staticmethod
+    def buscar_plantao(plantao_id: int, chat_id: int) -> Optional[Tuple]:
+        """Busca um plantão ativo de um usuário pelo ID"""
+        with get_db_connection() as conn:
+            c = conn.cursor()
+            c.execute('''
+                SELECT data, hora, local 
+                FROM plantoes 
+                WHERE id = ? AND chat_id = ? AND ativo = 1
+            ''', (plantao_id, chat_id))
+            return c.fetchone()
+    
     @staticmethod
     def atualizar_lembrete(plantao_id: int, tipo_lembrete: str):
-        """Atualiza o status de um lembrete"""
-        campo = f"lembrete_{tipo_lembrete}"
+        """Marca um lembrete como enviado"""
+        Database.marcar_lembretes([(plantao_id, tipo_lembrete)])
+    
+    @staticmethod
+    def _filtro_shards(shards: Optional[List[int]], total_shards: int) -> Tuple[str, list]:
+        """Condição SQL (sobre p.chat_id) que restringe a consulta aos shards informados"""
+        if shards is None:
+            return '', []
+        marcadores = ','.join('?' * len(shards))
+        return f' AND abs(p.chat_id) % ? IN ({marcadores})', [total_shards] + list(shards)
+    
+    @staticmethod
+    def buscar_lembretes_vencidos(agora: Optional[float] = None, shards: Optional[List[int]] = None,
+                                  total_shards: int = 1) -> List[Tuple]:
+        """Busca os lembretes pendentes cuja janela já abriu (busca por faixa no índice parcial)"""
+        agora = int(agora if agora is not None else time.time())
+        filtro, parametros = Database._filtro_shards(shards, total_shards)
         with get_db_connection() as conn:
             c = conn.cursor()
             c.execute(f'''
-                UPDATE plantoes 
-                SET {campo} = 1
-                WHERE id = ?
-            ''', (plantao_id,))
-            logger.info(f"✅ Lembrete {tipo_lembrete} atualizado para plantão {plantao_id}")
+                SELECT l.plantao_id, l.tipo, l.due_at, l.expira_em, p.chat_id, p.data, p.hora, p.local, p.inicio_ts 
+                FROM lembretes l 
+                JOIN plantoes p ON p.id = l.plantao_id 
+                WHERE l.sent_at IS NULL AND l.due_at <= ? AND p.ativo = 1{filtro}
+                ORDER BY l.due_at
+            ''', [agora] + parametros)
+            return c.fetchall()
+    
+    @staticmethod
+    def buscar_lembretes_perdidos(desde: int, ate: int, shards: Optional[List[int]] = None,
+                                  total_shards: int = 1) -> List[Tuple]:
+        """Busca lembretes pendentes cuja janela fechou entre `desde` e `ate` (ex: bot fora do ar)"""
+        filtro, parametros = Database._filtro_shards(shards, total_shards)
+        with get_db_connection() as conn:
+            c = conn.cursor()
+            c.execute(f'''
+                SELECT l.plantao_id, l.tipo, p.chat_id, p.data, p.hora, p.local, p.inicio_ts 
+                FROM lembretes l 
+                JOIN plantoes p ON p.id = l.plantao_id 
+                WHERE l.sent_at IS NULL AND l.expira_em >= ? AND l.expira_em < ? AND p.ativo = 1{filtro}
+                ORDER BY l.expira_em
+            ''', [int(desde), int(ate)] + parametros)
+            return c.fetchall()
+    
+    @staticmethod
+    def proximo_lembrete(shards: Optional[List[int]] = None, total_shards: int = 1) -> Optional[int]:
+        """Retorna o timestamp de abertura do próximo lembrete pendente (opcionalmente só dos shards)"""
+        with get_db_connection() as conn:
+            c = conn.cursor()
+            if shards is None:
+                c.execute('SELECT MIN(due_at) FROM lembretes WHERE sent_at IS NULL')
+                return c.fetchone()[0]
+            
+            filtro, parametros = Database._filtro_shards(shards, total_shards)
+            c.execute(f'''
+                SELECT l.due_at 
+                FROM lembretes l 
+                JOIN plantoes p ON p.id = l.plantao_id 
+                WHERE l.sent_at IS NULL AND p.ativo = 1{filtro}
+                ORDER BY l.due_at
+                LIMIT 1
+            ''', parametros)
+            linha = c.fetchone()
+            return linha['due_at'] if linha else None
+    
+    @staticmethod
+    def renovar_shards(dono: str, total_shards: int, preferido: int = 0,
+                       duracao: float = LEASE_DURACAO) -> List[int]:
+        """
+        Heartbeat dos workers de lembretes: renova os leases de `dono` e assume os shards
+        sem dono válido, retornando os shards que ele detém. O shard `preferido` pode ser
+        assumido assim que o lease expira, ou retomado de um worker que o detém como
+        reserva; os demais só um período depois de expirar. Assim cada shard volta ao
+        seu worker e os outros ficam como reserva (failover). Na retomada, o antigo dono
+        ainda pode processar um ciclo até o próximo heartbeat, sem duplicar envios:
+        marcar_lembretes só devolve o lembrete a um dos dois.
+        """
+        agora = time.time()
+        with get_db_connection() as conn:
+            c = conn.cursor()
+            # Shards novos nascem expirados: o primeiro heartbeat já os assume
+            c.executemany(
+                'INSERT OR IGNORE INTO shards_lembretes (shard, dono, expira_em) VALUES (?, NULL, 0)',
+                [(shard,) for shard in range(total_shards)]
+            )
+            c.execute('''
+                UPDATE shards_lembretes 
+                SET dono = ?, expira_em = ?, preferido = ?
+                WHERE shard < ? AND (
+                    dono = ? OR expira_em < ?
+                    OR (shard = ? AND (expira_em < ? OR preferido IS NOT shard))
+                )
+                RETURNING shard
+            ''', (dono, agora + duracao, preferido, total_shards, dono, agora - duracao, preferido, agora))
+            return sorted(linha['shard'] for linha in c.fetchall())
+    
+    @staticmethod
+    def liberar_shards(dono: str, shards: List[int]):
+        """Devolve os leases de `dono` para que outro worker assuma na hora (parada limpa)"""
+        if not shards:
+            return
+        marcadores = ','.join('?' * len(shards))
+        with get_db_connection() as conn:
+            c = conn.cursor()
+            c.execute(f'''
+                UPDATE shards_lembretes 
+                SET dono = NULL, expira_em = 0
+                WHERE shard IN ({marcadores}) AND dono = ?
+            ''', list(shards) + [dono])
+    
+    @staticmethod
+    def marcar_lembretes(lembretes: List[Tuple[int, str]]) -> List[Tuple[int, str]]:
+        """
+        Marca vários lembretes (plantao_id, tipo) como enviados em uma única transação
+        (em blocos de até MAX_IDS_POR_CONSULTA ids por comando). Retorna apenas os que
+        foram marcados agora: lembretes de plantões desativados ou já marcados por outro
+        processo ficam de fora.
+        """
+        por_tipo = {}
+        for plantao_id, tipo in lembretes:
+            if tipo not in TIPOS_LEMBRETE_VALIDOS:
+                raise ValueError(f"Tipo de lembrete inválido: {tipo}")
+            por_tipo.setdefault(tipo, []).append(plantao_id)
+        
+        if not por_tipo:
+            return []
+        
+        marcados = []
+        chats = set()
+        agora = int(time.time())
+        with get_db_connection() as conn:
+            c = conn.cursor()
+            for tipo, todos_ids in por_tipo.items():
+                for inicio in range(0, len(todos_ids), MAX_IDS_POR_CONSULTA):
+                    ids = todos_ids[inicio:inicio + MAX_IDS_POR_CONSULTA]
+                    marcadores = ','.join('?' * len(ids))
+                    c.execute(f'''
+                        UPDATE lembretes 
+                        SET sent_at = ?
+                        WHERE tipo = ? AND plantao_id IN ({marcadores}) AND sent_at IS NULL
+                        RETURNING plantao_id
+                    ''', [agora, tipo] + ids)
+                    ids_marcados = [linha['plantao_id'] for linha in c.fetchall()]
+                    if not ids_marcados:
+                        continue
+                    
+                    # Mantém as colunas de controle de plantoes em sincronia
+                    marcadores = ','.join('?' * len(ids_marcados))
+                    c.execute(f'''
+                        UPDATE plantoes 
+                        SET lembrete_{tipo} = 1
+                        WHERE id IN ({marcadores})
+                        RETURNING chat_id
+                    ''', ids_marcados)
+                    chats.update(linha['chat_id'] for linha in c.fetchall())
+                    marcados.extend((plantao_id, tipo) for plantao_id in ids_marcados)
+            logger.info(f"✅ {len(marcados)} lembretes marcados como enviados")
+        
+        if chats:
+            Database._notificar('lembretes', chat_ids=chats)
+        return marcados
     
     @staticmethod
     def desativar_plantao(plantao_id: int):
@@ -165,8 +513,223 @@ class Database:
                 UPDATE plantoes 
                 SET ativo = 0
                 WHERE id = ?
+                RETURNING chat_id
             ''', (plantao_id,))
+            linha = next(iter(c.fetchall()), None)
+            c.execute('DELETE FROM lembretes WHERE plantao_id = ? AND sent_at IS NULL', (plantao_id,))
+            if linha:
+                Database._invalidar_agenda(c, [linha['chat_id']])
             logger.info(f"🗑️ Plantão {plantao_id} desativado")
+        
+        Database._notificar('desativar', plantao_id=plantao_id, chat_id=linha['chat_id'] if linha else None)
+    
+    @staticmethod
+    def resetar_lembretes(chat_id: int):
+        """Marca todos os lembretes de um usuário como não enviados"""
+        with get_db_connection() as conn:
+            c = conn.cursor()
+            c.execute('''
+                UPDATE plantoes 
+                SET lembrete_24h = 0, lembrete_3h = 0, lembrete_30min = 0 
+                WHERE chat_id = ? AND ativo = 1
+            ''', (chat_id,))
+            c.execute('''
+                UPDATE lembretes 
+                SET sent_at = NULL 
+                WHERE plantao_id IN (SELECT id FROM plantoes WHERE chat_id = ? AND ativo = 1)
+            ''', (chat_id,))
+            logger.info(f"🔄 Lembretes resetados para usuário {chat_id}")
+        
+        Database._notificar('resetar', chat_id=chat_id)
+    
+    @staticmethod
+    def enfileirar_mensagens(mensagens: List[dict]) -> int:
+        """
+        Grava mensagens na outbox (dentro da transação em andamento, se houver) e retorna
+        quantas entraram. Cada mensagem tem chat_id, texto, uma `chave` de idempotência
+        (repetir a chave não duplica o envio) e opcionalmente parse_mode e expira_em.
+        """
+        if not mensagens:
+            return 0
+        
+        agora = time.time()
+        with get_db_connection() as conn:
+            c = conn.cursor()
+            c.executemany('''
+                INSERT OR IGNORE INTO outbox (chave, chat_id, texto, parse_mode, expira_em, proxima_em, atualizado_em)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', [
+                (m['chave'], m['chat_id'], m['texto'], m.get('parse_mode'), m.get('expira_em'), agora, agora)
+                for m in mensagens
+            ])
+            inseridas = c.rowcount
+        
+        if inseridas:
+            Database._notificar('outbox', quantidade=inseridas)
+        return inseridas
+    
+    @staticmethod
+    def reservar_mensagens(limite: int, prazo: float = OUTBOX_PRAZO_ENVIO) -> List[Tuple]:
+        """
+        Reserva até `limite` mensagens prontas para envio (pendentes ou com reserva
+        vencida), marcando-as como enviando por `prazo` segundos. Cada reserva soma uma
+        tentativa, e o número retornado identifica a reserva em `atualizar_mensagem` e
+        `renovar_reservas`. Mensagens que passaram de expira_em são descartadas como
+        expiradas.
+        """
+        agora = time.time()
+        with get_db_connection() as conn:
+            c = conn.cursor()
+            c.execute('''
+                UPDATE outbox 
+                SET estado = 'expirado', atualizado_em = ?
+                WHERE estado IN ('pendente', 'enviando') AND proxima_em <= ? AND expira_em <= ?
+            ''', (agora, agora, agora))
+            if c.rowcount:
+                logger.warning(f"⌛ {c.rowcount} mensagens da outbox expiraram sem envio")
+            
+            c.execute('''
+                UPDATE outbox 
+                SET estado = 'enviando', tentativas = tentativas + 1, proxima_em = ?, atualizado_em = ?
+                WHERE id IN (
+                    SELECT id FROM outbox 
+                    WHERE estado IN ('pendente', 'enviando') AND proxima_em <= ?
+                    ORDER BY proxima_em
+                    LIMIT ?
+                )
+                RETURNING id, chave, chat_id, texto, parse_mode, tentativas
+            ''', (agora + prazo, agora, agora, limite))
+            return c.fetchall()
+    
+    @staticmethod
+    def atualizar_mensagem(mensagem_id: int, tentativa: int, estado: str,
+                           proxima_em: Optional[float] = None, erro: Optional[str] = None) -> bool:
+        """
+        Registra o resultado de um envio reservado (enviado, pendente para nova tentativa
+        ou falhou). Só vale para a reserva `tentativa`: o resultado de uma reserva que
+        venceu e foi retomada por outra é ignorado (retorna False).
+        """
+        with get_db_connection() as conn:
+            c = conn.cursor()
+            c.execute('''
+                UPDATE outbox 
+                SET estado = ?, proxima_em = COALESCE(?, proxima_em), erro = ?, atualizado_em = ?
+                WHERE id = ? AND estado = 'enviando' AND tentativas = ?
+            ''', (estado, proxima_em, erro, time.time(), mensagem_id, tentativa))
+            return c.rowcount > 0
+    
+    @staticmethod
+    def renovar_reservas(reservas: Dict[int, int], prazo: float = OUTBOX_PRAZO_ENVIO) -> int:
+        """
+        Estende por `prazo` segundos as reservas {id: tentativa} ainda em andamento
+        (mensagens esperando na fila de envio); retorna quantas foram renovadas
+        """
+        if not reservas:
+            return 0
+        
+        agora = time.time()
+        with get_db_connection() as conn:
+            c = conn.cursor()
+            c.executemany('''
+                UPDATE outbox 
+                SET proxima_em = ?, atualizado_em = ?
+                WHERE id = ? AND estado = 'enviando' AND tentativas = ?
+            ''', [(agora + prazo, agora, mensagem_id, tentativa) for mensagem_id, tentativa in reservas.items()])
+            return c.rowcount
+    
+    @staticmethod
+    def proxima_mensagem() -> Optional[float]:
+        """Retorna quando a próxima mensagem da outbox fica pronta para envio"""
+        with get_db_connection() as conn:
+            c = conn.cursor()
+            c.execute("SELECT MIN(proxima_em) FROM outbox WHERE estado IN ('pendente', 'enviando')")
+            return c.fetchone()[0]
+    
+    @staticmethod
+    def limpar_outbox(dias: int = OUTBOX_RETENCAO_DIAS) -> int:
+        """Apaga mensagens finalizadas há mais de `dias` e retorna quantas"""
+        corte = time.time() - dias * 86400
+        with get_db_connection() as conn:
+            c = conn.cursor()
+            c.execute('''
+                DELETE FROM outbox 
+                WHERE estado IN ('enviado', 'falhou', 'expirado') AND atualizado_em < ?
+            ''', (corte,))
+            removidas = c.rowcount
+        
+        if removidas:
+            logger.info(f"🧹 Outbox: {removidas} mensagens finalizadas removidas")
+        return removidas
+    
+    @staticmethod
+    def buscar_conversa(chat_id: int) -> Optional[Tuple]:
+        """Busca a conversa em andamento do chat (None se não houver ou se expirou)"""
+        with get_db_connection() as conn:
+            c = conn.cursor()
+            c.execute('''
+                SELECT etapa, data, hora, expira_em 
+                FROM conversas 
+                WHERE chat_id = ? AND expira_em > ?
+            ''', (chat_id, time.time()))
+            return c.fetchone()
+    
+    @staticmethod
+    def versao_dados() -> int:
+        """
+        PRAGMA data_version da conexão da thread: muda quando outra conexão (de
+        qualquer processo) faz commit, sem ler nenhuma tabela
+        """
+        with get_db_connection() as conn:
+            return conn.execute('PRAGMA data_version').fetchone()[0]
+    
+    @staticmethod
+    def buscar_chats_em_conversa() -> List[int]:
+        """Lista os chats com conversa em andamento (não expirada)"""
+        with get_db_connection() as conn:
+            c = conn.cursor()
+            c.execute('SELECT chat_id FROM conversas WHERE expira_em > ?', (time.time(),))
+            return [linha[0] for linha in c.fetchall()]
+    
+    @staticmethod
+    def gravar_conversa(chat_id: int, etapa: str, data: Optional[str], hora: Optional[str], expira_em: float):
+        """Grava (ou substitui) a conversa em andamento do chat"""
+        with get_db_connection() as conn:
+            c = conn.cursor()
+            c.execute('''
+                INSERT OR REPLACE INTO conversas (chat_id, etapa, data, hora, expira_em)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (chat_id, etapa, data, hora, expira_em))
+    
+    @staticmethod
+    def apagar_conversa(chat_id: int):
+        """Encerra a conversa em andamento do chat"""
+        with get_db_connection() as conn:
+            c = conn.cursor()
+            c.execute('DELETE FROM conversas WHERE chat_id = ?', (chat_id,))
+    
+    @staticmethod
+    def limpar_conversas() -> int:
+        """Apaga as conversas abandonadas (expiradas) e retorna quantas"""
+        with get_db_connection() as conn:
+            c = conn.cursor()
+            c.execute('DELETE FROM conversas WHERE expira_em <= ?', (time.time(),))
+            return c.rowcount
+    
+    @staticmethod
+    def ler_estado(chave: str, padrao=None):
+        """Lê um valor persistido na tabela estado"""
+        with get_db_connection() as conn:
+            c = conn.cursor()
+            c.execute('SELECT valor FROM estado WHERE chave = ?', (chave,))
+            linha = c.fetchone()
+            return linha['valor'] if linha else padrao
+    
+    @staticmethod
+    def gravar_estado(chave: str, valor):
+        """Grava (ou substitui) um valor na tabela estado"""
+        with get_db_connection() as conn:
+            c = conn.cursor()
+            c.execute('INSERT OR REPLACE INTO estado (chave, valor) VALUES (?, ?)', (chave, valor))
     
     @staticmethod
     def contar_plantoes(chat_id: Optional[int] = None) -> int:
@@ -180,7 +743,127 @@ class Database:
             return c.fetchone()[0]
     
     @staticmethod
-    def limpar_plantoes_antigos(dias: int = 30):
-        """Remove plantões muito antigos do banco"""
-        # Implementação futura para manutenção
-        pass
\ No newline at end of file
+    def estatisticas(chat_id: int) -> dict:
+        """Calcula as estatísticas do usuário em uma única consulta agregada"""
+        agora = datetime.now()
+        hoje = agora.replace(hour=0, minute=0, second=0, microsecond=0)
+        amanha = hoje + timedelta(days=1)
+        depois_de_amanha = hoje + timedelta(days=2)
+        inicio_semana = hoje - timedelta(days=hoje.weekday())
+        fim_semana = inicio_semana + timedelta(days=7)
+        
+        with get_db_connection() as conn:
+            c = conn.cursor()
+            c.execute('''
+                SELECT 
+                    COUNT(*) as total,
+                    COALESCE(SUM(inicio_ts >= :hoje AND inicio_ts < :amanha), 0) as hoje,
+                    COALESCE(SUM(inicio_ts >= :amanha AND inicio_ts < :depois), 0) as amanha,
+                    COALESCE(SUM(inicio_ts >= :semana AND inicio_ts < :fim_semana), 0) as semana,
+                    MIN(CASE WHEN inicio_ts >= :agora THEN inicio_ts END) as proximo_ts
+                FROM plantoes 
+                WHERE chat_id = :chat_id AND ativo = 1
+            ''', {
+                'chat_id': chat_id,
+                'agora': int(agora.timestamp()),
+                'hoje': int(hoje.timestamp()),
+                'amanha': int(amanha.timestamp()),
+                'depois': int(depois_de_amanha.timestamp()),
+                'semana': int(inicio_semana.timestamp()),
+                'fim_semana': int(fim_semana.timestamp()),
+            })
+            linha = c.fetchone()
+        
+        proximo_em_horas = None
+        if linha['proximo_ts'] is not None:
+            proximo_em_horas = round((linha['proximo_ts'] - agora.timestamp()) / 3600, 2)
+        
+        return {
+            'total_plantoes': linha['total'],
+            'plantoes_hoje': linha['hoje'],
+            'plantoes_amanha': linha['amanha'],
+            'plantoes_semana': linha['semana'],
+            'proximo_plantao_em_horas': proximo_em_horas,
+        }
+    
+    @staticmethod
+    def limpar_plantoes_antigos(dias: int = ARQUIVAR_APOS_DIAS, lote: int = ARQUIVO_LOTE,
+                                pausa: float = ARQUIVO_PAUSA) -> dict:
+        """
+        Move plantões deletados ou que passaram há mais de `dias` para plantoes_arquivo.
+        Trabalha em lotes de `lote` linhas (uma transação curta cada, com pausa entre elas)
+        para não segurar o lock de escrita, e retorna linhas movidas e tempo gasto.
+        """
+        inicio = time.monotonic()
+        corte = int((datetime.now() - timedelta(days=dias)).timestamp())
+        colunas = 'id, chat_id, data, hora, local, lembrete_24h, lembrete_3h, lembrete_30min, ativo, inicio_ts'
+        movidos = 0
+        lotes = 0
+        ultimo_id = 0
+        chats = set()
+        
+        while True:
+            with get_db_connection() as conn:
+                c = conn.cursor()
+                c.execute('''
+                    SELECT id, chat_id 
+                    FROM plantoes 
+                    WHERE id > ? AND (ativo = 0 OR inicio_ts < ?)
+                    ORDER BY id
+                    LIMIT ?
+                ''', (ultimo_id, corte, lote))
+                linhas = c.fetchall()
+                if not linhas:
+                    break
+                
+                ids = [linha['id'] for linha in linhas]
+                marcadores = ','.join('?' * len(ids))
+                c.execute(f'''
+                    INSERT OR REPLACE INTO plantoes_arquivo ({colunas}, arquivado_em)
+                    SELECT {colunas}, ? FROM plantoes WHERE id IN ({marcadores})
+                ''', [int(time.time())] + ids)
+                c.execute(f'DELETE FROM plantoes WHERE id IN ({marcadores})', ids)
+                c.execute(f'DELETE FROM lembretes WHERE plantao_id IN ({marcadores})', ids)
+                Database._invalidar_agenda(c, {linha['chat_id'] for linha in linhas})
+            
+            movidos += len(ids)
+            lotes += 1
+            ultimo_id = ids[-1]
+            chats.update(linha['chat_id'] for linha in linhas)
+            if len(linhas) < lote:
+                break
+            time.sleep(pausa)
+        
+        relatorio = {'movidos': movidos, 'lotes': lotes, 'segundos': round(time.monotonic() - inicio, 3)}
+        logger.info(f"📦 Arquivamento: {movidos} plantões movidos em {lotes} lotes ({relatorio['segundos']}s)")
+        
+        if chats:
+            Database._notificar('arquivar', chat_ids=chats)
+        return relatorio
+    
+    @staticmethod
+    def compactar(paginas: int = VACUUM_PAGINAS) -> dict:
+        """
+        Devolve ao sistema páginas livres do arquivo. Com auto_vacuum incremental libera
+        até `paginas` por chamada; em bancos antigos faz um VACUUM completo uma única vez
+        para converter para o modo incremental.
+        """
+        inicio = time.monotonic()
+        with get_db_connection() as conn:
+            c = conn.cursor()
+            livres_antes = c.execute("PRAGMA freelist_count").fetchone()[0]
+            
+            if c.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+                # executescript percorre o pragma até o fim (execute liberaria só uma página)
+                conn.executescript(f"PRAGMA incremental_vacuum({int(paginas)});")
+            elif livres_antes:
+                logger.info("🧹 Convertendo banco para auto_vacuum incremental (VACUUM completo)")
+                c.execute("PRAGMA auto_vacuum = INCREMENTAL")
+                c.execute("VACUUM")
+            
+            livres_depois = c.execute("PRAGMA freelist_count").fetchone()[0]
+        
+        relatorio = {'paginas_liberadas': livres_antes - livres_depois,
+                     'segundos': round(time.monotonic() - inicio, 3)}
+        logger.info(f"🧹 Compactação: {relatorio['paginas_liberadas']} páginas liberadas ({relatorio['segundos']}s)")
+        return relatorio
@@ -0,0 +1,229 @@
+"""
+Módulo de envio de mensagens com fila, workers e limite de taxa do Telegram
+"""
+import logging
+import queue
+import time
+from threading import Thread, Lock
+from typing import Callable, Dict, Optional
+
+from config import (
+    ENVIO_WORKERS, ENVIO_LIMITE_GLOBAL, ENVIO_LIMITE_POR_CHAT,
+    ENVIO_MAX_TENTATIVAS, ENVIO_TAMANHO_FILA
+)
+
+logger = logging.getLogger(__name__)
+
+# Quantidade de baldes por chat mantidos antes de descartar os ociosos
+MAX_BALDES_CHAT = 10000
+
+
+class TokenBucket:
+    """Balde de fichas: libera `taxa` envios por segundo com rajadas de até `capacidade`"""
+    
+    def __init__(self, taxa: float, capacidade: Optional[float] = None):
+        self.taxa = taxa
+        self.capacidade = capacidade if capacidade is not None else taxa
+        self.fichas = self.capacidade
+        self.atualizado_em = time.monotonic()
+        self._lock = Lock()
+    
+    def reservar(self) -> float:
+        """Reserva uma ficha e retorna quantos segundos esperar antes de usá-la"""
+        with self._lock:
+            agora = time.monotonic()
+            self.fichas = min(self.capacidade, self.fichas + (agora - self.atualizado_em) * self.taxa)
+            self.atualizado_em = agora
+            self.fichas -= 1
+            return 0.0 if self.fichas >= 0 else -self.fichas / self.taxa
+    
+    def ocioso(self) -> bool:
+        """Indica se o balde já estaria cheio (pode ser descartado)"""
+        with self._lock:
+            return self.fichas + (time.monotonic() - self.atualizado_em) * self.taxa >= self.capacidade
+
+
+class FilaEnvio:
+    """Fila de envio com pool de workers, limites global/por chat e novas tentativas"""
+    
+    def __init__(self, bot, workers: int = ENVIO_WORKERS,
+                 limite_global: float = ENVIO_LIMITE_GLOBAL,
+                 limite_por_chat: float = ENVIO_LIMITE_POR_CHAT,
+                 max_tentativas: int = ENVIO_MAX_TENTATIVAS):
+        self.bot = bot
+        self.workers = workers
+        self.limite_por_chat = limite_por_chat
+        self.max_tentativas = max_tentativas
+        self.running = False
+        self._threads = []
+        self._fila = queue.Queue(maxsize=ENVIO_TAMANHO_FILA)
+        self._balde_global = TokenBucket(limite_global)
+        self._baldes_chat: Dict[int, TokenBucket] = {}
+        self._lock = Lock()
+        self._stats = {'enviados': 0, 'falhas': 0, 'tentativas_extras': 0,
+                       'latencia_total': 0.0, 'latencia_max': 0.0}
+    
+    def iniciar(self):
+        """Inicia os workers de envio"""
+        if self.running:
+            return
+        
+        self.running = True
+        self._threads = [
+            Thread(target=self._executar_worker, daemon=True, name=f"envio-{i}")
+            for i in range(self.workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+        logger.info(f"📤 Fila de envio iniciada com {self.workers} workers")
+    
+    def parar(self, aguardar: bool = True):
+        """Para os workers (opcionalmente esperando a fila esvaziar)"""
+        if not self.running:
+            return
+        
+        if aguardar:
+            self._fila.join()
+        self.running = False
+        for _ in self._threads:
+            self._fila.put(None)
+        for thread in self._threads:
+            thread.join(timeout=5)
+        self._threads = []
+        logger.info(f"📤 Fila de envio parada: {self.estatisticas()}")
+    
+    def enviar(self, chat_id, texto: str, ao_concluir: Optional[Callable] = None,
+               max_tentativas: Optional[int] = None, **kwargs):
+        """
+        Enfileira uma mensagem; `ao_concluir(sucesso, erro)` é chamado após o envio.
+        `max_tentativas=1` desliga as novas tentativas da fila (quem chama cuida delas).
+        """
+        if not self.running:
+            self.iniciar()
+        self._fila.put((chat_id, texto, kwargs, ao_concluir, time.monotonic(), max_tentativas or self.max_tentativas))
+    
+    def vagas(self) -> int:
+        """Quantas mensagens ainda cabem na fila sem bloquear quem enfileira"""
+        return max(self._fila.maxsize - self._fila.qsize(), 0)
+    
+    def send_message(self, chat_id, texto: str, **kwargs):
+        """Mesma assinatura do TeleBot, para usar a fila no lugar do bot"""
+        self.enviar(chat_id, texto, **kwargs)
+    
+    def aguardar(self):
+        """Bloqueia até todas as mensagens enfileiradas serem processadas"""
+        self._fila.join()
+    
+    def estatisticas(self) -> dict:
+        """Retorna contadores de envio e latência (enfileiramento → entrega)"""
+        with self._lock:
+            enviados = self._stats['enviados']
+            return {
+                'enviados': enviados,
+                'falhas': self._stats['falhas'],
+                'tentativas_extras': self._stats['tentativas_extras'],
+                'pendentes': self._fila.qsize(),
+                'latencia_media': round(self._stats['latencia_total'] / enviados, 3) if enviados else 0.0,
+                'latencia_max': round(self._stats['latencia_max'], 3),
+            }
+    
+    def _executar_worker(self):
+        """Loop de um worker: retira mensagens da fila e envia"""
+        while True:
+            item = self._fila.get()
+            try:
+                if item is None:
+                    return
+                self._processar(*item)
+            except Exception as e:
+                logger.error(f"❌ Erro inesperado no worker de envio: {e}", exc_info=True)
+            finally:
+                self._fila.task_done()
+    
+    def _processar(self, chat_id, texto, kwargs, ao_concluir, enfileirado_em, max_tentativas):
+        """Envia uma mensagem respeitando os limites e repetindo em erros temporários"""
+        erro = None
+        for tentativa in range(1, max_tentativas + 1):
+            self._aguardar_vez(chat_id)
+            try:
+                self.bot.send_message(chat_id, texto, **kwargs)
+                self._registrar_sucesso(time.monotonic() - enfileirado_em, tentativa)
+                self._concluir(ao_concluir, True, None)
+                return
+            except Exception as e:
+                erro = e
+                espera = self._tempo_para_nova_tentativa(e, tentativa)
+                if espera is None or tentativa == max_tentativas:
+                    break
+                logger.warning(f"⚠️ Envio para {chat_id} falhou ({e}), nova tentativa em {espera:.1f}s")
+                time.sleep(espera)
+        
+        with self._lock:
+            self._stats['falhas'] += 1
+        logger.error(f"❌ Falha ao enviar mensagem para {chat_id}: {erro}")
+        self._concluir(ao_concluir, False, erro)
+    
+    def _aguardar_vez(self, chat_id):
+        """Espera a liberação dos baldes global e do chat"""
+        with self._lock:
+            balde = self._baldes_chat.get(chat_id)
+            if balde is None:
+                if len(self._baldes_chat) >= MAX_BALDES_CHAT:
+                    self._baldes_chat = {k: b for k, b in self._baldes_chat.items() if not b.ocioso()}
+                balde = self._baldes_chat[chat_id] = TokenBucket(self.limite_por_chat)
+        
+        espera = max(balde.reservar(), self._balde_global.reservar())
+        if espera > 0:
+            time.sleep(espera)
+    
+    @staticmethod
+    def erro_temporario(erro: Exception) -> bool:
+        """Indica se vale tentar de novo mais tarde (limite de taxa, rede ou erro do servidor)"""
+        return FilaEnvio._tempo_para_nova_tentativa(erro, 1) is not None
+    
+    @staticmethod
+    def espera_pedida(erro: Exception) -> Optional[float]:
+        """Espera pedida pelo Telegram (retry_after de um 429), ou None para os demais erros"""
+        if getattr(erro, 'error_code', None) != 429:
+            return None
+        return FilaEnvio._tempo_para_nova_tentativa(erro, 1)
+    
+    @staticmethod
+    def _tempo_para_nova_tentativa(erro: Exception, tentativa: int) -> Optional[float]:
+        """Retorna a espera antes de tentar de novo, ou None se o erro não é temporário"""
+        # Erro da API (ApiTelegramException) traz error_code; nos erros HTTP o status
+        # vem da resposta, que é do requests no TeleBot (status_code) e do aiohttp no
+        # AsyncTeleBot (status), cada um com sua própria classe ApiHTTPException
+        codigo = getattr(erro, 'error_code', None)
+        if codigo is None:
+            resposta = getattr(erro, 'result', None)
+            codigo = getattr(resposta, 'status_code', None) or getattr(resposta, 'status', None)
+        
+        if codigo == 429:
+            parametros = getattr(erro, 'result_json', None) or {}
+            return float(parametros.get('parameters', {}).get('retry_after', 1))
+        if codigo is not None and codigo < 500:
+            return None
+        if codigo is None and not isinstance(erro, (OSError, TimeoutError)):
+            return None
+        
+        return min(2 ** (tentativa - 1), 30)
+    
+    def _registrar_sucesso(self, latencia: float, tentativa: int):
+        """Atualiza os contadores após um envio bem-sucedido"""
+        with self._lock:
+            self._stats['enviados'] += 1
+            self._stats['tentativas_extras'] += tentativa - 1
+            self._stats['latencia_total'] += latencia
+            self._stats['latencia_max'] = max(self._stats['latencia_max'], latencia)
+        logger.debug(f"📤 Mensagem entregue em {latencia:.3f}s ({tentativa} tentativa(s))")
+    
+    @staticmethod
+    def _concluir(ao_concluir, sucesso: bool, erro):
+        """Chama o callback de conclusão, se houver"""
+        if ao_concluir is None:
+            return
+        try:
+            ao_concluir(sucesso, erro)
+        except Exception as e:
+            logger.error(f"❌ Erro no callback de envio: {e}")
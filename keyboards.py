@@ -2,14 +2,45 @@
 Módulo de teclados personalizados do Telegram
 """
 from telebot import types
-from datetime import datetime, timedelta
+from datetime import date, timedelta
+from functools import lru_cache
+
+
+class TecladoPronto(types.JsonSerializable):
+    """Teclado já serializado: montado e convertido para JSON uma única vez e reutilizado"""
+    
+    def __init__(self, markup: types.JsonSerializable):
+        self.json = markup.to_json()
+    
+    def to_json(self):
+        return self.json
 
 
 class KeyboardFactory:
     """Factory para criar teclados personalizados"""
     
     @staticmethod
-    def criar_teclado_principal():
+    def criar_teclado_principal() -> TecladoPronto:
+        """Retorna o teclado principal do bot (pré-serializado na importação)"""
+        return _TECLADOS_FIXOS['principal']
+    
+    @staticmethod
+    def criar_teclado_data_hora() -> TecladoPronto:
+        """Retorna o teclado com sugestões de data/hora de hoje (serializado uma vez por dia)"""
+        return KeyboardFactory._teclado_data_hora_do_dia(date.today())
+    
+    @staticmethod
+    def criar_teclado_locais() -> TecladoPronto:
+        """Retorna o teclado com sugestões de locais (pré-serializado na importação)"""
+        return _TECLADOS_FIXOS['locais']
+    
+    @staticmethod
+    def criar_teclado_confirmacao() -> TecladoPronto:
+        """Retorna o teclado de confirmação (pré-serializado na importação)"""
+        return _TECLADOS_FIXOS['confirmacao']
+    
+    @staticmethod
+    def _montar_teclado_principal():
         """Cria teclado principal do bot"""
         markup = types.ReplyKeyboardMarkup(resize_keyboard=True, row_width=3)
         
@@ -30,11 +61,11 @@ class KeyboardFactory:
         return markup
     
     @staticmethod
-    def criar_teclado_data_hora():
-        """Cria teclado com sugestões de data/hora"""
+    @lru_cache(maxsize=2)
+    def _teclado_data_hora_do_dia(hoje: date) -> TecladoPronto:
+        """Cria teclado com sugestões de data/hora a partir de um dia"""
         markup = types.ReplyKeyboardMarkup(one_time_keyboard=True, resize_keyboard=True)
         
-        hoje = datetime.now()
         amanha = hoje + timedelta(days=1)
         
         # Sugestões de data/hora comuns
@@ -48,10 +79,10 @@ class KeyboardFactory:
         )
         markup.row(types.KeyboardButton("❌ Cancelar"))
         
-        return markup
+        return TecladoPronto(markup)
     
     @staticmethod
-    def criar_teclado_locais():
+    def _montar_teclado_locais():
         """Cria teclado com sugestões de locais (Londrina e Cambé - PR)"""
         markup = types.ReplyKeyboardMarkup(one_time_keyboard=True, resize_keyboard=True, row_width=1)
         
@@ -90,7 +121,7 @@ class KeyboardFactory:
         return markup
     
     @staticmethod
-    def criar_teclado_confirmacao():
+    def _montar_teclado_confirmacao():
         """Cria teclado de confirmação"""
         markup = types.ReplyKeyboardMarkup(one_time_keyboard=True, resize_keyboard=True)
         markup.row(
@@ -99,6 +130,27 @@ class KeyboardFactory:
         )
         return markup
     
+    @staticmethod
+    def criar_inline_exclusao(plantoes):
+        """Cria botões inline para escolher o plantão a deletar"""
+        markup = types.InlineKeyboardMarkup()
+        for plantao in plantoes:
+            texto_botao = f"🗑️ {plantao['data']} {plantao['hora']} - {plantao['local'][:20]}"
+            markup.add(types.InlineKeyboardButton(
+                texto_botao,
+                callback_data=f"delete_{plantao['id']}"
+            ))
+        
+        markup.add(types.InlineKeyboardButton("❌ Cancelar", callback_data="cancel_delete"))
+        return markup
+    
+    @staticmethod
+    def criar_inline_paginacao(proximo_cursor: str):
+        """Cria botão inline para a próxima página do /todos"""
+        markup = types.InlineKeyboardMarkup()
+        markup.add(types.InlineKeyboardButton("➡️ Próxima página", callback_data=f"todos_{proximo_cursor}"))
+        return markup
+    
     @staticmethod
     def criar_inline_compartilhar(plantao_id: int):
         """Cria botões inline para compartilhar plantão"""
@@ -109,4 +161,12 @@ class KeyboardFactory:
             types.InlineKeyboardButton("🗑️ Excluir", 
                                       callback_data=f"delete_{plantao_id}")
         )
-        return markup
\ No newline at end of file
+        return markup
+
+
+# Teclados que não mudam: montados e serializados uma única vez
+_TECLADOS_FIXOS = {
+    'principal': TecladoPronto(KeyboardFactory._montar_teclado_principal()),
+    'locais': TecladoPronto(KeyboardFactory._montar_teclado_locais()),
+    'confirmacao': TecladoPronto(KeyboardFactory._montar_teclado_confirmacao()),
+}
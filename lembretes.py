@@ -1,30 +1,57 @@
 """
 Módulo de sistema de lembretes
 """
+import asyncio
 import logging
+import os
+import socket
 import time
 from datetime import datetime
-from typing import Optional
-from threading import Thread
+from typing import List, Optional, Tuple
+from threading import Thread, Condition
 
-from config import (
-    LEMBRETE_24H, LEMBRETE_3H, LEMBRETE_30MIN,
-    TOLERANCIA_24H, TOLERANCIA_3H, TOLERANCIA_30MIN,
-    INTERVALO_VERIFICACAO
-)
-from database import Database
-from utils import DateTimeUtils
+import templates
+from config import INTERVALO_VERIFICACAO, LEMBRETE_SHARDS, LEASE_DURACAO
+from database import Database, get_db_connection
+from envio import FilaEnvio
+from outbox import OutboxService
+from utils import DateTimeUtils, TelegramUtils
 
 logger = logging.getLogger(__name__)
 
+# Chave (tabela estado) com o horário do último ciclo de verificação concluído (por shard)
+CHAVE_ULTIMO_CICLO = 'lembretes_ultimo_ciclo'
+
+# Intervalo entre heartbeats dos leases de shards (bem abaixo da validade do lease)
+INTERVALO_HEARTBEAT = LEASE_DURACAO / 3
+
+# Separador entre lembretes agrupados na mesma mensagem
+SEPARADOR_LEMBRETES = "\n\n➖➖➖➖➖➖➖➖\n\n"
+
 
 class LembreteService:
-    """Serviço de gerenciamento de lembretes"""
+    """
+    Serviço de gerenciamento de lembretes. Os chats são divididos em `total_shards`
+    shards; o serviço só processa os shards cujo lease detém no banco, preferindo o
+    shard `shard`, e assume shards de workers parados quando seus leases expiram.
+    """
     
-    def __init__(self, bot):
+    def __init__(self, bot, fila_envio: Optional[FilaEnvio] = None, shard: int = 0,
+                 total_shards: int = LEMBRETE_SHARDS):
         self.bot = bot
+        self.fila_envio = fila_envio or FilaEnvio(bot)
+        self.outbox = OutboxService(self.fila_envio)
+        self.shard = shard % total_shards
+        self.total_shards = total_shards
+        self.shards: List[int] = []
+        self.dono = f"{socket.gethostname()}:{os.getpid()}:{self.shard}"
         self.running = False
         self.thread = None
+        self._parado = False
+        self._condicao = Condition()
+        self._acordar = False
+        self._acordar_async = None
+        Database.registrar_ouvinte(self._ao_alterar_plantoes)
     
     def iniciar(self):
         """Inicia o serviço de lembretes em thread separada"""
@@ -33,183 +60,284 @@ class LembreteService:
             return
         
         self.running = True
+        self._parado = False
+        self.outbox.iniciar()
         self.thread = Thread(target=self._executar_loop, daemon=True)
         self.thread.start()
         logger.info("⏰ Serviço de lembretes iniciado")
     
     def parar(self):
-        """Para o serviço de lembretes"""
+        """
+        Para o serviço de lembretes e devolve os leases para outro worker assumir.
+        Idempotente: o worker chama pelo SIGTERM e de novo ao sair.
+        """
+        if self._parado:
+            return
+        self._parado = True
         self.running = False
+        self._acordar_loop()
+        if self.thread is not None:
+            self.thread.join(timeout=5)
+        self._liberar_shards()
+        self.outbox.parar()
         logger.info("⏰ Serviço de lembretes parado")
     
     def _executar_loop(self):
-        """Loop principal de verificação de lembretes"""
+        """Loop principal: dorme até a abertura da próxima janela de lembrete"""
         while self.running:
             try:
-                self._verificar_lembretes()
+                self._executar_ciclo()
             except Exception as e:
                 logger.error(f"❌ Erro na verificação de lembretes: {e}", exc_info=True)
             
-            time.sleep(INTERVALO_VERIFICACAO)
+            self._aguardar_proximo_prazo()
     
-    def _verificar_lembretes(self):
-        """Verifica e envia lembretes necessários"""
-        agora = datetime.now()
-        plantoes = Database.buscar_todos_plantoes_ativos()
+    async def executar_async(self):
+        """Executa o loop de lembretes no event loop atual (acesso ao banco no executor)"""
+        loop = asyncio.get_running_loop()
+        evento = asyncio.Event()
+        self._acordar_async = lambda: loop.call_soon_threadsafe(evento.set)
+        self.running = True
+        self._parado = False
+        self.outbox.iniciar()
+        logger.info("⏰ Serviço de lembretes iniciado (modo assíncrono)")
         
-        for plantao in plantoes:
+        while self.running:
             try:
-                self._processar_plantao(plantao, agora)
+                await loop.run_in_executor(None, self._executar_ciclo)
             except Exception as e:
-                logger.error(f"❌ Erro ao processar plantão {plantao['id']}: {e}")
-    
-    def _processar_plantao(self, plantao, agora: datetime):
-        """Processa um plantão verificando lembretes"""
-        plantao_id = plantao['id']
-        chat_id = plantao['chat_id']
-        data_str = plantao['data']
-        hora_str = plantao['hora']
-        local = plantao['local']
-        
-        # Parse da data/hora do plantão
-        data_plantao = DateTimeUtils.parse_data_hora(data_str, hora_str)
-        if not data_plantao:
-            logger.warning(f"Data/hora inválida para plantão {plantao_id}")
-            return
-        
-        # Se plantão já passou, pula
-        if data_plantao < agora:
-            return
-        
-        # Calcula horas restantes
-        horas_restantes = (data_plantao - agora).total_seconds() / 3600
-        
-        # Verifica cada tipo de lembrete
-        self._verificar_lembrete_24h(plantao, horas_restantes, chat_id, data_str, hora_str, local)
-        self._verificar_lembrete_3h(plantao, horas_restantes, chat_id, data_str, hora_str, local)
-        self._verificar_lembrete_30min(plantao, horas_restantes, chat_id, data_str, hora_str, local)
-    
-    def _verificar_lembrete_24h(self, plantao, horas_restantes, chat_id, data_str, hora_str, local):
-        """Verifica e envia lembrete de 24 horas"""
-        if plantao['lembrete_24h']:
-            return
+                logger.error(f"❌ Erro na verificação de lembretes: {e}", exc_info=True)
+            
+            try:
+                await asyncio.wait_for(evento.wait(), await loop.run_in_executor(None, self._calcular_espera))
+            except asyncio.TimeoutError:
+                pass
+            evento.clear()
         
-        limite_inferior = LEMBRETE_24H - TOLERANCIA_24H
-        limite_superior = LEMBRETE_24H + TOLERANCIA_24H
+        await loop.run_in_executor(None, self._liberar_shards)
+    
+    def _executar_ciclo(self):
+        """Um ciclo: heartbeat dos leases e envio dos lembretes vencidos dos shards detidos"""
+        self._renovar_shards()
+        if self.shards:
+            self._verificar_lembretes()
+    
+    def _renovar_shards(self):
+        """Renova os leases; shards recém-assumidos passam pela recuperação de perdidos"""
+        anteriores = set(self.shards)
+        self.shards = Database.renovar_shards(self.dono, self.total_shards, self.shard)
         
-        if limite_inferior <= horas_restantes <= limite_superior:
-            mensagem = self._criar_mensagem_24h(data_str, hora_str, local)
-            self._enviar_lembrete(chat_id, mensagem, plantao['id'], '24h')
+        if set(self.shards) != anteriores:
+            logger.info(f"⏰ Worker {self.dono} detém os shards {self.shards} de {self.total_shards}")
+        for shard in self.shards:
+            if shard not in anteriores:
+                self._recuperar_perdidos(shard)
     
-    def _verificar_lembrete_3h(self, plantao, horas_restantes, chat_id, data_str, hora_str, local):
-        """Verifica e envia lembrete de 3 horas"""
-        if plantao['lembrete_3h']:
-            return
+    def _liberar_shards(self):
+        """Devolve os leases detidos (parada limpa, sem esperar a expiração)"""
+        try:
+            Database.liberar_shards(self.dono, self.shards)
+            self.shards = []
+        except Exception as e:
+            logger.error(f"❌ Erro ao liberar shards de lembretes: {e}")
+    
+    def _chave_ultimo_ciclo(self, shard: int) -> str:
+        """Chave na tabela estado do último ciclo concluído de um shard"""
+        return f"{CHAVE_ULTIMO_CICLO}:{shard}/{self.total_shards}"
+    
+    def _calcular_espera(self) -> float:
+        """Segundos até o próximo lembrete pendente dos shards detidos (limitado ao heartbeat)"""
+        limite = min(INTERVALO_VERIFICACAO, INTERVALO_HEARTBEAT)
+        if not self.shards:
+            return limite
         
-        limite_inferior = LEMBRETE_3H - TOLERANCIA_3H
-        limite_superior = LEMBRETE_3H + TOLERANCIA_3H
+        try:
+            prazo = Database.proximo_lembrete(self.shards, self.total_shards)
+        except Exception as e:
+            logger.error(f"❌ Erro ao consultar próximo lembrete: {e}")
+            return limite
         
-        if limite_inferior <= horas_restantes <= limite_superior:
-            mensagem = self._criar_mensagem_3h(data_str, hora_str, local)
-            self._enviar_lembrete(chat_id, mensagem, plantao['id'], '3h')
+        if prazo is None:
+            return limite
+        return min(max(prazo - time.time(), 0), limite)
     
-    def _verificar_lembrete_30min(self, plantao, horas_restantes, chat_id, data_str, hora_str, local):
-        """Verifica e envia lembrete de 30 minutos"""
-        if plantao['lembrete_30min']:
-            return
-        
-        limite_inferior = LEMBRETE_30MIN - TOLERANCIA_30MIN
-        limite_superior = LEMBRETE_30MIN + TOLERANCIA_30MIN
+    def _aguardar_proximo_prazo(self):
+        """Dorme até o próximo lembrete pendente ou até ser acordado por uma alteração"""
+        espera = self._calcular_espera()
+        with self._condicao:
+            if self.running and not self._acordar:
+                self._condicao.wait(espera)
+            self._acordar = False
+    
+    def _acordar_loop(self):
+        """Acorda o loop para recalcular o próximo prazo"""
+        with self._condicao:
+            self._acordar = True
+            self._condicao.notify()
         
-        if limite_inferior <= horas_restantes <= limite_superior:
-            mensagem = self._criar_mensagem_30min(data_str, hora_str, local)
-            self._enviar_lembrete(chat_id, mensagem, plantao['id'], '30min')
+        if self._acordar_async:
+            self._acordar_async()
+    
+    def _ao_alterar_plantoes(self, evento: str, dados: dict):
+        """Acorda o loop quando surgem lembretes novos (plantão salvo ou lembretes resetados)"""
+        if evento in ('salvar', 'resetar'):
+            self._acordar_loop()
     
-    def _enviar_lembrete(self, chat_id: int, mensagem: str, plantao_id: int, tipo: str):
-        """Envia lembrete e atualiza banco de dados (com proteção contra duplicatas)"""
+    def _recuperar_perdidos(self, shard: int):
+        """
+        Ao assumir um shard, avisa sobre lembretes cujas janelas fecharam enquanto ele
+        ficou sem worker (desde o último ciclo gravado), com uma mensagem por chat
+        (ou mais, se passar do limite do Telegram) entregue pela outbox (fila
+        limitada), sem rajadas no Telegram.
+        """
         try:
-            # Primeiro atualiza o banco (marca como enviado)
-            Database.atualizar_lembrete(plantao_id, tipo)
+            ultimo_ciclo = Database.ler_estado(self._chave_ultimo_ciclo(shard))
+            if ultimo_ciclo is None:
+                return
             
-            # Depois envia a mensagem
-            self.bot.send_message(chat_id, mensagem, parse_mode='Markdown')
+            agora = time.time()
+            perdidos = Database.buscar_lembretes_perdidos(ultimo_ciclo, agora, [shard], self.total_shards)
+            if not perdidos:
+                return
             
-            logger.info(f"✅ Lembrete {tipo} enviado para plantão {plantao_id}")
+            with get_db_connection():
+                marcados = set(Database.marcar_lembretes([(lembrete['plantao_id'], lembrete['tipo']) for lembrete in perdidos]))
+                
+                # Agrupa por chat, só plantões que ainda não começaram
+                por_chat = {}
+                for lembrete in perdidos:
+                    if (lembrete['plantao_id'], lembrete['tipo']) in marcados and lembrete['inicio_ts'] > agora:
+                        por_chat.setdefault(lembrete['chat_id'], {})[lembrete['plantao_id']] = lembrete
+                
+                Database.enfileirar_mensagens([
+                    mensagem for chat_id, plantoes in por_chat.items()
+                    for mensagem in self._mensagens_atrasados(chat_id, ultimo_ciclo, list(plantoes.values()))
+                ])
+            
+            logger.info(f"⏰ Shard {shard}: {len(marcados)} lembretes perdidos desde "
+                        f"{datetime.fromtimestamp(ultimo_ciclo):%d/%m %H:%M}; avisos para {len(por_chat)} chats")
         except Exception as e:
-            logger.error(f"❌ Erro ao enviar lembrete {tipo}: {e}")
-            # Se der erro ao enviar, reverte a marcação
-            # (comentado para não ficar tentando enviar infinitamente)
-            # Database.reverter_lembrete(plantao_id, tipo)
+            logger.error(f"❌ Erro ao recuperar lembretes perdidos: {e}", exc_info=True)
+    
+    def _verificar_lembretes(self):
+        """Grava na outbox os lembretes cuja janela está aberta"""
+        agora = time.time()
+        vencidos = Database.buscar_lembretes_vencidos(agora, self.shards, self.total_shards)
+        if not vencidos:
+            self._gravar_ultimo_ciclo(agora)
+            return
+        
+        # Marcação e enfileiramento na mesma transação: ou o lembrete vira mensagem
+        # na outbox, ou continua pendente para o próximo ciclo
+        with get_db_connection():
+            # Lembretes com a janela já fechada também saem da fila de pendentes
+            marcados = set(Database.marcar_lembretes([(lembrete['plantao_id'], lembrete['tipo']) for lembrete in vencidos]))
+            
+            # Só as marcadas agora por este processo, agrupadas por chat para sair
+            # uma única mensagem por chat neste ciclo
+            por_chat = {}
+            for lembrete in vencidos:
+                plantao_id, tipo = lembrete['plantao_id'], lembrete['tipo']
+                if (plantao_id, tipo) not in marcados:
+                    continue
+                if lembrete['expira_em'] < agora:
+                    logger.warning(f"Janela do lembrete {tipo} do plantão {plantao_id} já fechou")
+                    continue
+                
+                try:
+                    criar_mensagem = getattr(self, f'_criar_mensagem_{tipo}')
+                    mensagem = criar_mensagem(lembrete['data'], lembrete['hora'], lembrete['local'])
+                    por_chat.setdefault(lembrete['chat_id'], []).append((mensagem, lembrete))
+                except Exception as e:
+                    logger.error(f"❌ Erro ao processar plantão {plantao_id}: {e}")
+            
+            Database.enfileirar_mensagens([
+                mensagem for chat_id, lembretes in por_chat.items()
+                for mensagem in self._mensagens_lembretes(chat_id, lembretes, agora)
+            ])
+        
+        self._gravar_ultimo_ciclo(agora)
+    
+    def _gravar_ultimo_ciclo(self, agora: float):
+        """Registra o ciclo concluído em cada shard detido (base da recuperação de perdidos)"""
+        for shard in self.shards:
+            Database.gravar_estado(self._chave_ultimo_ciclo(shard), int(agora))
+    
+    @staticmethod
+    def _mensagens_lembretes(chat_id: int, lembretes: List[Tuple[str, dict]], agora: float) -> List[dict]:
+        """
+        Monta as mensagens da outbox com os lembretes de um chat, juntos no menor número
+        de mensagens dentro do limite do Telegram. A chave de idempotência identifica o
+        ciclo e os lembretes (plantão/tipo); cada mensagem expira no início do plantão
+        mais próximo.
+        """
+        chave = f"lembretes:{chat_id}:{int(agora)}:" + ",".join(
+            f"{lembrete['plantao_id']}/{lembrete['tipo']}" for _, lembrete in lembretes
+        )
+        partes = TelegramUtils.dividir_mensagem([mensagem.strip() for mensagem, _ in lembretes],
+                                                separador=SEPARADOR_LEMBRETES)
+        expira_em = min(lembrete['inicio_ts'] for _, lembrete in lembretes)
+        return [
+            {'chave': f"{chave}#{indice}", 'chat_id': chat_id, 'texto': parte,
+             'parse_mode': 'Markdown', 'expira_em': expira_em}
+            for indice, parte in enumerate(partes)
+        ]
     
     @staticmethod
     def _criar_mensagem_24h(data_str: str, hora_str: str, local: str) -> str:
         """Cria mensagem de lembrete 24h"""
-        return f"""
-⏰ *LEMBRETE 24H - PLANTÃO AMANHÃ!*
-
-📅 {data_str} às {hora_str}
-🏥 {local}
-
-💡 *Checklist:*
-• ✅ Estetoscópio
-• ✅ Jaleco
-• ✅ Lanche/água
-• ✅ Carregador
-• ✅ Roupas confortáveis
-• ✅ Documentos
-
-💪 Boa sorte, amore! ❤️
-"""
+        return templates.renderizar('lembrete_24h', data=data_str, hora=hora_str, local=local)
     
     @staticmethod
     def _criar_mensagem_3h(data_str: str, hora_str: str, local: str) -> str:
         """Cria mensagem de lembrete 3h"""
-        return f"""
-🚨 *PLANTÃO EM 3 HORAS!*
-
-🏥 {local}
-⏰ {hora_str}
-
-⚡ *Hora de se preparar!*
-• Verifique o trânsito
-• Separe tudo que precisa
-• Alimente-se bem
-
-❤️ Vai dar tudo certo!
-"""
+        return templates.renderizar('lembrete_3h', data=data_str, hora=hora_str, local=local)
     
     @staticmethod
     def _criar_mensagem_30min(data_str: str, hora_str: str, local: str) -> str:
         """Cria mensagem de lembrete 30min"""
-        return f"""
-🚨🚨 *PLANTÃO EM 30 MINUTOS!*
-
-🏥 {local}
-⏰ {hora_str}
-
-⚡⚡ *HORA DE SAIR!*
-• Vá com segurança
-• Você é incrível!
-
-❤️❤️ BOA PLANTÃO, AMORE! ❤️❤️
-"""
+        return templates.renderizar('lembrete_30min', data=data_str, hora=hora_str, local=local)
+    
+    @staticmethod
+    def _mensagens_atrasados(chat_id: int, ultimo_ciclo: float, plantoes: List) -> List[dict]:
+        """
+        Monta as mensagens da outbox com os lembretes perdidos de um chat. A chave
+        identifica o ciclo, os plantões e a parte; todas expiram no início do plantão
+        mais próximo.
+        """
+        chave = f"atrasados:{chat_id}:{int(ultimo_ciclo)}:" + ",".join(
+            str(plantao_id) for plantao_id in sorted(plantao['plantao_id'] for plantao in plantoes)
+        )
+        expira_em = min(plantao['inicio_ts'] for plantao in plantoes)
+        return [
+            {'chave': f"{chave}#{indice}", 'chat_id': chat_id, 'texto': parte,
+             'parse_mode': 'Markdown', 'expira_em': expira_em}
+            for indice, parte in enumerate(LembreteService._criar_mensagens_atrasados(plantoes))
+        ]
+    
+    @staticmethod
+    def _criar_mensagens_atrasados(plantoes: List) -> List[str]:
+        """
+        Cria o aviso com os lembretes perdidos de um chat, dividido em mensagens dentro
+        do limite do Telegram sem partir um plantão entre elas
+        """
+        plantoes = sorted(plantoes, key=lambda p: p['inicio_ts'])
+        tempos = DateTimeUtils.tempo_restante_lote((plantao['data'], plantao['hora']) for plantao in plantoes)
+        itens = [
+            templates.renderizar('item_atrasado', data=plantao['data'], hora=plantao['hora'],
+                                 local=plantao['local'], status=f"\n   {tempo[2]}" if tempo else "")
+            for plantao, tempo in zip(plantoes, tempos)
+        ]
+        blocos = [templates.renderizar('lembretes_atrasados', itens="")] + itens
+        return [parte.strip() for parte in TelegramUtils.dividir_mensagem(blocos, separador="")]
 
 
 def enviar_notificacao_namorado(bot, chat_id_namorado: str, data_str: str, hora_str: str, local: str):
-    """Envia notificação para o namorado quando plantão é adicionado"""
+    """Envia notificação para o namorado quando plantão é adicionado (bot pode ser a FilaEnvio)"""
     if not chat_id_namorado:
         return
     
-    mensagem = f"""
-👩‍⚕️ *SUA NAMORADA ADICIONOU UM PLANTÃO!*
-
-📅 {data_str} ⏰ {hora_str}
-🏥 {local}
-
-💌 *Mande uma mensagem carinhosa para ela!*
-💪 *Deseje boa sorte!*
-❤️ *Mostre que você se importa!*
-"""
+    mensagem = templates.renderizar('notificacao_namorado', data=data_str, hora=hora_str, local=local)
     
     try:
         bot.send_message(chat_id_namorado, mensagem, parse_mode='Markdown')
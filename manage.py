@@ -46,6 +46,15 @@ def iniciar_bot():
     except KeyboardInterrupt:
         print("\n👋 Bot parado pelo usuário")
 
+def iniciar_bot_async():
+    """Inicia o bot em modo assíncrono"""
+    print("\n🤖 Iniciando bot (modo assíncrono)...")
+    print("💡 Pressione Ctrl+C para parar")
+    try:
+        subprocess.run(["python", "bot_async.py"])
+    except KeyboardInterrupt:
+        print("\n👋 Bot parado pelo usuário")
+
 def iniciar_web():
     """Inicia API web"""
     print("\n🌐 Iniciando API web...")
@@ -212,13 +221,15 @@ def mostrar_menu():
 def main():
     parser = argparse.ArgumentParser(description='Gerenciador do Bot de Plantões')
     parser.add_argument('comando', nargs='?', choices=[
-        'bot', 'web', 'all', 'install', 'test', 'setup', 'status', 'backup', 'clean'
+        'bot', 'async', 'web', 'all', 'install', 'test', 'setup', 'status', 'backup', 'clean'
     ], help='Comando a executar')
     
     args = parser.parse_args()
     
     if args.comando == 'bot':
         iniciar_bot()
+    elif args.comando == 'async':
+        iniciar_bot_async()
     elif args.comando == 'web':
         iniciar_web()
     elif args.comando == 'all':
@@ -0,0 +1,62 @@
+"""
+Módulo de manutenção periódica do banco de dados
+"""
+import logging
+from threading import Thread, Event
+from typing import Optional
+
+from config import MANUTENCAO_INTERVALO
+from database import Database
+
+logger = logging.getLogger(__name__)
+
+
+class ManutencaoService:
+    """Arquiva plantões antigos, limpa a outbox e compacta o banco em intervalos regulares"""
+    
+    def __init__(self, intervalo: float = MANUTENCAO_INTERVALO):
+        self.intervalo = intervalo
+        self.running = False
+        self.thread = None
+        self.ultimo_relatorio: Optional[dict] = None
+        self._parar = Event()
+    
+    def iniciar(self):
+        """Inicia a manutenção em thread separada"""
+        if self.running:
+            logger.warning("Serviço de manutenção já está rodando")
+            return
+        
+        self.running = True
+        self._parar.clear()
+        self.thread = Thread(target=self._executar_loop, daemon=True, name="manutencao")
+        self.thread.start()
+        logger.info("🧹 Serviço de manutenção iniciado")
+    
+    def parar(self):
+        """Para o serviço de manutenção"""
+        self.running = False
+        self._parar.set()
+        logger.info("🧹 Serviço de manutenção parado")
+    
+    def executar(self) -> dict:
+        """Executa uma rodada: arquivamento em lotes, limpeza da outbox, da agenda em cache e das conversas abandonadas, compactação"""
+        relatorio = {
+            'arquivamento': Database.limpar_plantoes_antigos(),
+            'outbox': Database.limpar_outbox(),
+            'cache_agenda': Database.limpar_cache_agenda(),
+            'conversas': Database.limpar_conversas(),
+            'compactacao': Database.compactar(),
+        }
+        self.ultimo_relatorio = relatorio
+        return relatorio
+    
+    def _executar_loop(self):
+        """Loop principal: uma rodada logo ao iniciar e depois a cada intervalo"""
+        while self.running:
+            try:
+                self.executar()
+            except Exception as e:
+                logger.error(f"❌ Erro na manutenção do banco: {e}", exc_info=True)
+            
+            self._parar.wait(self.intervalo)
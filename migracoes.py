@@ -0,0 +1,353 @@
+"""
+Módulo de migrações versionadas do banco de dados (PRAGMA user_version)
+"""
+import logging
+import sqlite3
+import time
+from typing import Callable, List, Tuple
+
+from utils import DateTimeUtils
+
+logger = logging.getLogger(__name__)
+
+# Tamanho do lote usado em migrações de dados
+LOTE_MIGRACAO = 500
+
+
+def _criar_tabela_plantoes(conn: sqlite3.Connection):
+    """Cria a tabela principal (e completa colunas de bancos anteriores ao versionamento)"""
+    c = conn.cursor()
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS plantoes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            chat_id INTEGER NOT NULL,
+            data TEXT NOT NULL,
+            hora TEXT NOT NULL,
+            local TEXT NOT NULL,
+            lembrete_24h BOOLEAN DEFAULT 0,
+            lembrete_3h BOOLEAN DEFAULT 0,
+            lembrete_30min BOOLEAN DEFAULT 0,
+            ativo BOOLEAN DEFAULT 1,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            inicio_ts INTEGER
+        )
+    ''')
+    
+    c.execute("PRAGMA table_info(plantoes)")
+    colunas_existentes = [col[1] for col in c.fetchall()]
+    
+    colunas_necessarias = {
+        'lembrete_24h': 'BOOLEAN DEFAULT 0',
+        'lembrete_3h': 'BOOLEAN DEFAULT 0',
+        'lembrete_30min': 'BOOLEAN DEFAULT 0',
+        'ativo': 'BOOLEAN DEFAULT 1',
+        'inicio_ts': 'INTEGER'
+    }
+    
+    for coluna, tipo in colunas_necessarias.items():
+        if coluna not in colunas_existentes:
+            c.execute(f"ALTER TABLE plantoes ADD COLUMN {coluna} {tipo}")
+            logger.info(f"✅ Coluna {coluna} adicionada")
+
+
+def _preencher_inicio_ts(conn: sqlite3.Connection):
+    """Preenche inicio_ts de linhas antigas; cada lote é uma transação (gerador)"""
+    c = conn.cursor()
+    ultimo_id = 0
+    total = 0
+    
+    while True:
+        c.execute('''
+            SELECT id, data, hora
+            FROM plantoes
+            WHERE inicio_ts IS NULL AND id > ?
+            ORDER BY id
+            LIMIT ?
+        ''', (ultimo_id, LOTE_MIGRACAO))
+        linhas = c.fetchall()
+        if not linhas:
+            break
+        
+        valores = []
+        for linha in linhas:
+            data_plantao = DateTimeUtils.parse_data_hora(linha['data'], linha['hora'])
+            valores.append((int(data_plantao.timestamp()) if data_plantao else None, linha['id']))
+        c.executemany('UPDATE plantoes SET inicio_ts = ? WHERE id = ?', valores)
+        
+        ultimo_id = linhas[-1]['id']
+        total += len(linhas)
+        yield
+    
+    if total:
+        logger.info(f"✅ inicio_ts preenchido para {total} plantões")
+
+
+def _criar_tabela_arquivo(conn: sqlite3.Connection):
+    """Tabela de plantões passados e deletados (mantidos fora da tabela quente)"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS plantoes_arquivo (
+            id INTEGER PRIMARY KEY,
+            chat_id INTEGER NOT NULL,
+            data TEXT NOT NULL,
+            hora TEXT NOT NULL,
+            local TEXT NOT NULL,
+            lembrete_24h BOOLEAN DEFAULT 0,
+            lembrete_3h BOOLEAN DEFAULT 0,
+            lembrete_30min BOOLEAN DEFAULT 0,
+            ativo BOOLEAN DEFAULT 1,
+            inicio_ts INTEGER,
+            arquivado_em INTEGER NOT NULL
+        )
+    ''')
+
+
+def _criar_indices_parciais(conn: sqlite3.Connection):
+    """Índices parciais: só plantões ativos (todas as consultas filtram ativo = 1)"""
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_ativos_chat_inicio
+        ON plantoes(chat_id, inicio_ts) WHERE ativo = 1
+    ''')
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_ativos_inicio
+        ON plantoes(inicio_ts) WHERE ativo = 1
+    ''')
+    
+    # Índices substituídos pelos parciais acima
+    for indice in ('idx_chat_id', 'idx_data_hora', 'idx_chat_ativo_inicio'):
+        conn.execute(f"DROP INDEX IF EXISTS {indice}")
+
+
+def _criar_tabela_lembretes(conn: sqlite3.Connection):
+    """Lembretes pré-calculados: uma linha por (plantão, tipo) com a janela de envio"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS lembretes (
+            plantao_id INTEGER NOT NULL,
+            tipo TEXT NOT NULL,
+            due_at INTEGER NOT NULL,
+            expira_em INTEGER NOT NULL,
+            sent_at INTEGER,
+            PRIMARY KEY (plantao_id, tipo)
+        ) WITHOUT ROWID
+    ''')
+    
+    # Cada verificação é uma busca por faixa neste índice (só pendentes)
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_lembretes_pendentes
+        ON lembretes(due_at) WHERE sent_at IS NULL
+    ''')
+
+
+def _preencher_lembretes(conn: sqlite3.Connection):
+    """Gera os lembretes dos plantões futuros já existentes (gerador, um lote por transação)"""
+    c = conn.cursor()
+    ultimo_id = 0
+    total = 0
+    agora = int(time.time())
+    
+    while True:
+        c.execute('''
+            SELECT id, inicio_ts,
+                   COALESCE(lembrete_24h, 0) as lembrete_24h,
+                   COALESCE(lembrete_3h, 0) as lembrete_3h,
+                   COALESCE(lembrete_30min, 0) as lembrete_30min
+            FROM plantoes
+            WHERE ativo = 1 AND inicio_ts > ? AND id > ?
+            ORDER BY id
+            LIMIT ?
+        ''', (agora, ultimo_id, LOTE_MIGRACAO))
+        linhas = c.fetchall()
+        if not linhas:
+            break
+        
+        valores = []
+        for linha in linhas:
+            for tipo, abre_em, fecha_em in DateTimeUtils.janelas_lembrete(linha['inicio_ts']):
+                enviado = agora if linha[f'lembrete_{tipo}'] else None
+                if enviado or fecha_em >= agora:
+                    valores.append((linha['id'], tipo, abre_em, fecha_em, enviado))
+        c.executemany('''
+            INSERT OR IGNORE INTO lembretes (plantao_id, tipo, due_at, expira_em, sent_at)
+            VALUES (?, ?, ?, ?, ?)
+        ''', valores)
+        
+        ultimo_id = linhas[-1]['id']
+        total += len(valores)
+        yield
+    
+    if total:
+        logger.info(f"✅ {total} lembretes gerados para plantões existentes")
+
+
+def _criar_tabela_estado(conn: sqlite3.Connection):
+    """Estado persistente dos serviços (ex: último ciclo de lembretes) e índice de expiração"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS estado (
+            chave TEXT PRIMARY KEY,
+            valor
+        ) WITHOUT ROWID
+    ''')
+    
+    # Recuperação após indisponibilidade: pendentes cuja janela fechou em um intervalo
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_lembretes_pendentes_expira
+        ON lembretes(expira_em) WHERE sent_at IS NULL
+    ''')
+
+
+def _criar_tabela_shards(conn: sqlite3.Connection):
+    """Leases dos shards de lembretes: dono atual e validade do último heartbeat"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS shards_lembretes (
+            shard INTEGER PRIMARY KEY,
+            dono TEXT,
+            expira_em REAL NOT NULL DEFAULT 0
+        )
+    ''')
+
+
+def _criar_tabela_outbox(conn: sqlite3.Connection):
+    """Outbox: mensagens a entregar (pendente → enviando → enviado/falhou/expirado)"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS outbox (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            chave TEXT NOT NULL UNIQUE,
+            chat_id INTEGER NOT NULL,
+            texto TEXT NOT NULL,
+            parse_mode TEXT,
+            estado TEXT NOT NULL DEFAULT 'pendente',
+            tentativas INTEGER NOT NULL DEFAULT 0,
+            proxima_em REAL NOT NULL,
+            expira_em INTEGER,
+            erro TEXT,
+            atualizado_em REAL NOT NULL
+        )
+    ''')
+    
+    # Fila de trabalho (inclui reservas, que voltam para a fila quando o prazo vence)
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_outbox_pendentes
+        ON outbox(proxima_em) WHERE estado IN ('pendente', 'enviando')
+    ''')
+    # Limpeza das mensagens finalizadas
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_outbox_finalizadas
+        ON outbox(atualizado_em) WHERE estado IN ('enviado', 'falhou', 'expirado')
+    ''')
+
+
+def _criar_tabela_cache_agenda(conn: sqlite3.Connection):
+    """Agenda do dia por chat (lista de plantões em JSON), compartilhada entre bot e API"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS cache_agenda (
+            chat_id INTEGER NOT NULL,
+            dia TEXT NOT NULL,
+            plantoes TEXT NOT NULL,
+            PRIMARY KEY (chat_id, dia)
+        ) WITHOUT ROWID
+    ''')
+    
+    # Limpeza dos dias que já passaram
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_cache_agenda_dia ON cache_agenda(dia)')
+
+
+def _criar_tabela_conversas(conn: sqlite3.Connection):
+    """Conversas em andamento (fluxo interativo do /plantao), uma por chat"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS conversas (
+            chat_id INTEGER PRIMARY KEY,
+            etapa TEXT NOT NULL,
+            data TEXT,
+            hora TEXT,
+            expira_em REAL NOT NULL
+        )
+    ''')
+    
+    # Limpeza das conversas abandonadas
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_conversas_expira ON conversas(expira_em)')
+
+
+def _adicionar_preferido_shards(conn: sqlite3.Connection):
+    """Shard preferido do dono atual (o worker de cada shard o retoma de um reserva)"""
+    colunas = [col[1] for col in conn.execute("PRAGMA table_info(shards_lembretes)")]
+    if 'preferido' not in colunas:
+        conn.execute("ALTER TABLE shards_lembretes ADD COLUMN preferido INTEGER")
+
+
+def _criar_tabela_versoes_agenda(conn: sqlite3.Connection):
+    """Versão da agenda de cada chat, incrementada a cada escrita (valida o cache_agenda)"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS versoes_agenda (
+            chat_id INTEGER PRIMARY KEY,
+            versao INTEGER NOT NULL
+        )
+    ''')
+
+
+# Migrações em ordem: (versão, descrição, função). Nunca altere uma migração já
+# publicada; crie uma nova com o próximo número. Funções geradoras são migrações
+# de dados: cada `yield` fecha a transação do lote atual e abre a próxima.
+MIGRACOES: List[Tuple[int, str, Callable]] = [
+    (1, "tabela plantoes", _criar_tabela_plantoes),
+    (2, "preencher inicio_ts", _preencher_inicio_ts),
+    (3, "tabela plantoes_arquivo", _criar_tabela_arquivo),
+    (4, "índices parciais de plantões ativos", _criar_indices_parciais),
+    (5, "tabela lembretes", _criar_tabela_lembretes),
+    (6, "preencher lembretes", _preencher_lembretes),
+    (7, "tabela estado", _criar_tabela_estado),
+    (8, "tabela shards_lembretes", _criar_tabela_shards),
+    (9, "tabela outbox", _criar_tabela_outbox),
+    (10, "tabela cache_agenda", _criar_tabela_cache_agenda),
+    (11, "tabela conversas", _criar_tabela_conversas),
+    (12, "shard preferido do dono do lease", _adicionar_preferido_shards),
+    (13, "tabela versoes_agenda", _criar_tabela_versoes_agenda),
+]
+
+VERSAO_ATUAL = MIGRACOES[-1][0]
+
+
+def versao_atual(conn: sqlite3.Connection) -> int:
+    """Lê a versão do schema gravada no banco"""
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrar(conn: sqlite3.Connection) -> int:
+    """
+    Aplica as migrações pendentes e retorna a versão final. Com o schema em dia custa
+    uma única leitura de pragma. Cada migração roda em BEGIN IMMEDIATE, que serializa
+    processos iniciando ao mesmo tempo; quem espera o lock relê a versão e pula o
+    que já foi aplicado.
+    """
+    versao = versao_atual(conn)
+    if versao >= VERSAO_ATUAL:
+        return versao
+    
+    if conn.in_transaction:
+        conn.commit()
+    
+    for numero, descricao, migracao in MIGRACOES:
+        if numero <= versao:
+            continue
+        
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            versao = versao_atual(conn)
+            if numero <= versao:
+                conn.rollback()
+                continue
+            
+            lotes = migracao(conn)
+            if lotes is not None:
+                for _ in lotes:
+                    conn.commit()
+                    conn.execute("BEGIN IMMEDIATE")
+            
+            conn.execute(f"PRAGMA user_version = {numero}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        
+        versao = numero
+        logger.info(f"✅ Migração {numero} aplicada: {descricao}")
+    
+    return versao
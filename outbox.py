@@ -0,0 +1,155 @@
+"""
+Módulo da outbox: entrega persistente de mensagens com novas tentativas
+"""
+import logging
+import time
+from threading import Thread, Condition, Lock
+from typing import Dict
+
+from config import (
+    INTERVALO_VERIFICACAO, OUTBOX_LOTE, OUTBOX_MAX_TENTATIVAS, OUTBOX_PRAZO_ENVIO,
+    OUTBOX_BACKOFF_BASE, OUTBOX_BACKOFF_MAX
+)
+from database import Database
+from envio import FilaEnvio
+
+logger = logging.getLogger(__name__)
+
+
+class OutboxService:
+    """
+    Despacha as mensagens gravadas na outbox pela FilaEnvio. Cada mensagem vai de
+    pendente para enviando e termina como enviado; falhas temporárias voltam para
+    pendente com backoff exponencial (ou o retry_after pedido pelo Telegram), e as
+    definitivas (ou após OUTBOX_MAX_TENTATIVAS) ficam como falhou. A FilaEnvio faz uma
+    única tentativa por reserva: quem repete é a outbox.
+    
+    Enquanto a mensagem espera na FilaEnvio, a reserva é renovada a cada terço do
+    prazo; só a reserva de um processo que caiu (ou travou) vence e volta para a fila.
+    O resultado de uma reserva vencida é ignorado, então a retomada não é sobrescrita,
+    mas o envio que já estava em curso pode chegar em dobro nesse caso.
+    """
+    
+    def __init__(self, fila_envio: FilaEnvio, lote: int = OUTBOX_LOTE):
+        self.fila_envio = fila_envio
+        self.lote = lote
+        self.running = False
+        self.thread = None
+        self._condicao = Condition()
+        self._acordar = False
+        self._reservas: Dict[int, int] = {}  # id -> tentativa das mensagens na FilaEnvio
+        self._lock_reservas = Lock()
+        self._renovado_em = 0.0
+        self._aguardando_vagas = False
+        Database.registrar_ouvinte(self._ao_alterar)
+    
+    def iniciar(self):
+        """Inicia o despacho em thread separada"""
+        if self.running:
+            return
+        
+        self.running = True
+        self.fila_envio.iniciar()
+        self.thread = Thread(target=self._executar_loop, daemon=True, name="outbox")
+        self.thread.start()
+        logger.info("📬 Outbox iniciada")
+    
+    def parar(self):
+        """Para o despacho (mensagens reservadas e não concluídas voltam à fila após o prazo)"""
+        self.running = False
+        self._acordar_loop()
+        logger.info("📬 Outbox parada")
+    
+    def despachar(self) -> int:
+        """
+        Reserva as mensagens prontas e as entrega à fila de envio; retorna quantas.
+        Reserva só o que cabe na FilaEnvio, para não bloquear o loop (e as renovações).
+        """
+        vagas = min(self.lote, self.fila_envio.vagas())
+        self._aguardando_vagas = vagas < self.lote
+        if vagas <= 0:
+            return 0
+        
+        mensagens = Database.reservar_mensagens(vagas)
+        for mensagem in mensagens:
+            kwargs = {'parse_mode': mensagem['parse_mode']} if mensagem['parse_mode'] else {}
+            with self._lock_reservas:
+                self._reservas[mensagem['id']] = mensagem['tentativas']
+            ao_concluir = self._criar_conclusao(mensagem['id'], mensagem['chave'], mensagem['tentativas'])
+            self.fila_envio.enviar(mensagem['chat_id'], mensagem['texto'], ao_concluir=ao_concluir,
+                                   max_tentativas=1, **kwargs)
+        return len(mensagens)
+    
+    def renovar_reservas(self, prazo: float = OUTBOX_PRAZO_ENVIO) -> int:
+        """Renova o prazo das mensagens que ainda esperam na fila de envio; retorna quantas"""
+        with self._lock_reservas:
+            reservas = dict(self._reservas)
+        self._renovado_em = time.monotonic()
+        return Database.renovar_reservas(reservas, prazo)
+    
+    def _criar_conclusao(self, mensagem_id: int, chave: str, tentativas: int):
+        """Cria o callback que registra o resultado do envio na outbox"""
+        def ao_concluir(sucesso, erro):
+            with self._lock_reservas:
+                if self._reservas.get(mensagem_id) == tentativas:
+                    del self._reservas[mensagem_id]
+            if self._aguardando_vagas:
+                self._acordar_loop()
+            
+            if sucesso:
+                registrado = Database.atualizar_mensagem(mensagem_id, tentativas, 'enviado')
+                logger.info(f"✅ Mensagem {chave} entregue")
+            elif tentativas < OUTBOX_MAX_TENTATIVAS and FilaEnvio.erro_temporario(erro):
+                espera = FilaEnvio.espera_pedida(erro)
+                if espera is None:
+                    espera = min(OUTBOX_BACKOFF_BASE * 2 ** (tentativas - 1), OUTBOX_BACKOFF_MAX)
+                registrado = Database.atualizar_mensagem(mensagem_id, tentativas, 'pendente',
+                                                         proxima_em=time.time() + espera, erro=str(erro))
+                logger.warning(f"⚠️ Mensagem {chave} falhou ({erro}), tentativa {tentativas + 1} em {espera}s")
+            else:
+                registrado = Database.atualizar_mensagem(mensagem_id, tentativas, 'falhou', erro=str(erro))
+                logger.error(f"❌ Mensagem {chave} descartada após {tentativas} tentativa(s): {erro}")
+            
+            if not registrado:
+                logger.warning(f"⚠️ Reserva {tentativas} da mensagem {chave} venceu; resultado ignorado")
+        return ao_concluir
+    
+    def _executar_loop(self):
+        """Loop principal: despacha e dorme até a próxima mensagem ficar pronta"""
+        while self.running:
+            try:
+                if time.monotonic() - self._renovado_em >= OUTBOX_PRAZO_ENVIO / 3:
+                    self.renovar_reservas()
+                if self.despachar() >= self.lote:
+                    continue
+            except Exception as e:
+                logger.error(f"❌ Erro ao despachar a outbox: {e}", exc_info=True)
+            
+            espera = min(self._calcular_espera(), OUTBOX_PRAZO_ENVIO / 3)
+            with self._condicao:
+                if self.running and not self._acordar:
+                    self._condicao.wait(espera)
+                self._acordar = False
+    
+    def _calcular_espera(self) -> float:
+        """Segundos até a próxima mensagem pronta (limitado a INTERVALO_VERIFICACAO)"""
+        try:
+            proxima = Database.proxima_mensagem()
+        except Exception as e:
+            logger.error(f"❌ Erro ao consultar a outbox: {e}")
+            return INTERVALO_VERIFICACAO
+        
+        if proxima is None:
+            return INTERVALO_VERIFICACAO
+        return min(max(proxima - time.time(), 0), INTERVALO_VERIFICACAO)
+    
+    def _acordar_loop(self):
+        """Acorda o loop para despachar na hora"""
+        with self._condicao:
+            self._acordar = True
+            self._condicao.notify()
+    
+    def _ao_alterar(self, evento: str, dados: dict):
+        """Acorda o loop quando entram mensagens novas na outbox"""
+        if evento == 'outbox':
+            self._acordar_loop()
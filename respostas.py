@@ -0,0 +1,213 @@
+"""
+Módulo de montagem das respostas do bot (compartilhado pelos modos síncrono e assíncrono)
+"""
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+import templates
+from config import PAGINACAO_TAMANHO_BOT
+from database import Database
+from utils import DateTimeUtils, validar_formato_plantao
+
+TEXTO_BOAS_VINDAS = """
+👨‍⚕️ *BOT DE PLANTÕES MÉDICOS* 👩‍⚕️
+
+*Use os botões abaixo ou comandos:*
+
+• /plantao - Adicionar plantão
+• /hoje - Plantões hoje  
+• /amanha - Plantões amanhã
+• /proximos - Próximos plantões
+• /todos - Todos os plantões
+• /deletar - Deletar plantão
+• /debug - Informações técnicas
+• /id - Mostra seu Chat ID
+
+*FORMATO RÁPIDO:*
+`/plantao DD/MM HH:MM Hospital`
+
+*Exemplo:*
+`/plantao 15/03 19:00 Hospital Evangélico`
+
+⏰ *Lembretes automáticos:*
+   • 24 horas antes
+   • 3 horas antes  
+   • 30 minutos antes
+
+💡 Use os botões para navegação rápida!
+"""
+
+TEXTO_PEDIR_DATA_HORA = "📅 *Envie a data e hora do plantão:*\n\nFormato: DD/MM HH:MM\nExemplo: 15/03 19:00"
+TEXTO_PEDIR_LOCAL = "🏥 *Agora digite o local do plantão:*"
+TEXTO_PEDIR_LOCAL_CUSTOMIZADO = "📝 *Digite o nome do local:*"
+TEXTO_DATA_HORA_INVALIDA = "❌ Formato inválido. Use: DD/MM HH:MM\nExemplo: 15/03 19:00"
+TEXTO_OPERACAO_CANCELADA = "❌ Operação cancelada."
+
+TEXTO_AJUDA_PLANTAO = (
+    "📝 *Para adicionar plantão:*\n\n"
+    "`/plantao DD/MM HH:MM Hospital`\n\n"
+    "*Exemplo:*\n"
+    "`/plantao 15/03 19:00 Hospital Albert Einstein`\n\n"
+    "Ou clique em ➕ Plantão e siga as instruções!"
+)
+
+TEXTO_NAO_ENTENDI = "🤔 *Não entendi!*\n\nUse os botões abaixo ou comandos como:\n`/plantao 15/03 19:00 Hospital`"
+
+TEXTO_LEMBRETES_RESETADOS = "✅ *Lembretes resetados!*\n\nTodos os lembretes foram marcados como não enviados."
+
+TEXTO_SEM_PLANTOES_PARA_DELETAR = "📭 Você não tem plantões agendados para deletar."
+TEXTO_ESCOLHER_PLANTAO_DELETAR = "🗑️ *DELETAR PLANTÃO*\n\nSelecione o plantão que deseja remover:"
+
+TEXTO_CORRIGIR_ANO = """
+🔧 *CORREÇÃO DE ANO*
+
+Se algum plantão foi cadastrado com ano errado, você tem 2 opções:
+
+*Opção 1 - Deletar e recriar:*
+1. Use /deletar para remover o plantão errado
+2. Adicione novamente com /plantao
+
+*Opção 2 - Editar banco (avançado):*
+Use /debug para ver os anos dos plantões.
+
+💡 *Dica para evitar o problema:*
+• Plantões do ano atual: cadastre normalmente
+• Plantões de 2027 em diante: por enquanto use /deletar e recrie quando estiver mais próximo
+
+🤖 *Como funciona:*
+O bot assume que:
+• Datas futuras = ano atual
+• Datas que passaram há pouco (até 6 meses) = ano atual (plantão já aconteceu)
+• Datas que passaram há muito (mais de 6 meses) = ano que vem
+        """
+
+
+def interpretar_data_hora(texto: str) -> Optional[Tuple[str, str]]:
+    """Valida a entrada 'DD/MM HH:MM' do modo interativo"""
+    partes = texto.split()
+    if len(partes) != 2:
+        return None
+    
+    data_str, hora_str = partes
+    if not DateTimeUtils.validar_data(data_str) or not DateTimeUtils.validar_hora(hora_str):
+        return None
+    
+    return data_str, hora_str
+
+
+def interpretar_comando_plantao(texto: str) -> Tuple[Optional[Tuple[str, str, str]], Optional[str]]:
+    """Interpreta '/plantao DD/MM HH:MM Local', retornando ((data, hora, local), erro)"""
+    partes = texto.split(' ', 3)
+    valido, erro = validar_formato_plantao(partes)
+    if not valido:
+        return None, erro
+    return (partes[1], partes[2], partes[3]), None
+
+
+def salvar_plantao(chat_id: int, data_str: str, hora_str: str, local: str) -> str:
+    """Salva o plantão e retorna a mensagem de confirmação"""
+    Database.salvar_plantao(chat_id, data_str, hora_str, local)
+    
+    # Calcular data completa para mostrar o ano
+    data_plantao = DateTimeUtils.parse_data_hora(data_str, hora_str)
+    ano_str = f" ({data_plantao.year})" if data_plantao else ""
+    
+    return templates.renderizar('plantao_salvo', data=data_str, ano=ano_str, hora=hora_str, local=local)
+
+
+def texto_hoje(chat_id: int) -> str:
+    """Resposta do /hoje"""
+    hoje = DateTimeUtils.obter_data_hoje()
+    plantoes = Database.buscar_plantoes_por_data(chat_id, hoje)
+    return _texto_agenda('agenda_hoje', plantoes)
+
+
+def texto_amanha(chat_id: int) -> str:
+    """Resposta do /amanha"""
+    amanha = DateTimeUtils.obter_data_amanha()
+    plantoes = Database.buscar_plantoes_por_data(chat_id, amanha)
+    return _texto_agenda('agenda_amanha', plantoes)
+
+
+def _texto_agenda(nome: str, plantoes: List[Tuple]) -> str:
+    """Agenda de um dia (template `nome`, ou `nome`_vazia sem plantões)"""
+    if not plantoes:
+        return templates.renderizar(f'{nome}_vazia')
+    
+    itens = templates.renderizar_lista('item_agenda', ({'hora': hora, 'local': local} for _, hora, local in plantoes))
+    return templates.renderizar(nome, itens=itens)
+
+
+def formatar_lista_plantoes(plantoes: List[Tuple], titulo: str) -> str:
+    """Lista de plantões (data, hora, local) com título"""
+    if not plantoes:
+        return templates.renderizar('lista_vazia')
+    
+    itens = templates.renderizar_lista(
+        'item_lista', ({'data': data, 'hora': hora, 'local': local} for data, hora, local in plantoes), "\n\n"
+    )
+    return templates.renderizar('lista_plantoes', titulo=titulo, itens=itens)
+
+
+def texto_proximos(chat_id: int) -> str:
+    """Resposta do /proximos (próximos 5 plantões)"""
+    plantoes = Database.buscar_proximos_plantoes(chat_id, 5)
+    
+    if plantoes:
+        return formatar_lista_plantoes(plantoes, "📋 *PRÓXIMOS PLANTÕES:*")
+    return "📭 Nenhum plantão agendado ainda.\nUse /plantao para adicionar!"
+
+
+def texto_todos(chat_id: int, cursor: Optional[str] = None) -> Tuple[str, Optional[str]]:
+    """Resposta do /todos (uma página), retornando (texto, cursor da próxima página)"""
+    plantoes, proximo_cursor = Database.buscar_plantoes_pagina(chat_id, PAGINACAO_TAMANHO_BOT, cursor)
+    
+    if not plantoes:
+        return "📭 Nenhum plantão agendado ainda.", None
+    
+    titulo = "📋 *TODOS OS PLANTÕES (continuação):*" if cursor else "📋 *TODOS OS PLANTÕES:*"
+    resposta = formatar_lista_plantoes([(p['data'], p['hora'], p['local']) for p in plantoes], titulo)
+    if proximo_cursor and not cursor:
+        resposta += templates.renderizar('total_plantoes', total=Database.contar_plantoes(chat_id))
+    
+    return resposta, proximo_cursor
+
+
+def texto_id(chat_id: int) -> str:
+    """Resposta do /id"""
+    return templates.renderizar('chat_id', chat_id=chat_id)
+
+
+def texto_debug(chat_id: int) -> str:
+    """Resposta do /debug"""
+    agora = datetime.now()
+    total = Database.contar_plantoes()
+    meus_plantoes = Database.contar_plantoes(chat_id)
+    proximos = Database.buscar_proximos_plantoes(chat_id, 5)
+    
+    tempos = DateTimeUtils.tempo_restante_lote((data, hora) for data, hora, _ in proximos)
+    # Mostrar ano também para debug
+    itens = templates.renderizar_lista('item_debug', (
+        {'data': data, 'ano': tempo[0].year, 'hora': hora, 'local': local, 'status': tempo[2]}
+        for (data, hora, local), tempo in zip(proximos, tempos) if tempo
+    ))
+    
+    return templates.renderizar('debug', agora=agora, total=total, meus_plantoes=meus_plantoes,
+                                chat_id=chat_id, itens=itens)
+
+
+def plantoes_para_exclusao(chat_id: int) -> List[Tuple]:
+    """Próximos plantões (com ID) exibidos no /deletar"""
+    return Database.buscar_plantoes_para_exclusao(chat_id, 10)
+
+
+def deletar_plantao(plantao_id: int, chat_id: int) -> Optional[str]:
+    """Desativa o plantão e retorna a confirmação (None se não encontrado)"""
+    plantao = Database.buscar_plantao(plantao_id, chat_id)
+    if not plantao:
+        return None
+    
+    Database.desativar_plantao(plantao_id)
+    data, hora, local = plantao
+    
+    return templates.renderizar('plantao_deletado', data=data, hora=hora, local=local)
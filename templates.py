@@ -0,0 +1,235 @@
+"""
+Módulo de templates das mensagens do bot (respostas e lembretes)
+
+Os textos ficam registrados por nome e são analisados uma única vez em partes
+(literais e campos), e mensagens e listas são montadas com join.
+Campos com texto digitado pelo usuário (ex: `local`) são escapados para o
+Markdown do Telegram. Para trocar um texto sem mexer nos handlers, use
+`registrar` ou aponte TEMPLATES_ARQUIVO para um JSON {nome: texto}.
+"""
+import json
+import logging
+from functools import lru_cache
+from string import Formatter
+from typing import Dict, Iterable, List, Mapping, Tuple, Union
+
+from config import TEMPLATES_ARQUIVO
+from utils import TelegramUtils
+
+logger = logging.getLogger(__name__)
+
+# Campos escapados por padrão (texto livre do usuário)
+CAMPOS_ESCAPADOS = ('local',)
+
+# Os mesmos poucos locais se repetem em quase todas as mensagens
+_escapar = lru_cache(maxsize=1024)(TelegramUtils.escapar_markdown_simples)
+
+# Conversões aceitas nos campos ({campo!r})
+_CONVERSOES = {'s': str, 'r': repr, 'a': ascii}
+
+
+class Template:
+    """
+    Template compilado: texto com campos {nome} (aceita conversão e formato, ex:
+    {agora:%d/%m}). O texto é analisado uma única vez em uma lista de literais e
+    campos; renderizar só junta as partes. Os campos precisam ser nomes simples (sem
+    atributos ou índices), então um texto vindo de arquivo só lê os valores passados.
+    """
+    
+    __slots__ = ('nome', 'texto', 'campos', 'escapar', '_partes')
+    
+    def __init__(self, nome: str, texto: str, escapar: Tuple[str, ...] = CAMPOS_ESCAPADOS):
+        partes: List[Union[str, Tuple]] = []
+        campos = []
+        for literal, campo, formato, conversao in Formatter().parse(texto):
+            if literal:
+                partes.append(literal)
+            if campo is None:
+                continue
+            if not campo.isidentifier():
+                raise ValueError(f"Template {nome}: campo inválido {{{campo}}} (use nomes simples)")
+            if conversao and conversao not in _CONVERSOES:
+                raise ValueError(f"Template {nome}: conversão inválida {{{campo}!{conversao}}}")
+            if '{' in formato:
+                raise ValueError(f"Template {nome}: formato aninhado em {{{campo}}} não é aceito")
+            if campo not in campos:
+                campos.append(campo)
+            partes.append((campo, campo in escapar, _CONVERSOES.get(conversao), formato))
+        
+        self.nome = nome
+        self.texto = texto
+        self.campos = frozenset(campos)
+        self.escapar = tuple(campo for campo in escapar if campo in campos)
+        self._partes = tuple(partes)
+    
+    def renderizar(self, valores: Mapping) -> str:
+        """Renderiza com os valores (campos a mais são ignorados)"""
+        pedacos = []
+        for parte in self._partes:
+            if parte.__class__ is str:
+                pedacos.append(parte)
+                continue
+            
+            campo, escapado, conversao, formato = parte
+            valor = valores[campo]
+            if escapado:
+                valor = _escapar(str(valor))
+            if conversao:
+                valor = conversao(valor)
+            pedacos.append(format(valor, formato))
+        return ''.join(pedacos)
+
+
+_REGISTRO: Dict[str, Template] = {}
+
+
+def registrar(nome: str, texto: str, escapar: Tuple[str, ...] = CAMPOS_ESCAPADOS) -> Template:
+    """Compila e registra (ou substitui) um template"""
+    template = Template(nome, texto, escapar)
+    _REGISTRO[nome] = template
+    return template
+
+
+def obter(nome: str) -> Template:
+    """Retorna o template compilado pelo nome"""
+    return _REGISTRO[nome]
+
+
+def renderizar(nome: str, **valores) -> str:
+    """Renderiza o template `nome` com os valores"""
+    return _REGISTRO[nome].renderizar(valores)
+
+
+def renderizar_lista(nome: str, itens: Iterable[Mapping], separador: str = "") -> str:
+    """Renderiza o template `nome` para cada item e junta tudo de uma vez"""
+    return separador.join(map(_REGISTRO[nome].renderizar, itens))
+
+
+def carregar_arquivo(caminho: str) -> int:
+    """Substitui textos registrados pelos de um JSON {nome: texto}; retorna quantos"""
+    with open(caminho, encoding='utf-8') as arquivo:
+        textos = json.load(arquivo)
+    
+    for nome, texto in textos.items():
+        if nome not in _REGISTRO:
+            logger.warning(f"⚠️ Template desconhecido ignorado: {nome}")
+            continue
+        registrar(nome, texto, _REGISTRO[nome].escapar)
+    return len(textos)
+
+
+# ==================== RESPOSTAS ====================
+
+registrar('plantao_salvo', """
+✅ *PLANTÃO SALVO COM SUCESSO!*
+
+📅 *Data:* {data}{ano}
+⏰ *Hora:* {hora}
+🏥 *Local:* {local}
+
+📱 *Lembretes automáticos:*
+   ⏰ 24 horas antes
+   🔔 3 horas antes
+   🚨 30 minutos antes
+
+💡 *Dica:* Já separou tudo que precisa?
+""")
+
+registrar('plantao_deletado', (
+    "✅ *PLANTÃO DELETADO!*\n\n"
+    "📅 {data} ⏰ {hora}\n"
+    "🏥 {local}\n\n"
+    "O plantão foi removido com sucesso."
+))
+
+registrar('item_agenda', "⏰ *{hora}* - {local}\n")
+registrar('agenda_hoje', "📅 *PLANTÕES DE HOJE:*\n\n{itens}")
+registrar('agenda_hoje_vazia', "✅ Nenhum plantão hoje! Aproveite o descanso! 😊")
+registrar('agenda_amanha', "📅 *PLANTÕES DE AMANHÃ:*\n\n{itens}")
+registrar('agenda_amanha_vazia', "✅ Nenhum plantão amanhã! 🎉")
+
+registrar('item_lista', "📅 *{data}* ⏰ *{hora}*\n🏥 {local}")
+registrar('lista_plantoes', "{titulo}\n\n{itens}")
+registrar('lista_vazia', "📭 Nenhum plantão encontrado.")
+registrar('total_plantoes', "\n\n📊 *Total:* {total} plantões")
+
+registrar('chat_id', "🔑 *Seu Chat ID:* `{chat_id}`\n\nEnvie este número para configurar notificações!")
+
+registrar('debug', """
+🔧 *INFORMAÇÕES DE DEBUG:*
+
+⏰ Hora do servidor: {agora:%d/%m/%Y %H:%M:%S}
+📊 Total de plantões: {total}
+👤 Seus plantões: {meus_plantoes}
+🤖 Bot: @PlantaoMedBot
+🔑 Seu Chat ID: `{chat_id}`
+
+📋 *Seus próximos plantões:*
+{itens}
+💡 *Dica:* Se o ano estiver errado, use /corrigir_ano""")
+registrar('item_debug', "\n📅 *{data}/{ano} {hora}* - {local}\n   {status}\n")
+
+# ==================== LEMBRETES ====================
+
+registrar('lembrete_24h', """
+⏰ *LEMBRETE 24H - PLANTÃO AMANHÃ!*
+
+📅 {data} às {hora}
+🏥 {local}
+
+💡 *Checklist:*
+• ✅ Estetoscópio
+• ✅ Jaleco
+• ✅ Lanche/água
+• ✅ Carregador
+• ✅ Roupas confortáveis
+• ✅ Documentos
+
+💪 Boa sorte, amore! ❤️
+""")
+
+registrar('lembrete_3h', """
+🚨 *PLANTÃO EM 3 HORAS!*
+
+🏥 {local}
+⏰ {hora}
+
+⚡ *Hora de se preparar!*
+• Verifique o trânsito
+• Separe tudo que precisa
+• Alimente-se bem
+
+❤️ Vai dar tudo certo!
+""")
+
+registrar('lembrete_30min', """
+🚨🚨 *PLANTÃO EM 30 MINUTOS!*
+
+🏥 {local}
+⏰ {hora}
+
+⚡⚡ *HORA DE SAIR!*
+• Vá com segurança
+• Você é incrível!
+
+❤️❤️ BOA PLANTÃO, AMORE! ❤️❤️
+""")
+
+registrar('lembretes_atrasados',
+          "⏰ *LEMBRETES ATRASADOS*\n\nO bot ficou fora do ar e não avisou a tempo. Seus próximos plantões:\n{itens}")
+registrar('item_atrasado', "\n📅 *{data}* ⏰ *{hora}* - {local}{status}\n")
+
+registrar('notificacao_namorado', """
+👩‍⚕️ *SUA NAMORADA ADICIONOU UM PLANTÃO!*
+
+📅 {data} ⏰ {hora}
+🏥 {local}
+
+💌 *Mande uma mensagem carinhosa para ela!*
+💪 *Deseje boa sorte!*
+❤️ *Mostre que você se importa!*
+""")
+
+
+if TEMPLATES_ARQUIVO:
+    logger.info(f"📝 {carregar_arquivo(TEMPLATES_ARQUIVO)} templates carregados de {TEMPLATES_ARQUIVO}")
@@ -10,7 +10,8 @@ def teste_banco_dados():
     print("🧪 Testando banco de dados...")
     
     try:
-        from database import Database
+        from database import Database, get_db_connection
+        from utils import DateTimeUtils
         
         # Inicializar banco
         Database.init_db()
@@ -30,16 +31,204 @@ def teste_banco_dados():
         assert len(plantoes) > 0, "Nenhum plantão encontrado"
         print(f"  ✅ Plantão encontrado: {plantoes[0]}")
         
+        # Testar estatísticas (consulta agregada única)
+        hoje = DateTimeUtils.obter_data_hoje()
+        amanha = DateTimeUtils.obter_data_amanha()
+        Database.salvar_plantao(chat_id_teste, hoje, "23:59", local_teste)
+        Database.salvar_plantao(chat_id_teste, amanha, "08:00", local_teste)
+        stats = Database.estatisticas(chat_id_teste)
+        assert stats['total_plantoes'] == 3, f"Total incorreto: {stats}"
+        assert stats['plantoes_hoje'] == 1 and stats['plantoes_amanha'] == 1, f"Contagem incorreta: {stats}"
+        assert stats['proximo_plantao_em_horas'] is not None, "Próximo plantão não calculado"
+        print(f"  ✅ Estatísticas: {stats}")
+        
+        # Testar agenda do dia em cache (invalidada na escrita do chat)
+        assert Database.buscar_plantoes_por_data(chat_id_teste, hoje) == [(hoje, "23:59", local_teste)]
+        assert Database.buscar_plantoes_por_data(chat_id_teste, hoje) == [(hoje, "23:59", local_teste)], "Cache divergente"
+        extra_id = Database.salvar_plantao(chat_id_teste, hoje, "23:58", "Plantão Extra")
+        assert len(Database.buscar_plantoes_por_data(chat_id_teste, hoje)) == 2, "Cache não invalidado ao salvar"
+        Database.desativar_plantao(extra_id)
+        assert len(Database.buscar_plantoes_por_data(chat_id_teste, hoje)) == 1, "Cache não invalidado ao desativar"
+        print("  ✅ Agenda do dia em cache e invalidada nas escritas")
+        
+        dia_hoje = DateTimeUtils.parse_data_hora(hoje, '00:00').date().isoformat()
+        with get_db_connection() as conn:
+            conn.execute("DELETE FROM cache_agenda WHERE chat_id = ?", (chat_id_teste,))
+            versao = conn.execute("SELECT versao FROM versoes_agenda WHERE chat_id = ?", (chat_id_teste,)).fetchone()[0]
+        with get_db_connection() as conn:
+            Database._gravar_cache_agenda(conn, True, chat_id_teste, dia_hoje, versao - 1, [])
+        bloqueio = sqlite3.connect('plantoes.db', isolation_level=None)
+        bloqueio.execute("BEGIN IMMEDIATE")
+        try:
+            assert len(Database.buscar_plantoes_por_data(chat_id_teste, hoje)) == 1, "Leitura falhou com o banco ocupado"
+        finally:
+            bloqueio.execute("ROLLBACK")
+            bloqueio.close()
+        with get_db_connection() as conn:
+            assert conn.execute("SELECT COUNT(*) FROM cache_agenda WHERE chat_id = ?", (chat_id_teste,)).fetchone()[0] == 0, \
+                "Agenda de versão antiga ou com o banco ocupado foi para o cache"
+        print("  ✅ Leitura sem lock de escrita; cache só gravado na versão atual")
+        
+        # Testar paginação por cursor
+        pagina1, cursor = Database.buscar_plantoes_pagina(chat_id_teste, 2)
+        pagina2, fim = Database.buscar_plantoes_pagina(chat_id_teste, 2, cursor)
+        assert len(pagina1) == 2 and len(pagina2) == 1 and fim is None, "Paginação incorreta"
+        assert pagina1[-1]['inicio_ts'] <= pagina2[0]['inicio_ts'], "Páginas fora de ordem"
+        print(f"  ✅ Paginação por cursor ({cursor})")
+        
+        # Testar arquivamento de plantões antigos (em lotes) e compactação
+        data_antiga = (datetime.now() - timedelta(days=60)).strftime("%d/%m")
+        antigo_id = Database.salvar_plantao(chat_id_teste, data_antiga, hora_teste, local_teste)
+        relatorio = Database.limpar_plantoes_antigos(dias=30, lote=1, pausa=0)
+        assert relatorio['movidos'] >= 1, f"Nada foi arquivado: {relatorio}"
+        assert Database.buscar_plantao(antigo_id, chat_id_teste) is None, "Plantão antigo continua ativo"
+        Database.compactar()
+        print(f"  ✅ Arquivamento: {relatorio}")
+        
         # Limpar teste
         conn = sqlite3.connect('plantoes.db')
         c = conn.cursor()
         c.execute("DELETE FROM plantoes WHERE chat_id = ?", (chat_id_teste,))
+        c.execute("DELETE FROM plantoes_arquivo WHERE chat_id = ?", (chat_id_teste,))
+        c.execute("DELETE FROM cache_agenda WHERE chat_id = ?", (chat_id_teste,))
         conn.commit()
         conn.close()
         print("  ✅ Dados de teste removidos")
         
         return True
+    
+    except Exception as e:
+        print(f"  ❌ Erro: {e}")
+        return False
+
+def teste_migracoes():
+    """Testa migrações versionadas a partir de um banco antigo (sem versão)"""
+    print("\n🧪 Testando migrações...")
+    
+    try:
+        import os
+        import tempfile
+        import migracoes
+        
+        with tempfile.TemporaryDirectory() as pasta:
+            conn = sqlite3.connect(os.path.join(pasta, 'antigo.db'))
+            conn.row_factory = sqlite3.Row
+            conn.execute('CREATE TABLE plantoes (id INTEGER PRIMARY KEY AUTOINCREMENT, chat_id INTEGER NOT NULL, '
+                         'data TEXT NOT NULL, hora TEXT NOT NULL, local TEXT NOT NULL)')
+            conn.executemany('INSERT INTO plantoes (chat_id, data, hora, local) VALUES (1, ?, ?, ?)',
+                             [("15/03", "19:00", "Hospital")] * (migracoes.LOTE_MIGRACAO + 10))
+            conn.commit()
+            
+            versao = migracoes.migrar(conn)
+            assert versao == migracoes.VERSAO_ATUAL, f"Versão final incorreta: {versao}"
+            sem_ts = conn.execute('SELECT COUNT(*) FROM plantoes WHERE inicio_ts IS NULL').fetchone()[0]
+            assert sem_ts == 0, f"{sem_ts} plantões sem inicio_ts"
+            print(f"  ✅ Banco antigo migrado para v{versao}")
+            
+            # Schema em dia: apenas a leitura do user_version
+            comandos = []
+            conn.set_trace_callback(comandos.append)
+            migracoes.migrar(conn)
+            conn.set_trace_callback(None)
+            assert comandos == ["PRAGMA user_version"], f"Comandos inesperados: {comandos}"
+            print("  ✅ Inicialização com schema em dia executa só 1 pragma")
+            conn.close()
+        
+        return True
+    
+    except Exception as e:
+        print(f"  ❌ Erro: {e}")
+        return False
+
+def teste_planos_consulta():
+    """Testa planos de consulta: nenhum método do Database pode varrer tabelas ou ordenar em B-tree temporária"""
+    print("\n🧪 Testando planos de consulta...")
+    
+    try:
+        import re
+        import time
+        from database import Database, get_db_connection
+        from utils import DateTimeUtils
         
+        Database.init_db()
+        chat_id = 987654321
+        ids = []
+        for dias in range(-60, 60, 3):
+            data = (datetime.now() + timedelta(days=dias)).strftime("%d/%m")
+            ids.append(Database.salvar_plantao(chat_id, data, "19:00", "Hospital Plano"))
+        Database.salvar_plantao(chat_id + 1, DateTimeUtils.obter_data_hoje(), "20:00", "Outro chat")
+        _, cursor = Database.buscar_plantoes_pagina(chat_id, 5)
+        
+        metodos = {
+            'buscar_plantoes_por_data': lambda: Database.buscar_plantoes_por_data(chat_id, DateTimeUtils.obter_data_hoje()),
+            'buscar_plantoes_por_data (cache)': lambda: Database.buscar_plantoes_por_data(chat_id, DateTimeUtils.obter_data_hoje()),
+            'limpar_cache_agenda': lambda: Database.limpar_cache_agenda(),
+            'versao_agenda': lambda: Database.versao_agenda(chat_id),
+            'buscar_proximos_plantoes': lambda: Database.buscar_proximos_plantoes(chat_id, 5),
+            'buscar_plantoes_pagina': lambda: Database.buscar_plantoes_pagina(chat_id, 5, cursor),
+            'buscar_plantoes_para_exclusao': lambda: Database.buscar_plantoes_para_exclusao(chat_id),
+            'buscar_plantao': lambda: Database.buscar_plantao(ids[0], chat_id),
+            'buscar_lembretes_vencidos': lambda: Database.buscar_lembretes_vencidos(),
+            'proximo_lembrete': lambda: Database.proximo_lembrete(),
+            'buscar_lembretes_vencidos (shards)': lambda: Database.buscar_lembretes_vencidos(None, [1], 4),
+            'proximo_lembrete (shards)': lambda: Database.proximo_lembrete([0, 2], 4),
+            'renovar_shards': lambda: Database.renovar_shards('plano', 4, 1),
+            'liberar_shards': lambda: Database.liberar_shards('plano', [0, 1, 2, 3]),
+            'enfileirar_mensagens': lambda: Database.enfileirar_mensagens([{'chave': 'plano', 'chat_id': chat_id, 'texto': 'x'}]),
+            'reservar_mensagens': lambda: Database.reservar_mensagens(10),
+            'atualizar_mensagem': lambda: Database.atualizar_mensagem(1, 1, 'enviado'),
+            'renovar_reservas': lambda: Database.renovar_reservas({1: 1, 2: 1}),
+            'proxima_mensagem': lambda: Database.proxima_mensagem(),
+            'limpar_outbox': lambda: Database.limpar_outbox(0),
+            'buscar_lembretes_perdidos': lambda: Database.buscar_lembretes_perdidos(0, time.time() + 86400 * 30),
+            'ler_estado': lambda: Database.ler_estado('teste'),
+            'gravar_estado': lambda: Database.gravar_estado('teste', 1),
+            'gravar_conversa': lambda: Database.gravar_conversa(chat_id, 'local', '15/03', '19:00', time.time() + 60),
+            'buscar_conversa': lambda: Database.buscar_conversa(chat_id),
+            'buscar_chats_em_conversa': lambda: Database.buscar_chats_em_conversa(),
+            'apagar_conversa': lambda: Database.apagar_conversa(chat_id),
+            'limpar_conversas': lambda: Database.limpar_conversas(),
+            'contar_plantoes (chat)': lambda: Database.contar_plantoes(chat_id),
+            'contar_plantoes (total)': lambda: Database.contar_plantoes(),
+            'estatisticas': lambda: Database.estatisticas(chat_id),
+            'marcar_lembretes': lambda: Database.marcar_lembretes([(ids[-1], '24h'), (ids[-2], '3h')]),
+            'atualizar_lembrete': lambda: Database.atualizar_lembrete(ids[-3], '30min'),
+            'resetar_lembretes': lambda: Database.resetar_lembretes(chat_id),
+            'desativar_plantao': lambda: Database.desativar_plantao(ids[1]),
+            'limpar_plantoes_antigos': lambda: Database.limpar_plantoes_antigos(lote=10, pausa=0),
+        }
+        
+        # Captura o SQL (com parâmetros expandidos) executado por cada método
+        consultas = {}
+        with get_db_connection() as conn:
+            capturadas = []
+            conn.set_trace_callback(capturadas.append)
+            try:
+                for nome, chamar in metodos.items():
+                    capturadas.clear()
+                    chamar()
+                    consultas[nome] = [sql for sql in capturadas
+                                       if sql.lstrip().upper().startswith(('SELECT', 'UPDATE', 'DELETE', 'INSERT'))]
+            finally:
+                conn.set_trace_callback(None)
+            
+            problemas = []
+            for nome, sqls in consultas.items():
+                for sql in sqls:
+                    for linha in conn.execute(f"EXPLAIN QUERY PLAN {sql}"):
+                        detalhe = linha['detail']
+                        if re.match(r'SCAN \w+$', detalhe) or 'TEMP B-TREE' in detalhe:
+                            problemas.append(f"{nome}: {detalhe}")
+            
+            conn.execute("DELETE FROM plantoes WHERE chat_id IN (?, ?)", (chat_id, chat_id + 1))
+            conn.execute("DELETE FROM plantoes_arquivo WHERE chat_id IN (?, ?)", (chat_id, chat_id + 1))
+            conn.execute("DELETE FROM cache_agenda WHERE chat_id IN (?, ?)", (chat_id, chat_id + 1))
+        
+        assert not problemas, "Planos degradados:\n    " + "\n    ".join(problemas)
+        print(f"  ✅ {sum(len(s) for s in consultas.values())} consultas de {len(consultas)} métodos usam índices")
+        
+        return True
+    
     except Exception as e:
         print(f"  ❌ Erro: {e}")
         return False
@@ -49,7 +238,7 @@ def teste_utils():
     print("\n🧪 Testando utilitários...")
     
     try:
-        from utils import DateTimeUtils, validar_formato_plantao
+        from utils import DateTimeUtils, TelegramUtils, validar_formato_plantao
         
         # Testar validação de data
         assert DateTimeUtils.validar_data("15/03"), "Data válida rejeitada"
@@ -66,12 +255,574 @@ def teste_utils():
         assert data_plantao is not None, "Parse falhou"
         print(f"  ✅ Parse de data/hora funciona: {data_plantao}")
         
+        # Testar lógica de ano relativa ao dia de referência e parse em lote (cache)
+        referencia = datetime(2025, 12, 20).date()
+        assert DateTimeUtils.parse_data_hora("05/01", "07:00", referencia).year == 2026, "Data de janeiro deveria ir para o ano seguinte"
+        assert DateTimeUtils.parse_data_hora("15/11", "07:00", referencia).year == 2025, "Data recente deveria ficar no ano atual"
+        pares = [("15/03", "19:00"), ("99/99", "19:00"), ("15/03", "19:00")]
+        assert DateTimeUtils.parse_lote(pares) == [data_plantao, None, data_plantao], "Parse em lote divergente"
+        print("  ✅ Parse em lote e lógica de ano por dia de referência")
+        
+        agora = datetime(2025, 3, 15, 18, 45)
+        tempos = DateTimeUtils.tempo_restante_lote([("15/03", "19:00"), ("xx", "19:00"), ("17/03", "19:00")], agora)
+        assert [t and t[2] for t in tempos] == ["🚨 EM 15 MIN", None, "📅 EM 2 DIAS"], f"Tempos inesperados: {tempos}"
+        print("  ✅ Tempo restante em lote com uma leitura do relógio")
+        
         # Testar cálculo de tempo
         horas, status = DateTimeUtils.calcular_tempo_restante(data_plantao)
         print(f"  ✅ Cálculo de tempo: {status}")
         
+        # Testar agrupamento de blocos em mensagens do Telegram
+        partes = TelegramUtils.dividir_mensagem(["a" * 2000, "b" * 2000, "c" * 2000, "d" * 5000])
+        assert [len(p) for p in partes] == [4002, 2000, 4094, 906], f"Divisão inesperada: {[len(p) for p in partes]}"
+        print("  ✅ Divisão de mensagens respeita o limite de 4096 (sem truncar)")
+        
+        # Lista longa (ex: /todos): quebra em fim de linha, entidade cortada é reaberta
+        lista = "\n".join(f"📅 *{i % 28 + 1:02d}/03* ⏰ *19:00* - Hospital {i}" for i in range(300))
+        partes = TelegramUtils.dividir_texto(lista + "\n*" + "negrito " * 600 + "*")
+        assert "\n".join(partes[:-2]) == lista[:sum(len(p) + 1 for p in partes[:-2]) - 1], "Quebra fora do fim de linha"
+        assert all(len(p) <= 4096 and TelegramUtils._entidade_aberta(p) is None for p in partes)
+        assert partes[-1].startswith("*negrito") and partes[-2].endswith("negrito*")
+        print(f"  ✅ Texto longo dividido em {len(partes)} mensagens sem partir entidades")
+        
+        return True
+    
+    except Exception as e:
+        print(f"  ❌ Erro: {e}")
+        return False
+
+def teste_teclados():
+    """Testa teclados pré-serializados (reutilizados entre mensagens)"""
+    print("\n🧪 Testando teclados...")
+    
+    try:
+        import json
+        from telebot import apihelper
+        from keyboards import KeyboardFactory
+        
+        principal = KeyboardFactory.criar_teclado_principal()
+        assert principal is KeyboardFactory.criar_teclado_principal(), "Teclado principal recriado"
+        assert apihelper._convert_markup(principal) == KeyboardFactory._montar_teclado_principal().to_json()
+        botoes = json.loads(KeyboardFactory.criar_teclado_data_hora().to_json())['keyboard']
+        assert botoes[0][0]['text'] == f"{datetime.now().strftime('%d/%m')} 19:00", f"Sugestão de data errada: {botoes[0]}"
+        print("  ✅ Teclados montados uma vez e serializados como o TeleBot espera")
+        
+        return True
+    
+    except Exception as e:
+        print(f"  ❌ Erro: {e}")
+        return False
+
+def teste_templates():
+    """Testa templates pré-compilados (listas, escape do local, troca de texto e campos aceitos)"""
+    print("\n🧪 Testando templates...")
+    
+    try:
+        import templates
+        from lembretes import LembreteService
+        from utils import TelegramUtils
+        
+        assert TelegramUtils.escapar_markdown("a_b.c!") == "a\\_b\\.c\\!"
+        assert TelegramUtils.escapar_markdown_simples("Hosp_*São*") == "Hosp\\_\\*São\\*"
+        print("  ✅ Escape de Markdown em um único passe")
+        
+        itens = templates.renderizar_lista('item_agenda', [{'hora': '07:00', 'local': 'UPA_Norte'},
+                                                           {'hora': '19:00', 'local': 'Hospital'}])
+        assert itens == "⏰ *07:00* - UPA\\_Norte\n⏰ *19:00* - Hospital\n", f"Lista inesperada: {itens!r}"
+        mensagem = LembreteService._criar_mensagem_3h("15/03", "19:00", "Santa *Casa*")
+        assert "🏥 Santa \\*Casa\\*" in mensagem and "⏰ 19:00" in mensagem
+        print("  ✅ Listas e lembretes renderizados com o local escapado")
+        
+        original = templates.obter('lembrete_3h')
+        try:
+            templates.registrar('lembrete_3h', "3h: {local} às {hora}")
+            assert LembreteService._criar_mensagem_3h("15/03", "19:00", "UPA") == "3h: UPA às 19:00"
+        finally:
+            templates.registrar('lembrete_3h', original.texto, original.escapar)
+        print("  ✅ Texto trocado no registro sem alterar os handlers")
+        
+        from datetime import datetime
+        assert templates.Template('t', "{agora:%d/%m} {n!r}").renderizar(
+            {'agora': datetime(2024, 3, 15), 'n': 'x', 'extra': 1}) == "15/03 'x'"
+        for texto in ("{local.__class__}", "{local[0]}", "{local:{formato}}"):
+            try:
+                templates.Template('t', texto)
+                raise AssertionError(f"Template aceitou {texto}")
+            except ValueError:
+                pass
+        print("  ✅ Formatos aceitos; atributos e índices recusados")
+        
+        return True
+    
+    except Exception as e:
+        print(f"  ❌ Erro: {e}")
+        return False
+
+def teste_lembretes_vencidos():
+    """Testa lembretes pré-calculados no banco (janela aberta, marcação e desativação)"""
+    print("\n🧪 Testando lembretes vencidos...")
+    
+    try:
+        import time
+        from database import Database, get_db_connection
+        
+        Database.init_db()
+        chat_id = 246813579
+        agora = time.time()
+        inicio = datetime.fromtimestamp(agora) + timedelta(hours=24)
+        plantao_id = Database.salvar_plantao(chat_id, inicio.strftime("%d/%m"), inicio.strftime("%H:%M"), "Hospital Teste")
+        
+        vencidos = [l for l in Database.buscar_lembretes_vencidos(agora) if l['plantao_id'] == plantao_id]
+        assert [l['tipo'] for l in vencidos] == ['24h'], f"Lembretes inesperados: {[tuple(l) for l in vencidos]}"
+        assert Database.proximo_lembrete() <= agora, "Janela de 24h deveria estar aberta"
+        print("  ✅ Só o lembrete de 24h está vencido")
+        
+        assert Database.marcar_lembretes([(plantao_id, '24h')]) == [(plantao_id, '24h')]
+        assert Database.marcar_lembretes([(plantao_id, '24h')]) == [], "Lembrete marcado duas vezes"
+        assert not [l for l in Database.buscar_lembretes_vencidos(agora) if l['plantao_id'] == plantao_id]
+        print("  ✅ Lembrete marcado sai da lista de pendentes")
+        
+        # Lote maior que o limite de variáveis do SQLite: marcado em blocos
+        lote = [(plantao_id, '3h')] + [(-i, '3h') for i in range(1, 1500)]
+        assert Database.marcar_lembretes(lote) == [(plantao_id, '3h')], "Lote grande não foi marcado"
+        with get_db_connection() as conn:
+            conn.execute("UPDATE lembretes SET sent_at = NULL WHERE plantao_id = ? AND tipo = '3h'", (plantao_id,))
+            conn.execute("UPDATE plantoes SET lembrete_3h = 0 WHERE id = ?", (plantao_id,))
+        print("  ✅ Lote de 1500 lembretes marcado em blocos")
+        
+        # Bot fora do ar por 30h: as janelas de 3h e 30min fecham sem envio
+        perdidos = [l['tipo'] for l in Database.buscar_lembretes_perdidos(agora, agora + 30 * 3600)
+                    if l['plantao_id'] == plantao_id]
+        assert perdidos == ['3h', '30min'], f"Perdidos inesperados: {perdidos}"
+        Database.gravar_estado('teste_ultimo_ciclo', int(agora))
+        assert Database.ler_estado('teste_ultimo_ciclo') == int(agora)
+        print("  ✅ Lembretes perdidos durante indisponibilidade são encontrados")
+        
+        # Muitos plantões perdidos: o aviso vira várias mensagens, sem partir um plantão
+        from lembretes import LembreteService
+        plantoes = [{'plantao_id': i, 'data': inicio.strftime("%d/%m"), 'hora': inicio.strftime("%H:%M"),
+                     'local': f"Hospital_{i} " + "x" * 60, 'inicio_ts': int(agora) + 86400 + i}
+                    for i in range(150)]
+        mensagens = LembreteService._mensagens_atrasados(chat_id, agora, plantoes)
+        assert len(mensagens) > 1 and all(len(m['texto']) <= 4096 for m in mensagens), "Aviso passou do limite"
+        assert len({m['chave'] for m in mensagens}) == len(mensagens), "Partes com a mesma chave"
+        texto = "".join(m['texto'] for m in mensagens)
+        assert all(f"Hospital\\_{i} " in texto for i in range(150)), "Plantão perdido na divisão"
+        print(f"  ✅ Aviso de 150 atrasados dividido em {len(mensagens)} mensagens")
+        
+        Database.desativar_plantao(plantao_id)
+        depois = agora + 22 * 3600
+        assert not [l for l in Database.buscar_lembretes_vencidos(depois) if l['plantao_id'] == plantao_id]
+        print("  ✅ Plantão desativado não gera lembretes")
+        
         return True
+    
+    except Exception as e:
+        print(f"  ❌ Erro: {e}")
+        return False
+
+def teste_ciclo_lembretes():
+    """Testa um ciclo completo do LembreteService: vencidos → marcação → outbox (um aviso por chat)"""
+    print("\n🧪 Testando ciclo de lembretes...")
+    
+    try:
+        import time
+        from database import Database, get_db_connection
+        from lembretes import LembreteService
+        
+        class FilaFalsa:
+            def iniciar(self):
+                pass
         
+        Database.init_db()
+        chat_id = 777000111
+        agora = time.time()
+        ids = [
+            Database.salvar_plantao(chat_id, inicio.strftime("%d/%m"), inicio.strftime("%H:%M"), local)
+            for inicio, local in ((datetime.fromtimestamp(agora) + timedelta(hours=24), "Santa_Casa *UTI*"),
+                                  (datetime.fromtimestamp(agora) + timedelta(hours=23, minutes=50), "UPA Norte"))
+        ]
+        
+        # Shard exclusivo do chat: o ciclo não toca os lembretes dos outros testes
+        servico = LembreteService(None, FilaFalsa(), total_shards=1000003)
+        servico.shards = [chat_id % servico.total_shards]
+        
+        def mensagens():
+            with get_db_connection() as conn:
+                return [linha['texto'] for linha in conn.execute(
+                    "SELECT texto FROM outbox WHERE chat_id = ? AND chave LIKE 'lembretes:%'", (chat_id,))]
+        
+        try:
+            servico._verificar_lembretes()
+            textos = mensagens()
+            assert len(textos) == 1, f"Esperada uma mensagem para o chat, vieram {len(textos)}"
+            assert "Santa\\_Casa \\*UTI\\*" in textos[0] and "UPA Norte" in textos[0], "Lembretes fora da mensagem"
+            print("  ✅ Dois lembretes do chat juntos em uma mensagem, com o local escapado")
+            
+            with get_db_connection() as conn:
+                marcadores = ','.join('?' * len(ids))
+                flags = conn.execute(f"SELECT lembrete_24h FROM plantoes WHERE id IN ({marcadores})", ids).fetchall()
+                enviados = conn.execute(f"SELECT COUNT(*) FROM lembretes WHERE tipo = '24h' AND sent_at IS NOT NULL "
+                                        f"AND plantao_id IN ({marcadores})", ids).fetchone()[0]
+            assert [linha[0] for linha in flags] == [1, 1] and enviados == 2, "Lembretes não marcados"
+            print("  ✅ Lembretes marcados como enviados")
+            
+            servico._verificar_lembretes()
+            assert len(mensagens()) == 1, "Segundo ciclo enfileirou de novo"
+            print("  ✅ Segundo ciclo não enfileira nada")
+        finally:
+            with get_db_connection() as conn:
+                conn.execute("DELETE FROM outbox WHERE chat_id = ?", (chat_id,))
+                conn.execute("DELETE FROM lembretes WHERE plantao_id IN (SELECT id FROM plantoes WHERE chat_id = ?)", (chat_id,))
+                conn.execute("DELETE FROM plantoes WHERE chat_id = ?", (chat_id,))
+        
+        return True
+    
+    except Exception as e:
+        print(f"  ❌ Erro: {e}")
+        return False
+
+def teste_shards_lembretes():
+    """Testa leases de shards: um dono por shard, failover e filtro de lembretes por shard"""
+    print("\n🧪 Testando shards de lembretes...")
+    
+    try:
+        import time
+        from database import Database, get_db_connection
+        
+        Database.init_db()
+        with get_db_connection() as conn:
+            conn.execute('DELETE FROM shards_lembretes')
+        
+        # Banco novo: o primeiro worker assume tudo e devolve o shard do segundo
+        assert Database.renovar_shards('worker-a', 2, 0) == [0, 1], "Primeiro heartbeat não assumiu os shards"
+        assert Database.renovar_shards('worker-b', 2, 1) == [1], "Worker não retomou seu shard do reserva"
+        assert Database.renovar_shards('worker-a', 2, 0) == [0], "Reserva manteve o shard retomado"
+        assert Database.renovar_shards('worker-c', 2, 0) == [], "Shard com lease válido foi assumido"
+        print("  ✅ Cada worker detém só o seu shard")
+        
+        Database.liberar_shards('worker-b', [1])
+        assert Database.renovar_shards('worker-a', 2, 0) == [0, 1], "Shard liberado não foi assumido"
+        assert Database.renovar_shards('worker-b', 2, 1) == [1], "Worker reiniciado não retomou seu shard"
+        assert Database.renovar_shards('worker-a', 2, 0) == [0]
+        Database.renovar_shards('worker-a', 2, 0, duracao=-60)
+        assert Database.renovar_shards('worker-b', 2, 1) == [0, 1], "Lease expirado não foi assumido"
+        Database.liberar_shards('worker-b', [0, 1])
+        print("  ✅ Failover por liberação e por expiração do lease")
+        
+        agora = time.time()
+        inicio = datetime.fromtimestamp(agora) + timedelta(hours=24)
+        ids = {chat_id: Database.salvar_plantao(chat_id, inicio.strftime("%d/%m"), inicio.strftime("%H:%M"), "Hospital Shard")
+               for chat_id in (1000, -1001)}
+        for shard, chat_id in ((0, 1000), (1, -1001)):
+            chats = {l['chat_id'] for l in Database.buscar_lembretes_vencidos(agora, [shard], 2)} & set(ids)
+            assert chats == {chat_id}, f"Shard {shard} com lembretes dos chats {chats}"
+        for plantao_id in ids.values():
+            Database.desativar_plantao(plantao_id)
+        print("  ✅ Lembretes filtrados pelo shard do chat")
+        
+        return True
+    
+    except Exception as e:
+        print(f"  ❌ Erro: {e}")
+        return False
+
+def teste_fila_envio():
+    """Testa fila de envio contra uma API falsa do Telegram (429 + retry_after)"""
+    print("\n🧪 Testando fila de envio...")
+    
+    try:
+        import json
+        import threading
+        import telebot
+        from http.server import BaseHTTPRequestHandler, HTTPServer
+        from telebot import apihelper
+        from envio import FilaEnvio
+        
+        recebidas = []
+        
+        class ApiFalsa(BaseHTTPRequestHandler):
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                recebidas.append(self.path)
+                if len(recebidas) == 1:
+                    corpo = {'ok': False, 'error_code': 429, 'description': 'Too Many Requests',
+                             'parameters': {'retry_after': 0}}
+                else:
+                    corpo = {'ok': True, 'result': {'message_id': len(recebidas), 'date': 0,
+                                                    'chat': {'id': 1, 'type': 'private'}}}
+                dados = json.dumps(corpo).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(dados)))
+                self.end_headers()
+                self.wfile.write(dados)
+            
+            def log_message(self, *args):
+                pass
+        
+        servidor = HTTPServer(('127.0.0.1', 0), ApiFalsa)
+        threading.Thread(target=servidor.serve_forever, daemon=True).start()
+        api_url_original = apihelper.API_URL
+        apihelper.API_URL = f"http://127.0.0.1:{servidor.server_port}/bot{{0}}/{{1}}"
+        
+        try:
+            resultados = []
+            fila = FilaEnvio(telebot.TeleBot("123:teste"), workers=2, limite_por_chat=100)
+            fila.iniciar()
+            fila.enviar(1, "primeira", ao_concluir=lambda ok, erro: resultados.append(ok))
+            fila.enviar(2, "segunda", ao_concluir=lambda ok, erro: resultados.append(ok))
+            fila.parar()
+        finally:
+            apihelper.API_URL = api_url_original
+            servidor.shutdown()
+        
+        stats = fila.estatisticas()
+        assert resultados == [True, True], f"Envios falharam: {resultados}"
+        assert stats['enviados'] == 2 and stats['tentativas_extras'] == 1, f"Estatísticas inesperadas: {stats}"
+        print(f"  ✅ 429 repetido após retry_after: {stats}")
+        
+        # Erros HTTP dos dois modos: resposta do requests (status_code) e do aiohttp (status)
+        from types import SimpleNamespace
+        from telebot import asyncio_helper
+        def erro_http(modulo, codigo, atributo):
+            resposta = SimpleNamespace(reason='Erro', text='', request_info=None, **{atributo: codigo})
+            return modulo.ApiHTTPException('sendMessage', resposta)
+        assert FilaEnvio.erro_temporario(erro_http(apihelper, 503, 'status_code')), "5xx do TeleBot não é temporário"
+        assert FilaEnvio.erro_temporario(erro_http(asyncio_helper, 502, 'status')), "5xx do AsyncTeleBot não é temporário"
+        assert not FilaEnvio.erro_temporario(erro_http(asyncio_helper, 400, 'status')), "4xx do AsyncTeleBot repetido"
+        print("  ✅ Erros HTTP do TeleBot e do AsyncTeleBot classificados")
+        
+        return True
+    
+    except Exception as e:
+        print(f"  ❌ Erro: {e}")
+        return False
+
+def teste_outbox():
+    """Testa a outbox: idempotência, novas tentativas, reservas (vencida e renovada) e expiração"""
+    print("\n🧪 Testando outbox...")
+    
+    try:
+        import time
+        from database import Database, get_db_connection
+        from outbox import OutboxService
+        
+        def estado(chave):
+            with get_db_connection() as conn:
+                return tuple(conn.execute('SELECT estado, tentativas FROM outbox WHERE chave = ?', (chave,)).fetchone())
+        
+        class FilaFalsa:
+            def __init__(self, erros):
+                self.erros = list(erros)
+            def iniciar(self):
+                pass
+            def vagas(self):
+                return 1000
+            def enviar(self, chat_id, texto, ao_concluir=None, max_tentativas=None, **kwargs):
+                assert max_tentativas == 1, "A outbox deve cuidar das novas tentativas"
+                erro = self.erros.pop(0) if self.erros else None
+                ao_concluir(erro is None, erro)
+        
+        class FilaParada(FilaFalsa):
+            def __init__(self):
+                self.pendentes = []
+            def enviar(self, chat_id, texto, ao_concluir=None, max_tentativas=None, **kwargs):
+                self.pendentes.append(ao_concluir)
+        
+        Database.init_db()
+        mensagem = {'chave': 'teste-outbox', 'chat_id': 135792468, 'texto': 'Oi', 'parse_mode': 'Markdown'}
+        assert Database.enfileirar_mensagens([mensagem]) == 1
+        assert Database.enfileirar_mensagens([mensagem]) == 0, "Chave repetida gerou outra mensagem"
+        print("  ✅ Chave de idempotência impede mensagem duplicada")
+        
+        outbox = OutboxService(FilaFalsa([ConnectionError("rede fora")]))
+        assert outbox.despachar() == 1
+        assert estado('teste-outbox') == ('pendente', 1), f"Falha temporária: {estado('teste-outbox')}"
+        assert outbox.despachar() == 0, "Nova tentativa antes do backoff"
+        with get_db_connection() as conn:
+            conn.execute("UPDATE outbox SET proxima_em = 0 WHERE chave = 'teste-outbox'")
+        assert outbox.despachar() == 1 and estado('teste-outbox') == ('enviado', 2)
+        print("  ✅ Falha temporária volta para a fila com backoff e depois é entregue")
+        
+        Database.enfileirar_mensagens([dict(mensagem, chave='teste-outbox-queda')])
+        assert len(Database.reservar_mensagens(10, prazo=-1)) == 1
+        assert OutboxService(FilaFalsa([ValueError("mensagem inválida")])).despachar() == 1
+        assert estado('teste-outbox-queda') == ('falhou', 2), f"Reserva vencida: {estado('teste-outbox-queda')}"
+        print("  ✅ Reserva de processo que caiu é retomada; erro definitivo marca falhou")
+        
+        Database.enfileirar_mensagens([dict(mensagem, chave='teste-outbox-fila')])
+        fila = FilaParada()
+        parada = OutboxService(fila)
+        assert parada.despachar() == 1 and estado('teste-outbox-fila') == ('enviando', 1)
+        assert parada.renovar_reservas() == 1, "Reserva na fila não foi renovada"
+        assert Database.reservar_mensagens(10) == [], "Mensagem na fila foi reservada de novo"
+        with get_db_connection() as conn:
+            conn.execute("UPDATE outbox SET proxima_em = 0 WHERE chave = 'teste-outbox-fila'")
+        assert len(Database.reservar_mensagens(10)) == 1
+        assert parada.renovar_reservas() == 0, "Renovou a reserva de outro processo"
+        fila.pendentes[0](True, None)
+        assert estado('teste-outbox-fila') == ('enviando', 2), f"Reserva vencida sobrescreveu: {estado('teste-outbox-fila')}"
+        print("  ✅ Reserva renovada enquanto espera; resultado de reserva vencida é ignorado")
+        
+        Database.enfileirar_mensagens([dict(mensagem, chave='teste-outbox-expirada', expira_em=int(time.time()) - 1)])
+        assert outbox.despachar() == 0 and estado('teste-outbox-expirada') == ('expirado', 0)
+        print("  ✅ Mensagem expirada não é enviada")
+        
+        return True
+    
+    except Exception as e:
+        print(f"  ❌ Erro: {e}")
+        return False
+
+def teste_conversas():
+    """Testa o estado das conversas do /plantao (persistência, expiração e limite em memória)"""
+    print("\n🧪 Testando conversas...")
+    
+    try:
+        from conversas import Conversas, ETAPA_DATA_HORA, ETAPA_LOCAL
+        from database import Database
+        
+        Database.init_db()
+        chat_id = 864213579
+        Conversas(persistir=True).avancar(chat_id, ETAPA_LOCAL, "15/03", "19:00")
+        conversa = Conversas(persistir=True).obter(chat_id)
+        assert (conversa.etapa, conversa.data, conversa.hora) == (ETAPA_LOCAL, "15/03", "19:00")
+        Conversas(persistir=True).encerrar(chat_id)
+        assert Conversas(persistir=True).obter(chat_id) is None, "Conversa encerrada continua aberta"
+        print("  ✅ Conversa persistida vale para outra instância (reinício ou outro worker)")
+        
+        import time
+        from unittest import mock
+        aberta = Conversas(persistir=True)
+        aberta.obter(chat_id)
+        with mock.patch.object(Database, 'buscar_conversa') as buscar, \
+                mock.patch.object(Database, 'buscar_chats_em_conversa') as recarregar:
+            assert aberta.obter(chat_id) is None, "Conversa inexistente encontrada"
+            assert not buscar.called and not recarregar.called, "Chat sem conversa consultou o banco"
+        
+        # Conversa aberta por outro worker (outra conexão): vista na mensagem seguinte
+        outro_worker = sqlite3.connect('plantoes.db')
+        outro_worker.execute("INSERT INTO conversas (chat_id, etapa, expira_em) VALUES (?, ?, ?)",
+                             (chat_id, ETAPA_DATA_HORA, time.time() + 60))
+        outro_worker.commit()
+        outro_worker.close()
+        assert aberta.obter(chat_id) is not None, "Conversa de outro worker não foi vista"
+        aberta.encerrar(chat_id)
+        print("  ✅ Chats fora de conversa não consultam o banco; conversas de outros workers vistas na hora")
+        
+        expiradas = Conversas(ttl=-1, persistir=True)
+        expiradas.avancar(chat_id, ETAPA_DATA_HORA)
+        assert expiradas.obter(chat_id) is None, "Conversa expirada continua aberta"
+        assert Database.limpar_conversas() >= 1, "Conversa abandonada não foi limpa"
+        print("  ✅ Conversas abandonadas expiram e são limpas")
+        
+        memoria = Conversas(max_itens=100, persistir=False)
+        for chat in range(1000):
+            memoria.avancar(chat, ETAPA_DATA_HORA)
+        assert len(memoria._itens) == 100 and memoria.obter(0) is None and memoria.obter(999) is not None
+        print("  ✅ Em memória, o número de conversas fica limitado")
+        
+        return True
+    
+    except Exception as e:
+        print(f"  ❌ Erro: {e}")
+        return False
+
+def teste_webhook():
+    """Testa o endpoint de webhook com um update gravado do Telegram"""
+    print("\n🧪 Testando webhook...")
+    
+    try:
+        import json
+        import web_api
+        from bot import bot
+        
+        update = {
+            'update_id': 1,
+            'message': {
+                'message_id': 10, 'date': 1700000000, 'text': '/id',
+                'chat': {'id': 123456789, 'type': 'private'},
+                'from': {'id': 123456789, 'is_bot': False, 'first_name': 'Teste'},
+                'entities': [{'type': 'bot_command', 'offset': 0, 'length': 3}]
+            }
+        }
+        recebidos = []
+        secret_original = web_api.WEBHOOK_SECRET
+        processar_original = bot.process_new_updates
+        web_api.WEBHOOK_SECRET = 'segredo-teste'
+        bot.process_new_updates = recebidos.extend
+        
+        try:
+            cliente = web_api.app.test_client()
+            sem_token = cliente.post('/webhook', json=update)
+            token_errado = cliente.post('/webhook', json=update,
+                                        headers={'X-Telegram-Bot-Api-Secret-Token': 'errado'})
+            nao_ascii = cliente.post('/webhook', json=update,
+                                     headers={'X-Telegram-Bot-Api-Secret-Token': 'segrédo'})
+            valido = cliente.post('/webhook', data=json.dumps(update), content_type='application/json',
+                                  headers={'X-Telegram-Bot-Api-Secret-Token': 'segredo-teste'})
+        finally:
+            web_api.WEBHOOK_SECRET = secret_original
+            bot.process_new_updates = processar_original
+        
+        assert sem_token.status_code == 403 and token_errado.status_code == 403, "Secret token não validado"
+        assert nao_ascii.status_code == 403, f"Header não ASCII: {nao_ascii.status_code}"
+        assert valido.status_code == 200, f"Status inesperado: {valido.status_code}"
+        assert len(recebidos) == 1 and recebidos[0].message.text == '/id', "Update não despachado"
+        print("  ✅ Secret token validado e update despachado para o bot")
+        
+        return True
+    
+    except Exception as e:
+        print(f"  ❌ Erro: {e}")
+        return False
+
+def teste_cache_api():
+    """Testa cache da API web: ETag/304 e invalidação ao salvar plantão (neste e em outro processo)"""
+    print("\n🧪 Testando cache da API...")
+    
+    try:
+        import web_api
+        from database import Database
+        
+        chat_id = 555000111
+        cliente = web_api.app.test_client()
+        web_api.cache_respostas.limpar()
+        
+        primeira = cliente.get(f'/api/plantoes/{chat_id}')
+        etag = primeira.headers.get('ETag')
+        assert primeira.status_code == 200 and etag, "Resposta sem ETag"
+        
+        repetida = cliente.get(f'/api/plantoes/{chat_id}', headers={'If-None-Match': etag})
+        assert repetida.status_code == 304, f"Esperado 304, veio {repetida.status_code}"
+        print("  ✅ Requisição repetida respondida com 304")
+        
+        plantao_id = Database.salvar_plantao(chat_id, "25/12", "19:00", "Hospital Cache")
+        try:
+            alterada = cliente.get(f'/api/plantoes/{chat_id}', headers={'If-None-Match': etag})
+            assert alterada.status_code == 200, "Cache não foi invalidado após salvar"
+            assert alterada.get_json()['total'] == primeira.get_json()['total'] + 1
+            print("  ✅ Cache invalidado ao salvar plantão")
+        finally:
+            Database.desativar_plantao(plantao_id)
+        
+        # Escrita feita por outro processo (bot em polling ou outro worker do gunicorn)
+        import os
+        import subprocess
+        etag = cliente.get(f'/api/plantoes/{chat_id}').headers.get('ETag')
+        codigo = f"from database import Database; print(Database.salvar_plantao({chat_id}, '26/12', '07:00', 'Outro Processo'))"
+        outro_id = int(subprocess.run([sys.executable, '-c', codigo], capture_output=True, text=True, check=True,
+                                      env=dict(os.environ, BOT_TOKEN=os.environ.get('BOT_TOKEN', 'teste'))).stdout.split()[-1])
+        try:
+            alterada = cliente.get(f'/api/plantoes/{chat_id}', headers={'If-None-Match': etag})
+            assert alterada.status_code == 200, "Cache serviu resposta antiga após escrita de outro processo"
+            print("  ✅ Cache invalidado por escrita de outro processo")
+        finally:
+            Database.desativar_plantao(outro_id)
+        
+        return True
+    
     except Exception as e:
         print(f"  ❌ Erro: {e}")
         return False
@@ -92,7 +843,7 @@ def teste_config():
         print("  ✅ Configurações de lembretes corretas")
         
         return True
-        
+    
     except Exception as e:
         print(f"  ❌ Erro: {e}")
         return False
@@ -113,7 +864,7 @@ def teste_bot_conexao():
         print(f"  ✅ ID: {info.id}")
         
         return True
-        
+    
     except Exception as e:
         print(f"  ❌ Erro: {e}")
         print("  💡 Verifique se o token está correto no .env")
@@ -128,6 +879,14 @@ def teste_estrutura_arquivos():
         'config.py',
         'database.py',
         'lembretes.py',
+        'envio.py',
+        'cache.py',
+        'manutencao.py',
+        'outbox.py',
+        'conversas.py',
+        'templates.py',
+        'worker_lembretes.py',
+        'migracoes.py',
         'keyboards.py',
         'utils.py',
         'web_api.py',
@@ -180,7 +939,19 @@ def executar_todos_testes():
         "Dependências": teste_dependencias(),
         "Configurações": teste_config(),
         "Banco de dados": teste_banco_dados(),
+        "Migrações": teste_migracoes(),
+        "Planos de consulta": teste_planos_consulta(),
         "Utilitários": teste_utils(),
+        "Teclados": teste_teclados(),
+        "Templates": teste_templates(),
+        "Lembretes vencidos": teste_lembretes_vencidos(),
+        "Ciclo de lembretes": teste_ciclo_lembretes(),
+        "Shards de lembretes": teste_shards_lembretes(),
+        "Fila de envio": teste_fila_envio(),
+        "Outbox": teste_outbox(),
+        "Conversas": teste_conversas(),
+        "Webhook": teste_webhook(),
+        "Cache da API": teste_cache_api(),
         "Conexão Telegram": teste_bot_conexao()
     }
     
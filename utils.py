@@ -1,13 +1,47 @@
 """
 Módulo de utilidades e funções auxiliares
 """
-from datetime import datetime, timedelta
-from typing import Tuple, Optional
+from datetime import date, datetime, time, timedelta
+from functools import lru_cache
+from typing import Iterable, Iterator, List, Tuple, Optional
 import logging
+import re
+
+from config import JANELAS_LEMBRETE, PARSE_CACHE_MAX_ITENS
 
 logger = logging.getLogger(__name__)
 
 
+@lru_cache(maxsize=PARSE_CACHE_MAX_ITENS)
+def _converter_data_hora(data_str: str, hora_str: str, referencia: date) -> Optional[datetime]:
+    """
+    Converte data/hora com a lógica de ano relativa ao dia de referência. Memoizado:
+    o resultado só muda quando o dia muda (datetime é imutável, pode ser compartilhado).
+    """
+    try:
+        dia, mes = data_str.split('/')
+        hora, minuto = hora_str.split(':')
+        ano_atual = referencia.year
+        
+        # Tentar com ano atual primeiro
+        data_plantao = datetime(ano_atual, int(mes), int(dia), int(hora), int(minuto))
+        
+        # Lógica inteligente para determinar o ano:
+        # Se a data já passou há MAIS de 6 meses, provavelmente é ano que vem
+        # Se passou há menos de 6 meses, provavelmente é uma data passada mesmo
+        diferenca = (datetime.combine(referencia, time.max) - data_plantao).days
+        
+        if diferenca > 180:  # Mais de 6 meses no passado
+            # Provavelmente é ano que vem
+            data_plantao = data_plantao.replace(year=ano_atual + 1)
+        # Senão é data passada recente ou futura no ano atual, manter como está
+        
+        return data_plantao
+    except Exception as e:
+        logger.error(f"Erro ao fazer parse de data/hora: {e}")
+        return None
+
+
 class DateTimeUtils:
     """Utilitários para manipulação de data/hora"""
     
@@ -32,58 +66,61 @@ class DateTimeUtils:
             return False
     
     @staticmethod
-    def parse_data_hora(data_str: str, hora_str: str) -> Optional[datetime]:
-        """Converte strings de data/hora para datetime com lógica inteligente de ano"""
-        try:
-            dia, mes = data_str.split('/')
-            hora, minuto = hora_str.split(':')
-            agora = datetime.now()
-            ano_atual = agora.year
-            
-            # Tentar com ano atual primeiro
-            data_plantao = datetime(
-                ano_atual, 
-                int(mes), 
-                int(dia), 
-                int(hora), 
-                int(minuto)
-            )
-            
-            # Lógica inteligente para determinar o ano:
-            # Se a data já passou há MAIS de 6 meses, provavelmente é ano que vem
-            # Se passou há menos de 6 meses, provavelmente é uma data passada mesmo
-            diferenca = (agora - data_plantao).days
-            
-            if diferenca > 180:  # Mais de 6 meses no passado
-                # Provavelmente é ano que vem
-                data_plantao = data_plantao.replace(year=ano_atual + 1)
-            elif diferenca > 0:  # Passou há menos de 6 meses
-                # É uma data passada mesmo, manter ano atual
-                pass
-            # Se diferenca <= 0, é data futura no ano atual, manter como está
-            
-            return data_plantao
-        except Exception as e:
-            logger.error(f"Erro ao fazer parse de data/hora: {e}")
-            return None
+    def parse_data_hora(data_str: str, hora_str: str, referencia: Optional[date] = None) -> Optional[datetime]:
+        """Converte strings de data/hora para datetime com lógica inteligente de ano (com cache)"""
+        return _converter_data_hora(data_str, hora_str, referencia or date.today())
+    
+    @staticmethod
+    def parse_lote(pares: Iterable[Tuple[str, str]], referencia: Optional[date] = None) -> List[Optional[datetime]]:
+        """Converte vários pares (data, hora) com uma única leitura do relógio"""
+        hoje = referencia or date.today()
+        return [_converter_data_hora(data_str, hora_str, hoje) for data_str, hora_str in pares]
     
     @staticmethod
     def calcular_tempo_restante(data_plantao: datetime) -> Tuple[float, str]:
         """Calcula tempo restante até o plantão"""
-        agora = datetime.now()
-        diferenca = (data_plantao - agora).total_seconds() / 3600
-        
+        diferenca = (data_plantao - datetime.now()).total_seconds() / 3600
+        return diferenca, DateTimeUtils._rotulo_tempo_restante(diferenca)
+    
+    @staticmethod
+    def tempo_restante_lote(pares: Iterable[Tuple[str, str]],
+                            agora: Optional[datetime] = None) -> List[Optional[Tuple[datetime, float, str]]]:
+        """
+        Converte vários pares (data, hora) e calcula (data_plantao, horas restantes, status)
+        de todos com uma única leitura do relógio; pares inválidos resultam em None
+        """
+        agora = agora or datetime.now()
+        resultado = []
+        for data_plantao in DateTimeUtils.parse_lote(pares, agora.date()):
+            if data_plantao is None:
+                resultado.append(None)
+                continue
+            diferenca = (data_plantao - agora).total_seconds() / 3600
+            resultado.append((data_plantao, diferenca, DateTimeUtils._rotulo_tempo_restante(diferenca)))
+        return resultado
+    
+    @staticmethod
+    def _rotulo_tempo_restante(diferenca: float) -> str:
+        """Status exibido para um plantão a `diferenca` horas de agora"""
         if diferenca < 0:
-            return diferenca, "✅ JÁ PASSOU"
+            return "✅ JÁ PASSOU"
         elif diferenca < 0.5:
             minutos = int(diferenca * 60)
-            return diferenca, f"🚨 EM {minutos} MIN"
+            return f"🚨 EM {minutos} MIN"
         elif diferenca < 24:
             horas = int(diferenca)
-            return diferenca, f"⏰ EM {horas} HORAS"
+            return f"⏰ EM {horas} HORAS"
         else:
             dias = int(diferenca / 24)
-            return diferenca, f"📅 EM {dias} DIAS"
+            return f"📅 EM {dias} DIAS"
+    
+    @staticmethod
+    def janelas_lembrete(inicio_ts: int) -> List[Tuple[str, int, int]]:
+        """Calcula (tipo, abre_em, fecha_em) de cada lembrete de um plantão (timestamps epoch)"""
+        return [
+            (tipo, int(inicio_ts - (horas + tolerancia) * 3600), int(inicio_ts - (horas - tolerancia) * 3600))
+            for tipo, horas, tolerancia in JANELAS_LEMBRETE
+        ]
     
     @staticmethod
     def obter_data_amanha() -> str:
@@ -98,24 +135,7 @@ class DateTimeUtils:
 
 
 class MessageFormatter:
-    """Formatador de mensagens do bot"""
-    
-    @staticmethod
-    def formatar_plantao(data: str, hora: str, local: str) -> str:
-        """Formata informações de um plantão"""
-        return f"📅 *{data}* ⏰ *{hora}*\n🏥 {local}"
-    
-    @staticmethod
-    def formatar_lista_plantoes(plantoes: list, titulo: str) -> str:
-        """Formata uma lista de plantões"""
-        if not plantoes:
-            return "📭 Nenhum plantão encontrado."
-        
-        mensagem = f"{titulo}\n\n"
-        for data, hora, local in plantoes:
-            mensagem += f"{MessageFormatter.formatar_plantao(data, hora, local)}\n\n"
-        
-        return mensagem.strip()
+    """Formatador de mensagens do bot (listas de plantões: respostas.formatar_lista_plantoes)"""
     
     @staticmethod
     def formatar_checklist() -> str:
@@ -131,23 +151,122 @@ class MessageFormatter:
 """
 
 
+# Tabelas de escape para str.translate (cada caractere especial ganha uma barra)
+_ESCAPE_MARKDOWN_V2 = str.maketrans({char: f'\\{char}' for char in '_*[]()~`>#+-=|{}.!'})
+_ESCAPE_MARKDOWN = str.maketrans({char: f'\\{char}' for char in '_*`['})
+
+# Marcadores de entidade do Markdown legado (e escapes, que não abrem entidade)
+_MARCADORES_MARKDOWN = re.compile(r'\\.|[*_`]')
+
+
 class TelegramUtils:
     """Utilitários para Telegram"""
     
     @staticmethod
     def escapar_markdown(texto: str) -> str:
-        """Escapa caracteres especiais do Markdown"""
-        caracteres_especiais = ['_', '*', '[', ']', '(', ')', '~', '`', '>', '#', '+', '-', '=', '|', '{', '}', '.', '!']
-        for char in caracteres_especiais:
-            texto = texto.replace(char, f'\\{char}')
-        return texto
+        """Escapa caracteres especiais do MarkdownV2 (um único passe)"""
+        return texto.translate(_ESCAPE_MARKDOWN_V2)
+    
+    @staticmethod
+    def escapar_markdown_simples(texto: str) -> str:
+        """Escapa caracteres especiais do Markdown legado (parse_mode='Markdown' do bot)"""
+        return texto.translate(_ESCAPE_MARKDOWN)
     
     @staticmethod
     def truncar_mensagem(mensagem: str, tamanho_max: int = 4096) -> str:
-        """Trunca mensagem para tamanho máximo do Telegram"""
+        """Trunca mensagem para tamanho máximo do Telegram (sem partir entidades do Markdown)"""
         if len(mensagem) <= tamanho_max:
             return mensagem
-        return mensagem[:tamanho_max-3] + "..."
+        return TelegramUtils.dividir_texto(mensagem, tamanho_max - 3)[0] + "..."
+    
+    @staticmethod
+    def dividir_texto(texto: str, tamanho_max: int = 4096) -> List[str]:
+        """
+        Divide um texto em mensagens de até `tamanho_max` caracteres, quebrando em fim
+        de linha (linhas maiores que o limite quebram em espaço). Uma entidade do
+        Markdown (*negrito*, _itálico_, `código`) cortada é fechada no fim de uma
+        mensagem e reaberta no início da seguinte, então todas renderizam.
+        """
+        if len(texto) <= tamanho_max:
+            return [texto]
+        
+        # Reserva para fechar e reabrir uma entidade cortada
+        limite = tamanho_max - 2
+        mensagens = []
+        linhas = []
+        tamanho = -1
+        aberta = None
+        for linha in texto.split('\n'):
+            for trecho in TelegramUtils._quebrar_linha(linha, limite):
+                reabrir = ''
+                if linhas and tamanho + 1 + len(trecho) > limite:
+                    mensagens.append('\n'.join(linhas) + (aberta or ''))
+                    linhas, tamanho = [], -1
+                    reabrir = aberta or ''
+                linhas.append(reabrir + trecho)
+                tamanho += 1 + len(reabrir) + len(trecho)
+                aberta = TelegramUtils._entidade_aberta(trecho, aberta)
+        if linhas:
+            mensagens.append('\n'.join(linhas))
+        
+        return [mensagem for mensagem in mensagens if mensagem.strip()]
+    
+    @staticmethod
+    def _quebrar_linha(linha: str, limite: int) -> Iterator[str]:
+        """Quebra uma linha maior que o limite no último espaço (ou no limite, sem partir um escape)"""
+        while len(linha) > limite:
+            corte = linha.rfind(' ', 0, limite + 1)
+            if corte > 0:
+                yield linha[:corte]
+                linha = linha[corte + 1:]
+                continue
+            
+            corte = limite
+            barras = len(linha[:corte]) - len(linha[:corte].rstrip('\\'))
+            if barras % 2:
+                corte -= 1
+            yield linha[:corte]
+            linha = linha[corte:]
+        yield linha
+    
+    @staticmethod
+    def _entidade_aberta(trecho: str, aberta: Optional[str] = None) -> Optional[str]:
+        """Marcador da entidade que continua aberta após o trecho (o Markdown legado não aninha)"""
+        for marcador in _MARCADORES_MARKDOWN.finditer(trecho):
+            caractere = marcador.group()
+            if len(caractere) > 1:
+                continue
+            if aberta is None:
+                aberta = caractere
+            elif caractere == aberta:
+                aberta = None
+        return aberta
+    
+    @staticmethod
+    def dividir_mensagem(blocos: List[str], tamanho_max: int = 4096, separador: str = "\n\n") -> List[str]:
+        """
+        Junta blocos de texto no menor número de mensagens de até `tamanho_max`
+        caracteres, sem partir um bloco entre mensagens (blocos maiores que o
+        limite viram várias mensagens, divididos por `dividir_texto`)
+        """
+        mensagens = []
+        atual = ""
+        for bloco in blocos:
+            if len(bloco) > tamanho_max:
+                *inteiras, bloco = TelegramUtils.dividir_texto(bloco, tamanho_max)
+                if atual:
+                    mensagens.append(atual)
+                mensagens.extend(inteiras)
+                atual = ""
+            if atual and len(atual) + len(separador) + len(bloco) <= tamanho_max:
+                atual += separador + bloco
+                continue
+            if atual:
+                mensagens.append(atual)
+            atual = bloco
+        if atual:
+            mensagens.append(atual)
+        return mensagens
 
 
 def validar_formato_plantao(partes: list) -> Tuple[bool, str]:
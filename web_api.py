@@ -1,9 +1,13 @@
 """
 API Web para consultar plantões
 """
-from flask import Flask, jsonify, request, send_from_directory
+from flask import Flask, Response, jsonify, make_response, request, send_from_directory, abort
 from flask_cors import CORS
+from functools import wraps
+import hmac
 import os
+from cache import CacheRespostas
+from config import WEBHOOK_SECRET, WEBHOOK_PATH, PAGINACAO_LIMITE_MAX
 from database import Database, get_db_connection
 from utils import DateTimeUtils
 import logging
@@ -27,6 +31,36 @@ CORS(app)
 # Inicializar banco
 Database.init_db()
 
+# Cache das rotas de leitura, validado pela versão dos plantões do chat no banco
+# (escritas de qualquer processo); as deste processo também liberam a memória na hora
+cache_respostas = CacheRespostas()
+Database.registrar_ouvinte(cache_respostas.ao_alterar_plantoes)
+
+def com_cache(view):
+    """Serve a resposta do cache (ou 304 via If-None-Match) com uma única leitura da versão do chat"""
+    @wraps(view)
+    def wrapper(chat_id, **kwargs):
+        # A data entra na chave porque hoje/amanhã mudam à meia-noite
+        chave = (request.path, tuple(sorted(request.args.items(multi=True))), DateTimeUtils.obter_data_hoje())
+        # Lida antes da view: uma escrita no meio só faz a resposta guardada ser descartada
+        versao = Database.versao_agenda(chat_id)
+        
+        em_cache = cache_respostas.obter(chat_id, chave, versao)
+        if em_cache:
+            etag, corpo = em_cache
+            resposta = Response(corpo, mimetype='application/json')
+        else:
+            resposta = make_response(view(chat_id, **kwargs))
+            if resposta.status_code != 200:
+                return resposta
+            etag = cache_respostas.guardar(chat_id, chave, resposta.get_data(), versao)
+        
+        resposta.set_etag(etag)
+        resposta.cache_control.no_cache = True
+        return resposta.make_conditional(request)
+    
+    return wrapper
+
 @app.route('/')
 def index():
     """Página principal"""
@@ -127,18 +161,20 @@ def criar_pagina_erro(motivo, caminho):
     """, 404
 
 @app.route('/api/plantoes/<int:chat_id>', methods=['GET'])
+@com_cache
 def get_plantoes(chat_id):
     """Retorna plantões de um usuário"""
     try:
-        limite = request.args.get('limite', 10, type=int)
-        plantoes = Database.buscar_proximos_plantoes(chat_id, limite)
+        limite = min(max(request.args.get('limite', 10, type=int), 1), PAGINACAO_LIMITE_MAX)
+        plantoes, proximo_cursor = Database.buscar_plantoes_pagina(chat_id, limite, request.args.get('cursor'))
         
         resultado = []
-        for data, hora, local in plantoes:
-            data_plantao = DateTimeUtils.parse_data_hora(data, hora)
-            if data_plantao:
-                horas_restantes, status = DateTimeUtils.calcular_tempo_restante(data_plantao)
+        tempos = DateTimeUtils.tempo_restante_lote((data, hora) for _, data, hora, _, _ in plantoes)
+        for (plantao_id, data, hora, local, inicio_ts), tempo in zip(plantoes, tempos):
+            if tempo:
+                _, horas_restantes, status = tempo
                 resultado.append({
+                    'id': plantao_id,
                     'data': data,
                     'hora': hora,
                     'local': local,
@@ -149,9 +185,16 @@ def get_plantoes(chat_id):
         return jsonify({
             'success': True,
             'total': len(resultado),
-            'plantoes': resultado
+            'plantoes': resultado,
+            'next_cursor': proximo_cursor
         })
     
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+    
     except Exception as e:
         logger.error(f"Erro ao buscar plantões: {e}")
         return jsonify({
@@ -160,6 +203,7 @@ def get_plantoes(chat_id):
         }), 500
 
 @app.route('/api/plantoes/<int:chat_id>/hoje', methods=['GET'])
+@com_cache
 def get_plantoes_hoje(chat_id):
     """Retorna plantões de hoje"""
     try:
@@ -187,6 +231,7 @@ def get_plantoes_hoje(chat_id):
         }), 500
 
 @app.route('/api/plantoes/<int:chat_id>/amanha', methods=['GET'])
+@com_cache
 def get_plantoes_amanha(chat_id):
     """Retorna plantões de amanhã"""
     try:
@@ -214,23 +259,13 @@ def get_plantoes_amanha(chat_id):
         }), 500
 
 @app.route('/api/stats/<int:chat_id>', methods=['GET'])
+@com_cache
 def get_stats(chat_id):
     """Retorna estatísticas do usuário"""
     try:
-        total = Database.contar_plantoes(chat_id)
-        hoje = DateTimeUtils.obter_data_hoje()
-        amanha = DateTimeUtils.obter_data_amanha()
-        
-        plantoes_hoje = len(Database.buscar_plantoes_por_data(chat_id, hoje))
-        plantoes_amanha = len(Database.buscar_plantoes_por_data(chat_id, amanha))
-        
         return jsonify({
             'success': True,
-            'stats': {
-                'total_plantoes': total,
-                'plantoes_hoje': plantoes_hoje,
-                'plantoes_amanha': plantoes_amanha
-            }
+            'stats': Database.estatisticas(chat_id)
         })
     
     except Exception as e:
@@ -240,6 +275,29 @@ def get_stats(chat_id):
             'error': str(e)
         }), 500
 
+@app.route(WEBHOOK_PATH, methods=['POST'])
+def webhook():
+    """Recebe atualizações do Telegram (modo webhook)"""
+    if not WEBHOOK_SECRET:
+        abort(404)
+    
+    token = request.headers.get('X-Telegram-Bot-Api-Secret-Token', '')
+    if not hmac.compare_digest(token.encode(), WEBHOOK_SECRET.encode()):
+        logger.warning("⚠️ Webhook recebido com secret token inválido")
+        abort(403)
+    
+    if not request.is_json:
+        abort(415)
+    
+    # Importado sob demanda: só os workers que recebem webhooks carregam o bot
+    from telebot import types
+    from bot import bot
+    
+    update = types.Update.de_json(request.get_data(as_text=True))
+    # O TeleBot processa os handlers no seu pool de threads; respondemos logo ao Telegram
+    bot.process_new_updates([update])
+    return '', 200
+
 @app.route('/api/health', methods=['GET'])
 def health_check():
     """Endpoint de health check"""
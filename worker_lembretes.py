@@ -0,0 +1,80 @@
+"""
+Workers de lembretes em processos separados
+
+Cada processo roda um LembreteService com um shard preferido; os shards são
+distribuídos por lease no banco, então vários workers (na mesma máquina ou em
+réplicas do bot) nunca processam o mesmo shard ao mesmo tempo.
+
+Uso: python worker_lembretes.py [processos]
+"""
+import logging
+import multiprocessing
+import signal
+import sys
+from multiprocessing.connection import wait
+
+import telebot
+
+from config import BOT_TOKEN, LOG_LEVEL, LOG_FORMAT, LEMBRETE_SHARDS, ENVIO_LIMITE_GLOBAL
+from database import Database
+from envio import FilaEnvio
+from lembretes import LembreteService
+
+logging.basicConfig(level=LOG_LEVEL, format=LOG_FORMAT)
+logger = logging.getLogger(__name__)
+
+
+def executar_worker(shard: int, processos: int):
+    """Processo de um worker (o limite global de envio é dividido entre os processos)"""
+    bot = telebot.TeleBot(BOT_TOKEN)
+    fila_envio = FilaEnvio(bot, limite_global=ENVIO_LIMITE_GLOBAL / processos)
+    servico = LembreteService(bot, fila_envio, shard=shard)
+    
+    # Parada limpa no deploy: devolve os leases para outro worker assumir na hora
+    signal.signal(signal.SIGTERM, lambda *_: servico.parar())
+    
+    servico.iniciar()
+    try:
+        servico.thread.join()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        servico.parar()
+        fila_envio.parar(aguardar=False)
+
+
+def main(processos: int = LEMBRETE_SHARDS):
+    """Inicia os workers e recria os que morrerem"""
+    Database.init_db()
+    print(f"⏰ Iniciando {processos} workers de lembretes ({LEMBRETE_SHARDS} shards)")
+    
+    workers = {}
+    try:
+        while True:
+            for shard in range(processos):
+                processo = workers.get(shard)
+                if processo is not None and processo.is_alive():
+                    continue
+                if processo is not None:
+                    logger.warning(f"⚠️ Worker do shard {shard} saiu (código {processo.exitcode}), reiniciando")
+                
+                processo = multiprocessing.Process(target=executar_worker, args=(shard, processos),
+                                                   name=f"lembretes-{shard}", daemon=True)
+                processo.start()
+                workers[shard] = processo
+            
+            # Dorme até algum worker sair
+            wait([processo.sentinel for processo in workers.values()])
+    
+    except KeyboardInterrupt:
+        print("\n👋 Workers interrompidos pelo usuário")
+    finally:
+        for processo in workers.values():
+            if processo.is_alive():
+                processo.terminate()
+        for processo in workers.values():
+            processo.join(timeout=10)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else LEMBRETE_SHARDS)